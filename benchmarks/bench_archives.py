@@ -0,0 +1,76 @@
+"""
+Benchmark scanning source bundles in place, i.e. ``walk_tex_files`` with
+``archives=True``, against extracting them to disk and scanning the
+extracted files. The annotations are checked to be the same.
+
+Usage::
+
+    python -m benchmarks.bench_archives [--bundles N] [--files N]
+                                        [--lines N] [--jobs N]
+"""
+import argparse
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import todotex
+
+
+def _best(func, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - tic)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bundles', type=int, default=50)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--lines', type=int, default=400)
+    parser.add_argument('--jobs', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        spec = corpus.CorpusSpec(files=args.files, lines=args.lines)
+        (root / 'src').mkdir()
+        keywords = corpus.make_corpus(root / 'src', spec)
+        pat = todotex.Patterns(keywords)
+        bundles = root / 'bundles'
+        bundles.mkdir()
+        for i in range(args.bundles):
+            with tarfile.open(bundles / f'b{i}.tar.gz', 'w:gz') as tar:
+                tar.add(root / 'src', '.')
+
+        def extracted(jobs):
+            with tempfile.TemporaryDirectory() as outdir:
+                for path in sorted(bundles.iterdir()):
+                    with tarfile.open(path) as tar:
+                        tar.extractall(Path(outdir) / path.name)
+                return sum(
+                    len(annots) for _, annots in todotex.iter_scan_fs_for_tex(
+                        [Path(outdir)], pat, True, False, 'utf-8', jobs))
+
+        def in_place(jobs):
+            texfiles = todotex.walk_tex_files([bundles], True, archives=True)
+            return sum(
+                len(annots) for _, annots in todotex.iter_scan_tex_files(
+                    texfiles, pat, False, 'utf-8', jobs))
+
+        for jobs in [1, args.jobs]:
+            t_old, expected = _best(lambda: extracted(jobs), args.repeat)
+            t_new, n_annots = _best(lambda: in_place(jobs), args.repeat)
+            assert n_annots == expected
+            print(f'j={jobs}: extract and scan {t_old:.3f}s, '
+                  f'scan in place {t_new:.3f}s (x{t_old / t_new:.2f}), '
+                  f'{n_annots} annotations')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark scanning a large TeX file in place by ``todotex.chunked`` against
+reading and decoding it whole, in time and in peak memory traced by
+``tracemalloc``, i.e. excluding the pages of the memory map, which the
+system may reclaim. The file has ordinary lines, interleaved with lines of
+``--long-line`` MiB, e.g. minified TikZ. The annotations are checked to be
+the same.
+
+Usage::
+
+    python -m benchmarks.bench_bigfile [--mib N] [--long-line N]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import todotex
+
+
+def _measure(func):
+    tracemalloc.start()
+    try:
+        tic = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - tic
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mib', type=int, default=256)
+    parser.add_argument('--long-line', type=int, default=16)
+    args = parser.parse_args()
+
+    spec = corpus.CorpusSpec(lines=2000,
+                             comment_density=0.5,
+                             annotation_density=0.1,
+                             continuation_depth=2)
+    keywords = corpus.make_keywords(spec)
+    p = todotex.Patterns(keywords)
+    doc = ''.join(corpus.make_doc(spec, keywords)).encode('utf-8')
+    long_line = b'\\draw ' + b'(0,0)--' * (args.long_line * 2**20 // 7)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'big.tex'
+        with open(path, 'wb') as outfile:
+            size = 0
+            while size < args.mib * 2**20:
+                size += outfile.write(doc)
+                size += outfile.write(long_line + b' % todo after TikZ\n')
+        print(f'{size / 2**20:.0f} MiB')
+        results = []
+        for name, min_size in [('read whole', size + 1), ('in place', 1)]:
+            todotex._MMAP_MIN_SIZE = min_size
+            elapsed, peak, result = _measure(lambda: todotex._scan_tex_file(
+                path, p, True, 'utf-8'))
+            results.append(result)
+            print(f'{name:>10}: {elapsed:.3f}s, peak {peak / 2**20:8.1f} MiB, '
+                  f'{len(result[0])} annotations')
+        assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the continuation merging of ``scan_tex_doc`` against the
+quadratic merging it replaced, which rebuilt the message on every
+continuation line, on documents of deep continuation blocks.
+
+Usage::
+
+    python -m benchmarks.bench_continuation [--lines N]
+"""
+import argparse
+import time
+
+from benchmarks import corpus
+from todotex import todotex
+from todotex.todotex import TexAnnotation
+
+
+def merge_quadratic(doc, p):
+    """The continuation merging before ``_ContinuationBlock``."""
+    annots = []
+    prev_annot = None
+    for ln, line in enumerate(doc, 1):
+        line = line.rstrip('\n')
+        if prev_annot is not None:
+            matched = p.cont.match(line)
+            if (matched
+                    and len(matched.group('pfx_space')) > prev_annot.pfxlen):
+                if not prev_annot.msg or not matched.group('msg'):
+                    msgsep = ''
+                elif ((p.hans.match(prev_annot.msg[-1])
+                       and p.hans.match(matched.group('msg')[0]))
+                      or (p.hans_punc.match(prev_annot.msg[-1])
+                          or p.hans_punc.match(matched.group('msg')[0]))):
+                    msgsep = ''
+                else:
+                    msgsep = ' '
+                prev_annot_msg = prev_annot.msg or ''
+                curr_annot_msg = matched.group('msg') or ''
+                prev_annot = TexAnnotation(
+                    prev_annot.ln,
+                    prev_annot.pfxlen,
+                    prev_annot.key,
+                    f'{prev_annot_msg}{msgsep}{curr_annot_msg}',
+                )
+                continue
+            annots.append(prev_annot)
+            prev_annot = None
+        matched = p.key_matcher.search(line)
+        if matched:
+            prev_annot = TexAnnotation(ln, len(matched.pfx_space),
+                                       matched.key, matched.msg)
+    if prev_annot is not None:
+        annots.append(prev_annot)
+    return annots
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for depth in [4, 64, 1000, 10000]:
+        for cjk_ratio in [0.0, 0.5]:
+            spec = corpus.CorpusSpec(lines=args.lines,
+                                     continuation_depth=depth,
+                                     cjk_ratio=cjk_ratio)
+            keywords = corpus.make_keywords(spec)
+            p = todotex.Patterns(keywords)
+            doc = corpus.make_doc(spec, keywords)
+
+            def bench(scan):
+                best = float('inf')
+                for _ in range(args.repeat):
+                    tic = time.perf_counter()
+                    annots = scan()
+                    best = min(best, time.perf_counter() - tic)
+                return best, annots
+
+            t_old, expected = bench(lambda: merge_quadratic(doc, p))
+            t_new, annots = bench(lambda: todotex.scan_tex_doc(doc, True, p))
+            assert annots == expected
+            print(f'depth {depth:>5}, CJK {cjk_ratio:.0%}: '
+                  f'quadratic {t_old:.3f}s, linear {t_new:.3f}s '
+                  f'(x{t_old / t_new:.2f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark ``--summary`` against the full output it summarizes: counting the
+annotations by ``count_tex_text`` and printing ``show_counts``, against
+scanning them by ``scan_tex_text`` and printing ``show_result``, on texts in
+memory and on a corpus on disk. The counts are checked against those of the
+scanned annotations.
+
+Usage::
+
+    python -m benchmarks.bench_count [--files N] [--lines N] [--repeat N]
+"""
+import argparse
+import collections
+import io
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import interface
+from todotex import todotex
+
+
+def _best(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _report(name: str, full: float, count: float) -> None:
+    print(f'{name:>32}: full {full * 1e3:9.2f} ms, '
+          f'count {count * 1e3:9.2f} ms, {full / count:5.2f}x')
+
+
+def bench_text(args) -> None:
+    for name, spec_kwargs in [
+        ('plain', {}),
+        ('dense-comments', {
+            'comment_density': 0.9,
+            'annotation_density': 0.5
+        }),
+        ('long-lines', {
+            'lines': args.lines // 10,
+            'long_line_every': 20
+        }),
+    ]:
+        for allow_continuation in [False, True]:
+            spec = corpus.CorpusSpec(**{
+                'lines': args.lines,
+                'continuation_depth': 4,
+                **spec_kwargs
+            })
+            keywords = corpus.make_keywords(spec)
+            p = todotex.Patterns(keywords)
+            text = ''.join(corpus.make_doc(spec, keywords))
+            counts = todotex.count_tex_text(text, allow_continuation, p)
+            assert counts == collections.Counter(
+                a.key
+                for a in todotex.scan_tex_text(text, allow_continuation, p))
+            full = _best(
+                lambda: todotex.scan_tex_text(text, allow_continuation, p),
+                args.repeat)
+            count = _best(
+                lambda: todotex.count_tex_text(text, allow_continuation, p),
+                args.repeat)
+            _report(f'text/{name}' + ('/cont' if allow_continuation else ''),
+                    full, count)
+
+
+def bench_files(args) -> None:
+    spec = corpus.CorpusSpec(files=args.files,
+                             lines=args.lines,
+                             comment_density=0.5,
+                             annotation_density=0.5,
+                             continuation_depth=2)
+    with tempfile.TemporaryDirectory() as root:
+        keywords = corpus.make_corpus(Path(root), spec)
+        p = todotex.Patterns(keywords)
+        texfiles = list(todotex.walk_tex_files([Path(root)], True))
+
+        def full():
+            annots = todotex.iter_scan_tex_files(texfiles, p, True, 'utf-8')
+            interface.show_result(annots, keywords, True, True, True, True,
+                                  False, 'always', 'never', io.StringIO())
+
+        def summary(outfile=None):
+            counts = todotex.iter_count_tex_files(texfiles, p, True, 'utf-8')
+            interface.show_counts(counts, keywords, True, True, False,
+                                  'never', 'text', outfile or io.StringIO())
+
+        outfile = io.StringIO()
+        summary(outfile)
+        total = outfile.getvalue().partition('\n')[0]
+        annots = todotex.scan_fs_for_tex([Path(root)], p, True, True,
+                                         'utf-8')
+        n_annots = sum(map(len, annots.values()))
+        print(f'{n_annots} annotations in {len(texfiles)} files: {total}')
+        _report('files/summary', _best(full, args.repeat),
+                _best(summary, args.repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    bench_text(args)
+    bench_files(args)
+
+
+if __name__ == '__main__':
+    main()
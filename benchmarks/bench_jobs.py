@@ -0,0 +1,58 @@
+"""
+Benchmark ``scan_fs_for_tex`` with increasing number of workers against the
+serial path.
+
+Usage::
+
+    python -m benchmarks.bench_jobs [--files N] [--lines N]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import todotex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--lines', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        keywords = corpus.make_corpus(
+            root, corpus.CorpusSpec(files=args.files, lines=args.lines))
+        pat = todotex.Patterns(keywords)
+
+        def bench(jobs, pool):
+            best = float('inf')
+            for _ in range(args.repeat):
+                tic = time.perf_counter()
+                annots = todotex.scan_fs_for_tex([root], pat, True, False,
+                                                 'utf-8', jobs, pool)
+                best = min(best, time.perf_counter() - tic)
+            return best, annots
+
+        serial, expected = bench(1, 'process')
+        print(f'{"serial":>14}: {serial:.3f}s')
+        ncpu = os.cpu_count() or 1
+        jobs = 2
+        while True:
+            jobs = min(jobs, ncpu)
+            for pool in ['process', 'thread']:
+                elapsed, annots = bench(jobs, pool)
+                assert list(annots.items()) == list(expected.items())
+                print(f'{pool:>7} j={jobs:<4}: {elapsed:.3f}s '
+                      f'(x{serial / elapsed:.2f})')
+            if jobs >= ncpu:
+                break
+            jobs *= 2
+
+
+if __name__ == '__main__':
+    main()
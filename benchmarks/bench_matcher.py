@@ -0,0 +1,49 @@
+"""
+Benchmark ``KeyMatcher`` against the alternation regex ``Patterns.key`` over
+configurations of growing number of keys.
+
+Usage::
+
+    python -m benchmarks.bench_matcher [--lines N]
+"""
+import argparse
+import random
+import time
+
+from benchmarks import corpus
+from todotex import todotex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for n_keys in [7, 10, 30, 100, 300, 1000]:
+        # 5% of the lines are annotated, and 25% have other comments
+        spec = corpus.CorpusSpec(lines=args.lines,
+                                 comment_density=0.3,
+                                 annotation_density=1 / 6,
+                                 keys=n_keys)
+        keywords = corpus.make_keywords(spec)
+        lines = corpus.make_lines(spec, keywords, random.Random(0))
+        p = todotex.Patterns(keywords)
+
+        def bench(search):
+            best = float('inf')
+            for _ in range(args.repeat):
+                tic = time.perf_counter()
+                for line in lines:
+                    search(line)
+                best = min(best, time.perf_counter() - tic)
+            return best
+
+        t_regex = bench(p.key.search)
+        t_matcher = bench(p.key_matcher.search)
+        print(f'{n_keys:>5} keys: regex {t_regex:.3f}s, '
+              f'matcher {t_matcher:.3f}s (x{t_regex / t_matcher:.2f})')
+
+
+if __name__ == '__main__':
+    main()
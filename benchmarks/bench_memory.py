@@ -0,0 +1,76 @@
+"""
+Benchmark the memory held by a large result set, as ``TexAnnotation`` per
+annotation with a copy of the key each, as they were before the keys were
+shared, as ``TexAnnotation`` per annotation with shared keys, and as an
+``AnnotationTable``.
+
+Usage::
+
+    python -m benchmarks.bench_memory [--files N] [--lines N]
+"""
+import argparse
+import collections
+import random
+import tracemalloc
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import todotex
+from todotex.table import AnnotationTable
+from todotex.todotex import TexAnnotation
+
+
+def _measure(build):
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--lines', type=int, default=2000)
+    args = parser.parse_args()
+
+    spec = corpus.CorpusSpec(lines=args.lines,
+                             comment_density=0.5,
+                             annotation_density=0.5)
+    keywords = corpus.make_keywords(spec)
+    p = todotex.Patterns(keywords)
+    rng = random.Random(spec.seed)
+    docs = [(Path(f'd{i % 32}/f{i}.tex'),
+             corpus.make_doc(spec, keywords, rng)) for i in range(args.files)]
+
+    def scan():
+        for path, doc in docs:
+            yield path, todotex.scan_tex_doc(doc, False, p)
+
+    def copied_keys():
+        return collections.OrderedDict(
+            (path, [
+                TexAnnotation(a.ln, a.pfxlen, ''.join(list(a.key)), a.msg)
+                for a in annots
+            ]) for path, annots in scan())
+
+    # scan once outside of the measurements, to compile the patterns
+    n_annots = sum(len(annots) for _, annots in scan())
+    print(f'{n_annots} annotations in {args.files} files')
+    results = []
+    for name, build in [
+        ('copied keys', copied_keys),
+        ('shared keys', lambda: collections.OrderedDict(scan())),
+        ('AnnotationTable', lambda: AnnotationTable.from_scan(scan())),
+    ]:
+        size, result = _measure(build)
+        results.append(result)
+        print(f'{name:>16}: {size / 2**20:8.1f} MiB '
+              f'({size / n_annots:.0f} B per annotation)')
+    assert list(results[0].items()) == list(results[2].items())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark ``show_result`` on a million annotations against the renderer it
+replaced, which formatted and wrote the annotations one line at a time, and
+check that the output is the same byte for byte under all the options.
+
+Usage::
+
+    python -m benchmarks.bench_show [--annots N]
+"""
+import argparse
+import collections.abc
+import io
+import itertools
+import random
+import sys
+import time
+import typing as ty
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import interface
+from todotex import todotex
+from todotex.config import KeywordsConfig
+from todotex.interface import Colors, NoLeadingTrailingEmptyLinesBufferedWriter
+from todotex.todotex import TexAnnotation
+
+
+def show_result_per_line(
+    per_file_annots: ty.Union[
+        ty.Mapping[ty.Optional[Path], ty.Iterable[TexAnnotation]],
+        ty.Iterable[ty.Tuple[ty.Optional[Path], ty.Iterable[TexAnnotation]]],
+    ],
+    keywords: KeywordsConfig,
+    print_linenumber: bool,
+    print_done: bool,
+    print_label: bool,
+    print_message: bool,
+    absolute_path: bool,
+    heading: ty.Literal['always', 'never', 'auto'],
+    color: ty.Literal['always', 'never', 'auto'],
+    # only set when debugging
+    _out_buff: ty.TextIO = None,
+) -> None:
+    """``interface.show_result`` before the lines were written in batches."""
+    outfile = _out_buff if _out_buff else sys.stdout
+    heading: bool = {
+        'always': True,
+        'never': False,
+        'auto': sys.stdout.isatty(),
+    }[heading]
+    color: bool = {
+        'always': True,
+        'never': False,
+        'auto': sys.stdout.isatty(),
+    }[color]
+
+    def to_show_annot(_a: TexAnnotation) -> bool:
+        return (_a.key in keywords.todo
+                or (print_done and _a.key in keywords.done))
+
+    if isinstance(per_file_annots, collections.abc.Mapping):
+        per_file_annots = per_file_annots.items()
+
+    with NoLeadingTrailingEmptyLinesBufferedWriter(outfile, True) as w:
+        if heading:
+            for texfile, annots in per_file_annots:
+                if texfile is not None:
+                    if absolute_path:
+                        texfile = texfile.resolve()
+                    if color:
+                        w.append(Colors.purple, str(texfile), Colors.reset)
+                    else:
+                        w.append(str(texfile))
+                    w.commit()
+
+                if print_linenumber or print_label or print_message:
+                    a: TexAnnotation
+                    for a in filter(to_show_annot, annots):
+                        sbuf: ty.List[str] = []
+                        if print_linenumber:
+                            if color:
+                                sbuf.append(
+                                    f'{Colors.green}{a.ln}{Colors.reset}')
+                            else:
+                                sbuf.append(f'{a.ln}')
+                        if print_label:
+                            try:
+                                label = keywords.todo[a.key]
+                            except KeyError:
+                                label = keywords.done[a.key]
+                            if color:
+                                sbuf.append(
+                                    f'{Colors.bold_red}{label}{Colors.reset}')
+                            else:
+                                sbuf.append(label)
+                        if print_message and a.msg:
+                            sbuf.append(a.msg)
+                        line = ':'.join(sbuf)
+                        w.append(line).commit()
+        else:
+            for texfile, annots in per_file_annots:
+                if texfile is not None:
+                    if absolute_path:
+                        texfile = texfile.resolve()
+                a: TexAnnotation
+                for a in filter(to_show_annot, annots):
+                    sbuf: ty.List[str] = []
+                    if texfile is not None:
+                        if color:
+                            sbuf.append(
+                                f'{Colors.purple}{texfile}{Colors.reset}')
+                        else:
+                            sbuf.append(str(texfile))
+                    if print_linenumber:
+                        if color:
+                            sbuf.append(f'{Colors.green}{a.ln}{Colors.reset}')
+                        else:
+                            sbuf.append(str(a.ln))
+                    if print_label:
+                        try:
+                            label = keywords.todo[a.key]
+                        except KeyError:
+                            label = keywords.done[a.key]
+                        if color:
+                            sbuf.append(
+                                f'{Colors.bold_red}{label}{Colors.reset}')
+                        else:
+                            sbuf.append(label)
+                    if print_message and a.msg:
+                        sbuf.append(a.msg)
+                    line = ':'.join(sbuf)
+                    if line:
+                        w.append(line).commit()
+
+
+def _make_result(n_annots: int) -> ty.List[tuple]:
+    spec = corpus.CorpusSpec(lines=2000,
+                             comment_density=1.0,
+                             annotation_density=0.5)
+    keywords = corpus.make_keywords(spec)
+    p = todotex.Patterns(keywords)
+    rng = random.Random(spec.seed)
+    docs = [corpus.make_doc(spec, keywords, rng) for _ in range(8)]
+    per_file_annots = []
+    total = 0
+    for i in itertools.count():
+        annots = todotex.scan_tex_doc(docs[i % len(docs)], False, p)
+        annots = annots[:n_annots - total]
+        per_file_annots.append((Path(f'd{i % 32}/f{i}.tex'), annots))
+        total += len(annots)
+        if total >= n_annots:
+            return keywords, per_file_annots
+
+
+def check_same_output() -> None:
+    keywords = KeywordsConfig({'todo': 'TODO', 'fixme': ''},
+                              {'done': 'DONE'})
+    per_file_annots = [
+        (Path('a.tex'), [
+            TexAnnotation(1, 1, 'todo', ''),
+            TexAnnotation(2, 1, 'done', 'x'),
+            TexAnnotation(3, 1, 'fixme', None),
+            TexAnnotation(4, 1, 'todo', ''),
+            TexAnnotation(5, 1, 'unknown', 'y'),
+        ]),
+        (Path('b.tex'), []),
+        (None, [
+            TexAnnotation(9, 1, 'done', ''),
+            TexAnnotation(10, 1, 'todo', 'z'),
+            TexAnnotation(11, 1, 'todo', None),
+        ]),
+        (Path('c.tex'), [TexAnnotation(1, 1, 'done', '')]),
+    ]
+    for flags in itertools.product([False, True], repeat=5):
+        for heading, color in itertools.product(['always', 'never'],
+                                                repeat=2):
+            for lazy in [False, True]:
+                args = keywords, *flags, heading, color
+                expected = io.StringIO()
+                show_result_per_line(per_file_annots, *args, expected)
+                actual = io.StringIO()
+                result = per_file_annots
+                if lazy:
+                    result = [(path, iter(annots))
+                              for path, annots in per_file_annots]
+                interface.show_result(result, *args, actual)
+                assert actual.getvalue() == expected.getvalue(), (flags,
+                                                                  heading,
+                                                                  color)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--annots', type=int, default=1000000)
+    args = parser.parse_args()
+
+    check_same_output()
+    keywords, per_file_annots = _make_result(args.annots)
+    print(f'{args.annots} annotations in {len(per_file_annots)} files')
+    for heading, color in [('always', 'never'), ('never', 'never'),
+                           ('never', 'always')]:
+        times = []
+        outputs = []
+        for show in [show_result_per_line, interface.show_result]:
+            outfile = io.StringIO()
+            tic = time.perf_counter()
+            show(per_file_annots, keywords, True, True, True, True, False,
+                 heading, color, outfile)
+            times.append(time.perf_counter() - tic)
+            outputs.append(outfile.getvalue())
+        assert outputs[0] == outputs[1]
+        print(f'heading {heading:>6}, color {color:>6}: per line '
+              f'{times[0]:.3f}s, batched {times[1]:.3f}s '
+              f'(x{times[0] / times[1]:.2f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark ``walk_tex_files`` against the ``os.walk`` based walk it replaced,
+on a synthetic tree of mostly non-TeX files.
+
+Usage::
+
+    python -m benchmarks.bench_walk [--files N] [--tex-ratio R]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import todotex
+
+
+def os_walk_tex_files(paths, recursive):
+    """The walk before ``walk_tex_files``."""
+    for path in paths:
+        if path.is_file() and path.suffix == '.tex':
+            yield path
+        elif path.is_dir() and not recursive:
+            for child in path.iterdir():
+                if child.is_file() and child.suffix == '.tex':
+                    yield child
+        elif path.is_dir():
+            for root, _, files in os.walk(path):
+                for name in files:
+                    child = Path(root) / name
+                    if child.suffix == '.tex':
+                        yield child
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--tex-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        corpus.make_tree(root, args.files, args.tex_ratio)
+
+        def bench(walk):
+            best = float('inf')
+            for _ in range(args.repeat):
+                tic = time.perf_counter()
+                texfiles = list(walk())
+                best = min(best, time.perf_counter() - tic)
+            return best, texfiles
+
+        t_old, expected = bench(lambda: os_walk_tex_files([root], True))
+        t_new, texfiles = bench(lambda: todotex.walk_tex_files([root], True))
+        assert texfiles == expected
+        print(f'os.walk:        {t_old:.3f}s ({len(expected)} TeX files)')
+        print(f'walk_tex_files: {t_new:.3f}s (x{t_old / t_new:.2f})')
+        t_pruned, texfiles = bench(lambda: todotex.walk_tex_files(
+            [root], True, exclude=['_minted-*']))
+        print(f'  with pruning: {t_pruned:.3f}s (x{t_old / t_pruned:.2f}, '
+              f'{len(texfiles)} TeX files)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Generate reproducible synthetic TeX corpora for the benchmarks.
+
+A corpus is described by a ``CorpusSpec``; the same spec always generates the
+same keywords, documents and file tree.
+"""
+import random
+import typing as ty
+from pathlib import Path
+
+from todotex import config
+
+_WORDS = [
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing',
+    'elit', 'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore',
+    r'\emph{et}', r'$x^2$', r'\cite{dolore}', 'magna', 'aliqua'
+]
+_HANS = '视交叉上核是主要的生物钟我们需要进一步讨论这个问题'
+_HANS_PUNC = '，。；：？！'
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class CorpusSpec(ty.NamedTuple):
+    # the number of TeX files
+    files: int = 200
+    # the number of lines per TeX file
+    lines: int = 400
+    # the fraction of lines with a comment
+    comment_density: float = 0.2
+    # the fraction of comments that are annotations
+    annotation_density: float = 0.1
+    # the number of todo/done keys in the configuration
+    keys: int = 12
+    # the maximum number of lines an annotation is continued on
+    continuation_depth: int = 0
+    # the fraction of lines in Chinese rather than in English
+    cjk_ratio: float = 0.0
+    # every how many lines to put a pathologically long line, 0 for never
+    long_line_every: int = 0
+    # the length of the pathologically long lines
+    long_line_length: int = 100000
+    seed: int = 0
+
+
+def make_keywords(spec: CorpusSpec) -> config.KeywordsConfig:
+    """
+    :return: the keywords of the example configuration, padded with random
+             literal keys up to ``spec.keys``
+    """
+    rng = random.Random(spec.seed)
+    todo = {
+        'todo': 'TODO',
+        'TODO': 'TODO',
+        'fixme': 'TODO',
+        'continue later': 'TODO',
+        r'continue ?\.{3,}': 'TODO',
+    }
+    done = {'done': 'DONE', 'question solved': 'SOLVED'}
+    while len(todo) + len(done) < spec.keys:
+        key = 'proj-' + ''.join(rng.choices(_ALPHABET, k=rng.randint(3, 10)))
+        (done if rng.random() < 0.2 else todo)[key] = 'TODO'
+    return config.KeywordsConfig(todo, done)
+
+
+def _literal_keys(keywords: config.KeywordsConfig) -> ty.List[str]:
+    return [
+        k for k in list(keywords.todo) + list(keywords.done)
+        if '\\' not in k
+    ]
+
+
+def _text(rng: random.Random, spec: CorpusSpec, n_words: int) -> str:
+    if rng.random() < spec.cjk_ratio:
+        chars = rng.choices(_HANS, k=n_words * 2)
+        chars.append(rng.choice(_HANS_PUNC))
+        return ''.join(chars)
+    return ' '.join(rng.choices(_WORDS, k=n_words))
+
+
+def make_lines(
+    spec: CorpusSpec,
+    keywords: config.KeywordsConfig,
+    rng: random.Random,
+) -> ty.List[str]:
+    """
+    :return: the lines of one TeX document, without newline characters
+    """
+    keys = _literal_keys(keywords)
+    lines = []
+    while len(lines) < spec.lines:
+        n = len(lines) + 1
+        if spec.long_line_every and n % spec.long_line_every == 0:
+            line = ' '.join(rng.choices(_WORDS, k=spec.long_line_length // 6))
+            lines.append(line[:spec.long_line_length] + ' % long')
+            continue
+        line = _text(rng, spec, 12)
+        if rng.random() >= spec.comment_density:
+            lines.append(line)
+            continue
+        if rng.random() >= spec.annotation_density:
+            lines.append(f'{line} % {_text(rng, spec, 6)}')
+            continue
+        pfx = ' ' * rng.randint(0, 2)
+        key = rng.choice(keys)
+        lines.append(f'{line} %{pfx} {key} {_text(rng, spec, 6)}')
+        indent = ' ' * (len(line) + 1)
+        for _ in range(rng.randint(0, spec.continuation_depth)):
+            lines.append(f'{indent}%{pfx}   {_text(rng, spec, 6)}')
+    return lines[:spec.lines]
+
+
+def make_doc(
+    spec: CorpusSpec,
+    keywords: config.KeywordsConfig,
+    rng: random.Random = None,
+) -> ty.List[str]:
+    """
+    :return: the lines of one TeX document, with newline characters, as
+             read from a file
+    """
+    if rng is None:
+        rng = random.Random(spec.seed)
+    return [line + '\n' for line in make_lines(spec, keywords, rng)]
+
+
+def make_corpus(root: Path, spec: CorpusSpec) -> config.KeywordsConfig:
+    """
+    Write ``spec.files`` TeX files into 32 subdirectories of ``root``.
+
+    :return: the keywords the corpus is generated with
+    """
+    keywords = make_keywords(spec)
+    rng = random.Random(spec.seed)
+    for i in range(spec.files):
+        subdir = root / f'd{i % 32}'
+        subdir.mkdir(exist_ok=True)
+        doc = ''.join(make_doc(spec, keywords, rng))
+        (subdir / f'f{i}.tex').write_text(doc, encoding='utf-8')
+    return keywords
+
+
+def make_tree(root: Path, n_files: int, tex_ratio: float, seed: int = 0):
+    """
+    Create a tree of ``n_files`` empty files under ``root``, of which about
+    ``tex_ratio`` are TeX files and the rest are build artifacts, with some
+    ``_minted-*`` directories to prune.
+    """
+    rng = random.Random(seed)
+    dirs = [root]
+    for i in range(n_files // 50):
+        parent = rng.choice(dirs)
+        name = f'_minted-{i}' if i % 20 == 0 else f'd{i}'
+        subdir = parent / name
+        subdir.mkdir()
+        dirs.append(subdir)
+    for i in range(n_files):
+        suffix = '.tex' if rng.random() < tex_ratio else rng.choice(
+            ['.aux', '.log', '.pdf', '.png', '.bib'])
+        (rng.choice(dirs) / f'f{i}{suffix}').touch()
@@ -0,0 +1,279 @@
+"""
+Benchmark suite over synthetic corpora, with saved baselines to catch
+performance regressions.
+
+Usage::
+
+    python -m benchmarks.suite [-k PATTERN] [--scale F] [--save FILE]
+                               [--compare FILE] [--threshold F]
+
+Save a baseline before a change, and compare against it after::
+
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --compare baseline.json
+
+The exit status is 1 if some benchmark is slower than the baseline by more
+than the threshold. Baselines are only comparable on the same machine.
+"""
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import platform
+import random
+import re
+import sys
+import tempfile
+import timeit
+import typing as ty
+from pathlib import Path
+
+from benchmarks import corpus
+from todotex import interface
+from todotex import todotex
+
+# A benchmark is set up by a function of the scale and an exit stack to
+# register the cleanup to, and returns the function to time.
+_Setup = ty.Callable[[float, contextlib.ExitStack], ty.Callable[[], ty.Any]]
+
+BENCHMARKS: ty.Dict[str, _Setup] = {}
+
+
+def benchmark(name: str) -> ty.Callable[[_Setup], _Setup]:
+    """Register a benchmark under ``name``."""
+    def _register(setup: _Setup) -> _Setup:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return _register
+
+
+def _scaled(n: int, scale: float) -> int:
+    return max(1, round(n * scale))
+
+
+def _bench_patterns(n_keys: int) -> _Setup:
+    def setup(_scale, _stack):
+        keywords = corpus.make_keywords(corpus.CorpusSpec(keys=n_keys))
+
+        def run():
+            # compile from scratch rather than from the cache of ``re``
+            re.purge()
+            p = todotex.Patterns(keywords)
+            return p.key_matcher, p.cont, p.prefilter('utf-8')
+
+        return run
+
+    return setup
+
+
+benchmark('patterns/keys-12')(_bench_patterns(12))
+benchmark('patterns/keys-1000')(_bench_patterns(1000))
+
+
+def _bench_scan_doc(allow_continuation: bool, **spec_kwargs) -> _Setup:
+    def setup(scale, _stack):
+        spec = corpus.CorpusSpec(**spec_kwargs)
+        spec = spec._replace(lines=_scaled(spec.lines, scale))
+        keywords = corpus.make_keywords(spec)
+        p = todotex.Patterns(keywords)
+        doc = corpus.make_doc(spec, keywords)
+        return lambda: todotex.scan_tex_doc(doc, allow_continuation, p)
+
+    return setup
+
+
+benchmark('scan_tex_doc/plain')(_bench_scan_doc(False, lines=20000))
+benchmark('scan_tex_doc/continuation')(_bench_scan_doc(
+    True, lines=20000, continuation_depth=4))
+benchmark('scan_tex_doc/many-keys')(_bench_scan_doc(False,
+                                                    lines=20000,
+                                                    keys=300))
+benchmark('scan_tex_doc/dense-comments')(_bench_scan_doc(
+    False, lines=20000, comment_density=0.9, annotation_density=0.5))
+benchmark('scan_tex_doc/cjk-continuation')(_bench_scan_doc(
+    True, lines=20000, continuation_depth=4, cjk_ratio=0.5))
+benchmark('scan_tex_doc/deep-continuation')(_bench_scan_doc(
+    True, lines=20000, continuation_depth=1000))
+benchmark('scan_tex_doc/cjk-deep-continuation')(_bench_scan_doc(
+    True, lines=20000, continuation_depth=1000, cjk_ratio=0.5))
+benchmark('scan_tex_doc/long-lines')(_bench_scan_doc(False,
+                                                    lines=2000,
+                                                    long_line_every=20))
+
+
+def _bench_scan_text(**spec_kwargs) -> _Setup:
+    def setup(scale, _stack):
+        spec = corpus.CorpusSpec(**spec_kwargs)
+        spec = spec._replace(lines=_scaled(spec.lines, scale))
+        keywords = corpus.make_keywords(spec)
+        p = todotex.Patterns(keywords)
+        text = ''.join(corpus.make_doc(spec, keywords))
+        return lambda: todotex.scan_tex_text(text, False, p)
+
+    return setup
+
+
+benchmark('scan_tex_text/plain')(_bench_scan_text(lines=20000))
+benchmark('scan_tex_text/sparse')(_bench_scan_text(lines=20000,
+                                                   annotation_density=0.001))
+benchmark('scan_tex_text/dense-comments')(_bench_scan_text(
+    lines=20000, comment_density=0.9, annotation_density=0.5))
+
+
+def _bench_count_text(allow_continuation: bool, **spec_kwargs) -> _Setup:
+    def setup(scale, _stack):
+        spec = corpus.CorpusSpec(**spec_kwargs)
+        spec = spec._replace(lines=_scaled(spec.lines, scale))
+        keywords = corpus.make_keywords(spec)
+        p = todotex.Patterns(keywords)
+        text = ''.join(corpus.make_doc(spec, keywords))
+        return lambda: todotex.count_tex_text(text, allow_continuation, p)
+
+    return setup
+
+
+benchmark('count_tex_text/plain')(_bench_count_text(False, lines=20000))
+benchmark('count_tex_text/continuation')(_bench_count_text(
+    True, lines=20000, continuation_depth=4))
+benchmark('count_tex_text/long-lines')(_bench_count_text(
+    False, lines=2000, long_line_every=20))
+
+
+def _make_corpus_dir(spec: corpus.CorpusSpec,
+                     stack: contextlib.ExitStack) -> ty.Tuple[Path, ty.Any]:
+    root = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+    return root, corpus.make_corpus(root, spec)
+
+
+@benchmark('scan_fs_for_tex/serial')
+def _bench_scan_fs(scale, stack):
+    spec = corpus.CorpusSpec(files=_scaled(200, scale), continuation_depth=2)
+    root, keywords = _make_corpus_dir(spec, stack)
+    p = todotex.Patterns(keywords)
+    return lambda: todotex.scan_fs_for_tex([root], p, True, True, 'utf-8')
+
+
+@benchmark('scan_fs_for_tex/sparse')
+def _bench_scan_fs_sparse(scale, stack):
+    # most files have no annotations and are skipped by the prefilter
+    spec = corpus.CorpusSpec(files=_scaled(200, scale),
+                             annotation_density=0.001)
+    root, keywords = _make_corpus_dir(spec, stack)
+    p = todotex.Patterns(keywords)
+    return lambda: todotex.scan_fs_for_tex([root], p, True, False, 'utf-8')
+
+
+def _bench_show_result(heading: str, color: str) -> _Setup:
+    def setup(scale, _stack):
+        spec = corpus.CorpusSpec(lines=400,
+                                 comment_density=1.0,
+                                 annotation_density=0.5)
+        keywords = corpus.make_keywords(spec)
+        p = todotex.Patterns(keywords)
+        rng = random.Random(spec.seed)
+        per_file_annots = [
+            (Path(f'd{i % 32}/f{i}.tex'),
+             todotex.scan_tex_doc(corpus.make_doc(spec, keywords, rng),
+                                  False, p))
+            for i in range(_scaled(100, scale))
+        ]
+
+        def run():
+            interface.show_result(per_file_annots, keywords, True, True,
+                                  True, True, False, heading, color,
+                                  io.StringIO())
+
+        return run
+
+    return setup
+
+
+benchmark('show_result/heading')(_bench_show_result('always', 'never'))
+benchmark('show_result/prefix-color')(_bench_show_result('never', 'always'))
+
+
+def run_benchmark(name: str, scale: float, repeat: int) -> float:
+    """
+    :return: the best seconds per run of the benchmark
+    """
+    with contextlib.ExitStack() as stack:
+        timer = timeit.Timer(BENCHMARKS[name](scale, stack))
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat, number)) / number
+
+
+def compare(
+    results: ty.Dict[str, float],
+    baseline: ty.Dict[str, float],
+    threshold: float,
+) -> ty.List[str]:
+    """
+    :return: the names of the benchmarks slower than in ``baseline`` by
+             more than ``threshold``, e.g. 0.1 for 10%
+    """
+    return [
+        name for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k',
+                        dest='pattern',
+                        default='*',
+                        help='run only the benchmarks matching this glob')
+    parser.add_argument('--scale',
+                        type=float,
+                        default=1.0,
+                        help='scale the corpora by this factor')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save',
+                        type=Path,
+                        metavar='FILE',
+                        help='save the results as baseline to FILE')
+    parser.add_argument('--compare',
+                        type=Path,
+                        metavar='FILE',
+                        help='compare the results with the baseline in FILE')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as infile:
+            saved = json.load(infile)
+        if saved['scale'] != args.scale:
+            parser.error(f'the baseline is of scale {saved["scale"]}')
+        baseline = saved['results']
+    results = {}
+    for name in BENCHMARKS:
+        if not fnmatch.fnmatchcase(name, args.pattern):
+            continue
+        results[name] = run_benchmark(name, args.scale, args.repeat)
+        line = f'{name:<32} {results[name] * 1000:10.3f}ms'
+        if name in baseline:
+            line += f'  (x{results[name] / baseline[name]:.2f})'
+        print(line, flush=True)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as outfile:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'scale': args.scale,
+                    'results': results,
+                },
+                outfile,
+                indent=2)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'slower than baseline by more than {args.threshold:.0%}: '
+              f'{", ".join(regressions)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
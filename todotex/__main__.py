@@ -1,59 +1,290 @@
+import codecs
+import os
 import sys
 import itertools
+import contextlib
+import typing as ty
 from pathlib import Path
 
-if sys.platform == 'win32':
-    try:
-        import chardet
-    except ImportError:
-        import locale
-        chardet = locale.getpreferredencoding(False)
-else:
-    chardet = 'utf-8'
-
-if sys.platform == 'win32':
-    import glob
-
-if sys.platform == 'win32':
-    try:
-        from colorama import just_fix_windows_console
-        just_fix_windows_console()
-        allow_color = True
-    except ImportError:
-        allow_color = False
-else:
-    allow_color = True
-
 from todotex import config
 from todotex import todotex
 from todotex import interface
 
+# The platform-specific modules below are imported only when needed, to
+# speed up startup.
+
+
+def get_chardet(encoding: str = None):
+    """
+    :param encoding: the ``--encoding`` option
+    :return: the ``chardet`` argument of ``todotex.scan_fs_for_tex``
+    """
+    if encoding == 'auto' or (encoding is None and sys.platform == 'win32'):
+        return todotex.EncodingDetector()
+    return encoding or 'utf-8'
+
+
+def init_color(color: str) -> str:
+    """
+    :param color: the ``--color`` option
+    :return: the ``--color`` option to use given the platform support
+    """
+    if sys.platform == 'win32' and color != 'never':
+        try:
+            from colorama import just_fix_windows_console
+            just_fix_windows_console()
+        except ImportError:
+            return 'never'
+    return color
+
+
+def parse_args(argv: ty.List[str] = None):
+    """
+    :param argv: the command line arguments, default to ``sys.argv[1:]``
+    """
+    parser = interface.make_parser()
+    args = parser.parse_args(argv)
+    if args.watch and not args.files_or_dirs:
+        parser.error('--watch requires PATH')
+    if args.root and (args.files_or_dirs or args.files_from or args.watch
+                      or args.git or args.since or args.archives):
+        parser.error('--root cannot be used with PATH, --files-from, --watch, '
+                     '--git or --archives')
+    if args.archives and (args.watch or args.git or args.since):
+        parser.error('--archives cannot be used with --watch or --git')
+    if args.watch and (args.git or args.since):
+        parser.error('--watch cannot be used with --git')
+    if args.follow_symlinks and (args.git or args.since):
+        # git lists the files it tracks without walking the directories
+        parser.error('--follow-symlinks cannot be used with --git')
+    if args.files_from and args.watch:
+        parser.error('--files-from cannot be used with --watch')
+    if args.null and not args.files_from:
+        parser.error('-0 requires --files-from')
+    if args.serve:
+        # imported only when needed, to speed up startup
+        import socket
+        if not hasattr(socket, 'AF_UNIX'):
+            parser.error('--serve requires Unix domain sockets')
+    if args.encoding and args.encoding != 'auto':
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            parser.error(f'unknown encoding: {args.encoding}')
+    return args
+
 
 def main():
-    args = interface.make_parser().parse_args()
+    args = parse_args()
+    if args.serve:
+        from todotex import daemon
+        daemon.serve(args.socket, args.cache_size)
+        return
     keywords = config.read_cfg(args.config)
     pat = todotex.Patterns(keywords)
-    if args.files_or_dirs:
+    run(args, keywords, pat)
+
+
+def run(args, keywords, pat, cache_opener=None):
+    """
+    :param args: the parsed command line arguments
+    :param keywords: the keywords configuration
+    :param pat: the patterns of ``keywords``
+    :param cache_opener: a function like ``open_cache``, default to
+           ``open_cache``
+    """
+    cache_opener = cache_opener or open_cache
+    stats = todotex.ScanStats(
+        todotex.ScanProfile(args.stats_top) if args.stats else None)
+    chardet = get_chardet(args.encoding)
+    if args.root:
+        scan_graph_and_show(pat, chardet, keywords, args, stats, cache_opener)
+    elif args.files_or_dirs or args.files_from:
         if sys.platform == 'win32':
+            import glob
             files_or_dirs = map(
                 Path,
                 itertools.chain.from_iterable(
                     map(glob.glob, args.files_or_dirs)))
         else:
             files_or_dirs = map(Path, args.files_or_dirs)
-        annots = todotex.scan_fs_for_tex(
-            files_or_dirs,
+        if args.files_from:
+            files_or_dirs = itertools.chain(
+                files_or_dirs, iter_files_from(args.files_from, args.null))
+        if args.watch:
+            watch_and_show(files_or_dirs, pat, chardet, keywords, args, stats)
+            return
+        if args.git or args.since:
+            from todotex import gitfiles
+            texfiles = gitfiles.iter_git_tex_files(
+                files_or_dirs,
+                args.recursive,
+                args.since,
+                args.include,
+                args.exclude,
+            )
+        else:
+            texfiles = todotex.walk_tex_files(
+                files_or_dirs,
+                args.recursive,
+                args.include,
+                args.exclude,
+                args.follow_symlinks,
+                args.archives,
+            )
+        if stats.profile is not None:
+            texfiles = stats.profile.timed('walk', texfiles)
+        scan_and_show(texfiles, pat, chardet, keywords, args, stats,
+                      cache_opener)
+    elif args.count or args.summary:
+        counts = [(None,
+                   todotex.count_tex_text(
+                       sys.stdin.read(),
+                       args.allow_continuation,
+                       pat,
+                   ))]
+        show_counts(counts, keywords, args, stats.profile)
+    else:
+        annots = [(None,
+                   todotex.iter_scan_tex_doc(
+                       sys.stdin,
+                       args.allow_continuation,
+                       pat,
+                   ))]
+        show_result(annots, keywords, args, stats.profile)
+    if args.stats:
+        stats.profile.finish()
+        interface.show_stats(stats, fmt=args.stats_format)
+
+
+def iter_files_from(filename: str, null: bool) -> ty.Iterator[Path]:
+    """
+    :param filename: the ``--files-from`` option, ``-`` for stdin
+    :param null: the ``-0`` option
+    :return: the paths listed, read as they are consumed
+    """
+    if filename == '-':
+        yield from todotex.iter_path_list(sys.stdin.buffer, null)
+        return
+    with open(filename, 'rb') as infile:
+        yield from todotex.iter_path_list(infile, null)
+
+
+def open_cache(keywords, chardet, args):
+    """
+    :return: a context manager of the annotation cache, or of ``None`` if
+             ``--cache`` is not given
+    """
+    if not args.cache:
+        return contextlib.nullcontext()
+    from todotex import cache
+    return cache.AnnotationCache(
+        args.cache_dir or cache.default_cache_dir(),
+        cache_fingerprint(keywords, chardet, args),
+        args.cache_size,
+    )
+
+
+def cache_fingerprint(keywords, chardet, args) -> str:
+    from todotex import cache
+    if isinstance(chardet, str):
+        encoding = chardet
+    elif isinstance(chardet, todotex.EncodingDetector):
+        encoding = 'auto'
+    else:
+        encoding = None
+    return cache.fingerprint(keywords, args.allow_continuation, encoding)
+
+
+def scan_and_show(texfiles, pat, chardet, keywords, args, stats,
+                  cache_opener):
+    if args.count or args.summary:
+        # counted without building the annotations, and thus not cached
+        counts = todotex.iter_count_tex_files(
+            texfiles,
             pat,
-            args.recursive,
             args.allow_continuation,
             chardet,
+            args.jobs,
+            args.pool,
+            stats,
         )
-    else:
-        annots = todotex.scan_tex_doc(
-            sys.stdin,
+        show_counts(counts, keywords, args, stats.profile)
+        return
+    with cache_opener(keywords, chardet, args) as annot_cache:
+        annots = todotex.iter_scan_tex_files(
+            texfiles,
+            pat,
             args.allow_continuation,
+            chardet,
+            args.jobs,
+            args.pool,
+            annot_cache,
+            stats,
+        )
+        show_result(annots, keywords, args, stats.profile)
+
+
+def scan_graph_and_show(pat, chardet, keywords, args, stats, cache_opener):
+    from todotex import deps
+    workers = args.jobs
+    if workers == 1:
+        workers = deps.DEFAULT_WORKERS
+    elif workers < 1:
+        workers = os.cpu_count() or 1
+    with cache_opener(keywords, chardet, args) as annot_cache:
+        annots = deps.iter_scan_tex_graph(
+            args.root,
             pat,
+            args.allow_continuation,
+            chardet,
+            workers,
+            annot_cache,
+            stats,
         )
+        show_result(annots, keywords, args, stats.profile)
+
+
+def watch_and_show(files_or_dirs, pat, chardet, keywords, args, stats):
+    from todotex import watch
+    for annots in watch.iter_watch(
+            files_or_dirs,
+            pat,
+            args.recursive,
+            args.allow_continuation,
+            chardet,
+            include=args.include,
+            exclude=args.exclude,
+            follow_symlinks=args.follow_symlinks,
+            stats=stats,
+    ):
+        if args.format == 'text' and sys.stdout.isatty():
+            interface.clear_screen()
+        show_result(annots, keywords, args)
+        sys.stdout.flush()
+
+
+def show_result(annots, keywords, args, profile=None):
+    """
+    :param profile: if not ``None``, the ``todotex.ScanProfile`` to record
+           the time spent showing the result in
+    """
+    if profile is not None:
+        profile.time_consumer(
+            'show', annots, lambda annots: show_result(annots, keywords, args))
+        return
+    if args.count or args.summary:
+        show_counts(((path, _count_keys(file_annots))
+                     for path, file_annots in annots), keywords, args)
+        return
+    if args.format == 'jsonl':
+        interface.show_result_jsonl(
+            annots,
+            keywords,
+            args.print_done,
+            args.absolute_path,
+        )
+        return
     interface.show_result(
         annots,
         keywords,
@@ -63,10 +294,38 @@ def main():
         args.print_message,
         args.absolute_path,
         args.heading,
-        args.color if allow_color else 'never',
+        init_color(args.color),
     )
 
 
+def show_counts(counts, keywords, args, profile=None):
+    """
+    :param counts: the TeX files mapped to the number of their annotations by
+           key, as pairs
+    :param profile: see ``show_result``
+    """
+    if profile is not None:
+        profile.time_consumer(
+            'show', counts, lambda counts: show_counts(counts, keywords, args))
+        return
+    interface.show_counts(
+        counts,
+        keywords,
+        args.print_done,
+        args.summary,
+        args.absolute_path,
+        init_color(args.color),
+        args.format,
+    )
+
+
+def _count_keys(annots) -> ty.Dict[str, int]:
+    counts = {}
+    for a in annots:
+        counts[a.key] = counts.get(a.key, 0) + 1
+    return counts
+
+
 if __name__ == '__main__':
     try:
         main()
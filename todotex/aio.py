@@ -0,0 +1,165 @@
+"""
+The asyncio API of todotex, to scan TeX files without blocking the event
+loop, e.g. when embedded in a web server. The files are read and scanned in
+an executor, and the patterns and the annotations are those of
+``todotex.todotex``.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import (
+    EncodingDetector,
+    Patterns,
+    ScanStats,
+    TexAnnotation,
+    scan_tex_doc,
+    scan_tex_text,
+    walk_tex_files,
+    _ModuleRef,
+    _scan_tex_file,
+)
+
+# the number of TeX files to read and scan at the same time by default
+DEFAULT_CONCURRENCY = 8
+
+
+async def ascan_doc(
+    doc: ty.Union[str, ty.Iterable[str]],
+    allow_continuation: bool,
+    p: Patterns,
+    *,
+    executor: concurrent.futures.Executor = None,
+    timeout: float = None,
+) -> ty.List[TexAnnotation]:
+    """
+    Same as ``scan_tex_doc``, but in ``executor``.
+
+    :param doc: the whole text, or an iterable of lines
+    :param allow_continuation: whether to allow message continuation
+    :param p: the patterns
+    :param executor: default to the default executor of the event loop
+    :param timeout: if not ``None``, the seconds to scan in at most
+    :return: the annotations
+    :raise asyncio.TimeoutError: if not scanned in ``timeout``
+    """
+    loop = asyncio.get_running_loop()
+    scan = scan_tex_text if isinstance(doc, str) else scan_tex_doc
+    return await asyncio.wait_for(
+        loop.run_in_executor(executor, scan, doc, allow_continuation, p),
+        timeout)
+
+
+def _take(iterator: ty.Iterator, n: int) -> list:
+    return list(itertools.islice(iterator, n))
+
+
+async def ascan_paths(
+    paths: ty.Iterable[Path],
+    p: Patterns,
+    recursive: bool,
+    allow_continuation: bool,
+    chardet,
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    executor: concurrent.futures.Executor = None,
+    timeout: float = None,
+    include: ty.Sequence[str] = (),
+    exclude: ty.Sequence[str] = (),
+    follow_symlinks: bool = False,
+    stats: ScanStats = None,
+) -> ty.AsyncIterator[ty.Tuple[Path, ty.List[TexAnnotation]]]:
+    """
+    Find the TeX files in ``paths``, and yield those with annotations along
+    with their annotations as soon as they are scanned, in the order they
+    complete. The files are found in the default executor of the event
+    loop, and read and scanned in ``executor``.
+
+    Once the iteration is cancelled, times out, or is closed early, e.g. by
+    ``break`` out of ``async for``, the files not yet started are no longer
+    scanned; those being scanned finish in the background.
+
+    :param paths: see ``walk_tex_files``
+    :param p: the patterns
+    :param recursive: see ``walk_tex_files``
+    :param allow_continuation: whether to allow message continuation
+    :param chardet: see ``iter_scan_tex_files``
+    :param concurrency: the maximum number of files to read and scan at the
+           same time
+    :param executor: default to the default executor of the event loop,
+           which is a thread pool; if a process pool, the patterns are sent
+           to the workers with each file
+    :param timeout: if not ``None``, the seconds to scan all the files in at
+           most, counted from the first iteration
+    :param include: see ``walk_tex_files``
+    :param exclude: see ``walk_tex_files``
+    :param follow_symlinks: see ``walk_tex_files``
+    :param stats: if not ``None``, the statistics to add to
+    :return: an async iterator of TeX file paths and their annotations
+    :raise asyncio.TimeoutError: if not done in ``timeout``
+    """
+    if concurrency < 1:
+        raise ValueError(f'concurrency must be positive: {concurrency}')
+    if stats is None:
+        stats = ScanStats()
+    if (isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+            and not isinstance(chardet, (str, EncodingDetector))):
+        chardet = _ModuleRef(chardet)
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    texfiles = walk_tex_files(paths, recursive, include, exclude,
+                              follow_symlinks)
+    # the TeX files found but not yet submitted
+    found: ty.Deque[Path] = collections.deque()
+    walking: ty.Optional[asyncio.Future] = None
+    walked = False
+    scanning: ty.Dict[asyncio.Future, Path] = {}
+    try:
+        while True:
+            while found and len(scanning) < concurrency:
+                path = found.popleft()
+                scanning[loop.run_in_executor(executor, _scan_tex_file, path,
+                                              p, allow_continuation,
+                                              chardet)] = path
+            # walk ahead by as many files as may be scanned at the same time,
+            # in a thread, even if ``executor`` is a process pool
+            if not walked and walking is None and len(found) < concurrency:
+                walking = loop.run_in_executor(None, _take, texfiles,
+                                               concurrency)
+            waiting = set(scanning)
+            if walking is not None:
+                waiting.add(walking)
+            if not waiting:
+                return
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait(
+                waiting,
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                raise asyncio.TimeoutError
+            if walking in done:
+                batch = walking.result()
+                walking = None
+                walked = not batch
+                found.extend(batch)
+                stats.files += len(batch)
+            for fut in done:
+                path = scanning.pop(fut, None)
+                if path is None:
+                    continue
+                annots, prefiltered, _, _ = fut.result()
+                stats.prefiltered += prefiltered
+                if annots:
+                    yield path, annots
+    finally:
+        for fut in scanning:
+            fut.cancel()
+        if walking is not None:
+            walking.cancel()
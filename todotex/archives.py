@@ -0,0 +1,73 @@
+import tarfile
+import zipfile
+import zlib
+import typing as ty
+
+from todotex.todotex import TexArchive, _is_tex_name, _match_walked
+
+
+def iter_tex_members(
+        archive: TexArchive) -> ty.Iterator[ty.Tuple[str, bytes]]:
+    """
+    Read the TeX files in a tar or zip archive one at a time, in the order
+    they are stored, without extracting them to disk. A tar archive is read
+    as a stream, so that a compressed one is decompressed only once.
+
+    :param archive: the archive, and the globs to filter its TeX files by as
+           ``walk_tex_files`` does
+    :return: the path of each TeX file relative to the archive, separated by
+             '/', and its content
+    :raise OSError: if the archive cannot be read
+    """
+    try:
+        if archive.path.name.endswith('.zip'):
+            yield from _iter_zip_members(archive)
+        else:
+            yield from _iter_tar_members(archive)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error,
+            RuntimeError) as err:
+        # ``zlib.error`` if a member is corrupt, and ``RuntimeError``,
+        # including ``NotImplementedError``, if a zip member is encrypted or
+        # compressed by an unsupported method
+        raise OSError(f'cannot read archive {archive.path}: {err}') from err
+
+
+def _iter_tar_members(
+        archive: TexArchive) -> ty.Iterator[ty.Tuple[str, bytes]]:
+    # 'r|*' reads from the start to the end, with any compression
+    with tarfile.open(archive.path, 'r|*') as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            relpath = _tex_relpath(archive, info.name)
+            if relpath is not None:
+                yield relpath, tar.extractfile(info).read()
+
+
+def _iter_zip_members(
+        archive: TexArchive) -> ty.Iterator[ty.Tuple[str, bytes]]:
+    with zipfile.ZipFile(archive.path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            relpath = _tex_relpath(archive, info.filename)
+            if relpath is not None:
+                yield relpath, zf.read(info)
+
+
+def _tex_relpath(archive: TexArchive, name: str) -> ty.Optional[str]:
+    """
+    :param name: the name of a member of ``archive``
+    :return: the normalized path of the member relative to ``archive`` if it
+             is a TeX file to scan, otherwise ``None``
+    """
+    # e.g. './ch/intro.tex' and 'ch//intro.tex' as 'ch/intro.tex'
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or not _is_tex_name(parts[-1]):
+        return None
+    if not archive.recursive and len(parts) > 1:
+        return None
+    if not _match_walked(parts, archive.reldir, archive.include_globs,
+                         archive.exclude_globs):
+        return None
+    return '/'.join(parts)
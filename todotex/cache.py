@@ -0,0 +1,300 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import typing as ty
+from pathlib import Path
+
+from todotex.config import KeywordsConfig
+from todotex.todotex import TexAnnotation
+
+# bump whenever the meaning of the cached data changes
+_SCHEMA_VERSION = 1
+
+# (st_mtime_ns, st_size, st_ino)
+Stamp = ty.Tuple[int, int, int]
+
+
+def default_cache_dir() -> Path:
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    if xdg_cache_home:
+        return Path(xdg_cache_home) / 'todotex'
+    return Path('~/.cache/todotex').expanduser()
+
+
+def fingerprint(
+    keywords: KeywordsConfig,
+    allow_continuation: bool,
+    encoding: ty.Optional[str],
+) -> str:
+    """
+    Hash everything other than the file content that affects the
+    annotations scanned from a file.
+
+    :param keywords: the keywords configuration
+    :param allow_continuation: whether to allow message continuation
+    :param encoding: the encoding the TeX files are opened with, ``'auto'``
+           if detected per file by ``todotex.EncodingDetector``, or ``None``
+           if detected per file by ``chardet``
+    """
+    obj = [
+        _SCHEMA_VERSION,
+        list(keywords.todo.items()),
+        list(keywords.done.items()),
+        allow_continuation,
+        encoding,
+    ]
+    return hashlib.sha1(json.dumps(obj).encode('utf-8')).hexdigest()
+
+
+class AnnotationCache:
+    """
+    A persistent cache of the annotations per TeX file, stored in a sqlite
+    database. An entry is valid only if the file's mtime, size and inode, and
+    the fingerprint of the configuration, are unchanged since it was stored.
+    When there are more than ``max_entries`` entries upon ``close``, the least
+    recently used ones are evicted.
+
+    The include directives of the TeX files (see ``todotex.deps``) are cached
+    in the same way, and so are the detected encodings, except that they do
+    not depend on the fingerprint.
+
+    It's recommended to use as context manager so as not to forget closing
+    the cache, which is when the changes are committed. The cache may be
+    shared among threads.
+    """
+    _tables = ('annots', 'includes', 'encodings')
+    # the tables whose entries do not depend on the fingerprint
+    _fp_free_tables = ('encodings', )
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        fp: str,
+        max_entries: int = 100000,
+    ) -> None:
+        """
+        :param cache_dir: the directory to hold the database
+        :param fp: the fingerprint, see ``fingerprint``
+        :param max_entries: the maximum number of files to remember
+        """
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(cache_dir / 'annotations.sqlite3'),
+                                     check_same_thread=False)
+        self._lock = threading.Lock()
+        self._clock = 0
+        for table in self._tables:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                               'path TEXT PRIMARY KEY, '
+                               'mtime_ns INTEGER, size INTEGER, ino INTEGER, '
+                               'fp TEXT, used INTEGER, data TEXT)')
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_used '
+                               f'ON {table} (used)')
+            row = self._conn.execute(
+                f'SELECT MAX(used) FROM {table}').fetchone()
+            self._clock = max(self._clock, row[0] or 0)
+        self._fp = fp
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, table: str, path: Path) -> ty.Tuple[ty.Any, Stamp]:
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        key = os.path.abspath(path)
+        fp = '' if table in self._fp_free_tables else self._fp
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT mtime_ns, size, ino, fp, data FROM {table} '
+                'WHERE path = ?', (key, )).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, stamp
+            if tuple(row[:3]) != stamp or row[3] != fp:
+                self._conn.execute(f'DELETE FROM {table} WHERE path = ?',
+                                   (key, ))
+                self.misses += 1
+                return None, stamp
+            self._clock += 1
+            self._conn.execute(f'UPDATE {table} SET used = ? WHERE path = ?',
+                               (self._clock, key))
+            self.hits += 1
+        return json.loads(row[4]), stamp
+
+    def _put(self, table: str, path: Path, stamp: Stamp, obj) -> None:
+        data = json.dumps(obj)
+        fp = '' if table in self._fp_free_tables else self._fp
+        with self._lock:
+            self._clock += 1
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {table} '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (os.path.abspath(path), *stamp, fp, self._clock, data))
+
+    def lookup(
+        self,
+        path: Path,
+    ) -> ty.Tuple[ty.Optional[ty.List[TexAnnotation]], Stamp]:
+        """
+        :param path: the TeX file
+        :return: the cached annotations, or ``None`` if not cached or stale;
+                 and the stamp of the file to pass to ``put``
+        """
+        data, stamp = self._lookup('annots', path)
+        if data is None:
+            return None, stamp
+        # share the key strings among the annotations
+        return [
+            TexAnnotation(ln, pfxlen, sys.intern(key), msg)
+            for ln, pfxlen, key, msg in data
+        ], stamp
+
+    def put(
+        self,
+        path: Path,
+        stamp: Stamp,
+        annots: ty.List[TexAnnotation],
+    ) -> None:
+        """
+        :param path: the TeX file
+        :param stamp: the stamp returned by ``lookup`` before scanning
+        :param annots: the annotations scanned
+        """
+        self._put('annots', path, stamp,
+                  [[a.ln, a.pfxlen, a.key, a.msg] for a in annots])
+
+    def lookup_includes(
+        self,
+        path: Path,
+    ) -> ty.Tuple[ty.Optional[ty.List[ty.Tuple[str, str, str]]], Stamp]:
+        """
+        Same as ``lookup``, but for the include directives.
+        """
+        data, stamp = self._lookup('includes', path)
+        if data is None:
+            return None, stamp
+        return [tuple(d) for d in data], stamp
+
+    def put_includes(
+        self,
+        path: Path,
+        stamp: Stamp,
+        includes: ty.List[ty.Tuple[str, str, str]],
+    ) -> None:
+        """
+        Same as ``put``, but for the include directives.
+        """
+        self._put('includes', path, stamp, includes)
+
+    def lookup_encoding(self, path: Path) -> ty.Tuple[ty.Optional[str], Stamp]:
+        """
+        Same as ``lookup``, but for the detected encoding.
+        """
+        return self._lookup('encodings', path)
+
+    def put_encoding(self, path: Path, stamp: Stamp, encoding: str) -> None:
+        """
+        Same as ``put``, but for the detected encoding.
+        """
+        self._put('encodings', path, stamp, encoding)
+
+    def close(self) -> None:
+        for table in self._tables:
+            n_entries = self._conn.execute(
+                f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if n_entries > self._max_entries:
+                self._conn.execute(
+                    f'DELETE FROM {table} WHERE path IN ('
+                    f'SELECT path FROM {table} ORDER BY used LIMIT ?)',
+                    (n_entries - self._max_entries, ))
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        self.close()
+
+
+class MemoryAnnotationCache:
+    """
+    An in-memory counterpart of ``AnnotationCache``, for a long-running
+    process such as the daemon, with the same interface. Unlike
+    ``AnnotationCache``, it does not depend on the fingerprint, so one cache
+    should be kept per fingerprint.
+    """
+    def __init__(self, max_entries: int = 100000) -> None:
+        """
+        :param max_entries: the maximum number of files to remember
+        """
+        # (table, absolute path) -> (stamp, data), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, table: str, path: Path) -> ty.Tuple[ty.Any, Stamp]:
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        key = table, os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None, stamp
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[1], stamp
+
+    def _put(self, table: str, path: Path, stamp: Stamp, obj) -> None:
+        key = table, os.path.abspath(path)
+        with self._lock:
+            self._entries[key] = stamp, obj
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(
+        self,
+        path: Path,
+    ) -> ty.Tuple[ty.Optional[ty.List[TexAnnotation]], Stamp]:
+        """See ``AnnotationCache.lookup``."""
+        return self._lookup('annots', path)
+
+    def put(
+        self,
+        path: Path,
+        stamp: Stamp,
+        annots: ty.List[TexAnnotation],
+    ) -> None:
+        """See ``AnnotationCache.put``."""
+        self._put('annots', path, stamp, annots)
+
+    def lookup_includes(
+        self,
+        path: Path,
+    ) -> ty.Tuple[ty.Optional[ty.List[ty.Tuple[str, str, str]]], Stamp]:
+        """See ``AnnotationCache.lookup_includes``."""
+        return self._lookup('includes', path)
+
+    def put_includes(
+        self,
+        path: Path,
+        stamp: Stamp,
+        includes: ty.List[ty.Tuple[str, str, str]],
+    ) -> None:
+        """See ``AnnotationCache.put_includes``."""
+        self._put('includes', path, stamp, includes)
+
+    def lookup_encoding(self, path: Path) -> ty.Tuple[ty.Optional[str], Stamp]:
+        """See ``AnnotationCache.lookup_encoding``."""
+        return self._lookup('encodings', path)
+
+    def put_encoding(self, path: Path, stamp: Stamp, encoding: str) -> None:
+        """See ``AnnotationCache.put_encoding``."""
+        self._put('encodings', path, stamp, encoding)
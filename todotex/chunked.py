@@ -0,0 +1,230 @@
+import codecs
+import mmap
+import re
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import (
+    Patterns,
+    TexAnnotation,
+    _ContinuationBlock,
+    _Stopwatch,
+    _detect_encoding,
+    _is_ascii_transparent,
+)
+
+# the number of bytes ``iter_scan_tex_buffer`` counts the newlines in at a
+# time
+_CHUNK_SIZE = 1024 * 1024
+# the default maximum number of characters of a message captured by
+# ``iter_scan_tex_buffer``
+MAX_MSG_LEN = 4096
+
+_NEWLINE = re.compile(rb'[\r\n]')
+
+
+def iter_scan_tex_buffer(
+    buf: ty.Union[bytes, mmap.mmap],
+    encoding: str,
+    allow_continuation: bool,
+    p: Patterns,
+    max_msg_len: int = MAX_MSG_LEN,
+    msg: bool = True,
+) -> ty.Iterator[TexAnnotation]:
+    """
+    Same as ``iter_scan_tex_doc`` over the lines of the undecoded content of
+    a TeX file, e.g. a memory map of a file of several GB, but using memory
+    bounded by ``max_msg_len`` regardless of how large the content or its
+    lines are. As in ``iter_scan_tex_text``, the lines that may have an
+    annotation are located by searching ``p.prefilter(encoding)``, in the
+    bytes; only a window of each such line from the comment sign, and of
+    each continuation line, is decoded, long enough for a message of
+    ``max_msg_len`` characters; and the newlines in between are counted
+    ``_CHUNK_SIZE`` bytes at a time, so that a line may span any number of
+    chunks.
+
+    :param buf: the content
+    :param encoding: the encoding, which must be such that
+           ``_is_chunkable(encoding)``; invalid bytes are decoded as U+FFFD
+    :param allow_continuation: whether to allow message continuation
+    :param p: the patterns, such that ``p.prefilter(encoding)`` is not
+           ``None``
+    :param max_msg_len: the number of characters to truncate the messages
+           to, including their continuation
+    :param msg: whether to capture the messages; if not, the ``msg`` of the
+           annotations is ``None``
+    :return: the annotations
+    """
+    prefilter = p.prefilter(encoding)
+    key_match_at = p.key_matcher._match_at
+    cont_match = p.cont.match
+    size = len(buf)
+    start = 0
+    if encoding.lower().replace('_', '-') in ('utf-8-sig', 'utf8-sig'):
+        # UTF-8 after the byte order mark, as in ``Patterns.prefilter``
+        if buf[:3] == codecs.BOM_UTF8:
+            start = 3
+        encoding = 'utf-8'
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    # room for the comment sign, the prefix space and the key, followed by
+    # a message of ``max_msg_len`` characters of up to 4 bytes each
+    window = 1024 + 4 * max_msg_len
+
+    def decode(begin: int, end: int) -> str:
+        """Decode the line ending at ``end`` from ``begin``, up to
+        ``window`` bytes, leaving out the last character if cut."""
+        decoder.reset()
+        return decoder.decode(buf[begin:min(end, begin + window)])
+
+    def find_end(begin: int) -> int:
+        """Find the end of the line ``begin`` is in."""
+        matched = _NEWLINE.search(buf, begin)
+        return matched.start() if matched else size
+
+    def next_line(end: int) -> int:
+        """Find the start of the line after the one ending at ``end``."""
+        if buf[end:end + 2] == b'\r\n':
+            return end + 2
+        return end + 1
+
+    # the line number of the line starting at ``line_start``
+    ln = 1
+    line_start = start
+    # where the next line to scan starts
+    pos = start
+    # where the line of the last candidate not matched ends, if any
+    end = -1
+    for matched in prefilter.finditer(buf, start):
+        cand_start = matched.start()
+        if cand_start < pos:
+            # on a line already scanned
+            continue
+        if cand_start > end:
+            if end >= pos:
+                pos = next_line(end)
+            cand_line_start = max(pos - 1, buf.rfind(b'\n', pos, cand_start),
+                                  buf.rfind(b'\r', pos, cand_start)) + 1
+            end = find_end(cand_start)
+        # the same as ``KeyMatcher.search``, which skips escaped '%', and
+        # finds no key at a '%' before the first candidate of a line
+        if cand_start > cand_line_start and buf[cand_start - 1] == 0x5c:
+            continue
+        key_matched = key_match_at(decode(cand_start, end), 0, msg)
+        if not key_matched:
+            continue
+        ln += _count_newlines(buf, line_start, cand_line_start)
+        line_start = cand_line_start
+        annot = TexAnnotation(ln, len(key_matched.pfx_space),
+                              key_matched.key,
+                              key_matched.msg and
+                              key_matched.msg[:max_msg_len])
+        pos = next_line(end)
+        if allow_continuation:
+            block = _ContinuationBlock(annot, p, max_msg_len)
+            while pos < size:
+                cont_end = find_end(pos)
+                cont = cont_match(decode(pos, cont_end))
+                if not cont or len(cont.group('pfx_space')) <= annot.pfxlen:
+                    break
+                if msg:
+                    block.extend(cont.group('msg'))
+                pos = next_line(cont_end)
+            if msg:
+                annot = block.close()
+        yield annot
+
+
+def _count_newlines(buf: ty.Union[bytes, mmap.mmap], begin: int,
+                    end: int) -> int:
+    """
+    Count the newlines, i.e. '\\r\\n', '\\r' and '\\n', in
+    ``buf[begin:end]``, ``_CHUNK_SIZE`` bytes at a time.
+
+    :param end: the end, not in between '\\r' and '\\n'
+    """
+    n = 0
+    for i in range(begin, end, _CHUNK_SIZE):
+        chunk = buf[i:min(i + _CHUNK_SIZE, end)]
+        n += chunk.count(b'\n') + chunk.count(b'\r') - chunk.count(b'\r\n')
+        # a '\r\n' across two chunks
+        if (chunk.endswith(b'\r') and i + _CHUNK_SIZE < end
+                and buf[i + _CHUNK_SIZE] == 0x0a):
+            n -= 1
+    return n
+
+
+def _is_chunkable(encoding: str) -> bool:
+    """
+    Whether text in ``encoding`` can be decoded from any ASCII byte in it,
+    which stands for the very ASCII character, i.e. whether the encoding is
+    UTF-8 or a single-byte encoding, as ``iter_scan_tex_buffer`` requires.
+    """
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    if name in ('utf-8', 'utf-8-sig'):
+        return True
+    return (_is_ascii_transparent(encoding)
+            and len(bytes(range(256)).decode(encoding, 'replace')) == 256)
+
+
+def scan_tex_file_mmap(
+    path: Path,
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    encoding: ty.Optional[str],
+    stopwatch: ty.Optional[_Stopwatch],
+    count: bool,
+) -> ty.Optional[tuple]:
+    """
+    Scan a TeX file too large to read whole by ``iter_scan_tex_buffer`` over
+    a memory map of it, with the encoding detected from its first 64 KiB.
+    See ``todotex.todotex._scan_tex_file`` for the parameters.
+
+    :return: what ``_scan_tex_file`` returns, or ``None`` if the encoding or
+             the keys don't allow scanning in place
+    """
+    with open(path, 'rb') as infile, mmap.mmap(
+            infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if stopwatch is not None:
+            stopwatch.lap('read')
+        sample = mm[:1024 * 64]
+        if len(sample) < len(mm):
+            # leave out the last character, which may be cut, if in UTF-8
+            cut = len(sample) - 1
+            while cut > len(sample) - 4 and sample[cut] & 0xc0 == 0x80:
+                cut -= 1
+            sample = sample[:cut]
+        ec = _detect_encoding(sample, chardet, encoding)
+        if stopwatch is not None:
+            stopwatch.lap('detect')
+        prefilter = p.prefilter(ec) if ec else None
+        if prefilter is None or not _is_chunkable(ec):
+            return None
+        if not prefilter.search(mm):
+            empty = {} if count else []
+            if stopwatch is not None:
+                stopwatch.lap('scan')
+                return empty, True, ec, stopwatch.profile_sizes(
+                    len(mm), False, 0, 0)
+            return empty, True, ec, None
+        annots = iter_scan_tex_buffer(mm, ec, allow_continuation, p,
+                                      msg=not count)
+        if count:
+            counts: ty.Dict[str, int] = {}
+            for annot in annots:
+                counts[annot.key] = counts.get(annot.key, 0) + 1
+            annots = counts
+        else:
+            annots = list(annots)
+        if stopwatch is not None:
+            stopwatch.lap('scan')
+            # the lines are counted only to be profiled
+            lines = _count_newlines(mm, 0, len(mm))
+            lines += mm[-1:] not in (b'\n', b'\r')
+            n_annots = sum(annots.values()) if count else len(annots)
+            return annots, False, ec, stopwatch.profile_sizes(
+                len(mm), True, lines, n_annots)
+        return annots, False, ec, None
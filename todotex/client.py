@@ -0,0 +1,185 @@
+"""
+The thin client of the todotex daemon (see ``todotex.daemon``), which
+forwards the command line arguments to the daemon and streams back the
+output, without paying for the startup of todotex. If no daemon is running,
+todotex runs in this process instead.
+
+Usage::
+
+    python -m todotex.client [the arguments to todotex]
+
+The socket is the one given by ``--socket``, as to ``todotex --serve``, or
+else at ``$TODOTEX_SOCKET`` if set, otherwise at
+``$XDG_RUNTIME_DIR/todotex.sock`` or ``/tmp/todotex-$UID.sock``. It is used
+only if it is a socket owned by the current user, since anyone may create
+one in ``/tmp`` to receive the requests. Where Unix domain sockets are not
+available, as on Windows, todotex always runs in this process.
+"""
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import typing as ty
+
+# A frame is a one-byte kind followed by the length of the payload and the
+# payload. The client sends a request (REQUEST), and the server replies with
+# the output (STDOUT, STDERR) and eventually the exit status (EXIT). Whenever
+# the server needs more of the standard input, it sends an empty STDIN frame,
+# to which the client replies with a STDIN frame of the next chunk of its
+# standard input, empty at the end, so that the standard input is streamed
+# rather than held in memory at once.
+_HEADER = struct.Struct('>cI')
+REQUEST = b'r'
+STDOUT = b'o'
+STDERR = b'e'
+STDIN = b'i'
+EXIT = b'x'
+# the maximum size of the payload of a STDIN frame
+_STDIN_CHUNK = 65536
+
+
+def default_socket_path() -> str:
+    path = os.environ.get('TODOTEX_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'todotex.sock')
+    if hasattr(os, 'getuid'):
+        return f'/tmp/todotex-{os.getuid()}.sock'
+    # imported only when needed, to speed up startup
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), 'todotex.sock')
+
+
+def socket_path_in(argv: ty.List[str]) -> ty.Optional[str]:
+    """
+    :return: the last ``--socket`` option in ``argv``, if any
+    """
+    path = None
+    for i, arg in enumerate(argv):
+        if arg == '--':
+            break
+        if arg == '--socket' and i + 1 < len(argv):
+            path = argv[i + 1]
+        elif arg.startswith('--socket='):
+            path = arg[len('--socket='):]
+    return path
+
+
+def check_socket(path: str) -> None:
+    """
+    :raise FileNotFoundError: if ``path`` does not exist
+    :raise PermissionError: if ``path`` is not a socket owned by the current
+           user
+    """
+    st = os.stat(path)
+    if not stat.S_ISSOCK(st.st_mode):
+        raise PermissionError(f'not a socket: {path}')
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise PermissionError(f'not owned by the current user: {path}')
+
+
+def send_frame(sock: socket.socket, kind: bytes, payload: bytes) -> None:
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_frame(infile: ty.BinaryIO) -> ty.Tuple[bytes, bytes]:
+    """
+    :param infile: the socket as file, from ``socket.makefile('rb')``
+    :return: the kind and the payload
+    :raise EOFError: if the connection is closed
+    """
+    header = infile.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError
+    kind, size = _HEADER.unpack(header)
+    payload = infile.read(size)
+    if len(payload) < size:
+        raise EOFError
+    return kind, payload
+
+
+def request(sock: socket.socket, argv: ty.List[str]) -> int:
+    """
+    Send a request to the daemon, and stream its output to the standard
+    output and the standard error.
+
+    :param sock: the socket connected to the daemon
+    :param argv: the command line arguments
+    :return: the exit status
+    """
+    send_frame(
+        sock, REQUEST,
+        json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'isatty': sys.stdout.isatty(),
+            'encoding': sys.stdout.encoding,
+            'stdin_encoding': sys.stdin.encoding if sys.stdin else None,
+        }).encode('utf-8'))
+    with sock.makefile('rb') as infile:
+        while True:
+            try:
+                kind, payload = recv_frame(infile)
+            except EOFError:
+                print('todotex daemon disconnected', file=sys.stderr)
+                return 1
+            if kind == STDOUT:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif kind == STDERR:
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif kind == STDIN:
+                send_frame(sock, STDIN, _read_stdin())
+            elif kind == EXIT:
+                return int(payload)
+
+
+def _read_stdin() -> bytes:
+    """
+    :return: the next chunk of the standard input, or ``b''`` at the end
+    """
+    if sys.stdin is None:
+        return b''
+    return sys.stdin.buffer.read1(_STDIN_CHUNK)
+
+
+def _run_in_process() -> None:
+    # imported only when needed, to speed up startup
+    import runpy
+    runpy.run_module('todotex', run_name='__main__', alter_sys=True)
+
+
+def main():
+    if not hasattr(socket, 'AF_UNIX'):
+        # no daemon possible
+        _run_in_process()
+        return
+    path = socket_path_in(sys.argv[1:]) or default_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        check_socket(path)
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError) as err:
+        sock.close()
+        if isinstance(err, PermissionError):
+            print(f'todotex: ignoring the daemon socket: {err}',
+                  file=sys.stderr)
+        # no daemon running
+        _run_in_process()
+        return
+    with sock:
+        sys.exit(request(sock, sys.argv[1:]))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError:
+        pass
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -1,12 +1,15 @@
-import dataclasses
 import typing as ty
 from pathlib import Path
 
-import tomli
 
+class KeywordsConfig(ty.NamedTuple):
+    """
+    The todo and done keys mapped to their labels.
 
-@dataclasses.dataclass
-class KeywordsConfig:
+    A ``NamedTuple`` rather than a dataclass as in version 3.0, so that
+    importing it doesn't import ``dataclasses``. Thus it is immutable,
+    iterable and equal to the tuple of its fields.
+    """
     todo: ty.Dict[str, str]
     done: ty.Dict[str, str]
 
@@ -18,21 +21,29 @@ def _parse_cfg_obj(o):
     return d
 
 
-def read_cfg(config_path: Path = None):
+def cfg_read_order(config_path: Path = None) -> ty.List[Path]:
+    """
+    :return: the configuration files ``read_cfg`` tries in order
+    """
     read_order = [
         config_path,
         Path.cwd() / '.todotex.toml',
         Path('~/.config/todotex/todotex.toml').expanduser(),
         Path('~/.todotex.toml').expanduser(),
     ]
-    for path in read_order:
-        if path:
-            try:
-                with open(path, 'rb') as infile:
-                    cfg = tomli.load(infile)
-                return KeywordsConfig(
-                    _parse_cfg_obj(cfg.get('todo', [])),
-                    _parse_cfg_obj(cfg.get('done', [])))
-            except FileNotFoundError:
-                pass
+    return [path for path in read_order if path]
+
+
+def read_cfg(config_path: Path = None):
+    for path in cfg_read_order(config_path):
+        try:
+            with open(path, 'rb') as infile:
+                # imported only when needed, to speed up startup
+                import tomli
+                cfg = tomli.load(infile)
+            return KeywordsConfig(
+                _parse_cfg_obj(cfg.get('todo', [])),
+                _parse_cfg_obj(cfg.get('done', [])))
+        except FileNotFoundError:
+            pass
     return KeywordsConfig({}, {})
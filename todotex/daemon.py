@@ -0,0 +1,307 @@
+"""
+The todotex daemon, started by ``todotex --serve``, which answers the
+requests of ``todotex.client`` over a Unix domain socket, one at a time.
+
+Between requests, it keeps the compiled patterns per configuration, which are
+compiled again once the configuration files change, and the annotations of
+the scanned TeX files in memory, which are reused as long as the files are
+unchanged. The persistent cache of ``--cache`` is not used.
+"""
+import codecs
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import typing as ty
+from pathlib import Path
+
+from todotex import __main__ as cli
+from todotex import cache
+from todotex import config
+from todotex import todotex
+from todotex.client import (
+    EXIT,
+    REQUEST,
+    STDERR,
+    STDIN,
+    STDOUT,
+    default_socket_path,
+    recv_frame,
+    send_frame,
+)
+
+# the maximum number of configurations to keep the patterns or the
+# annotations of
+_MAX_CONFIGS = 16
+# the seconds to wait for a client, e.g. for its standard input, before
+# dropping it, so that a stalled client does not block the others
+_CONN_TIMEOUT = 30.0
+
+
+class _FrameWriter(io.RawIOBase):
+    """Write to the client as frames of the given kind."""
+    def __init__(self, sock: socket.socket, kind: bytes, isatty: bool):
+        super().__init__()
+        self._sock = sock
+        self._kind = kind
+        self._isatty = isatty
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        send_frame(self._sock, self._kind, bytes(b))
+        return len(b)
+
+    def isatty(self) -> bool:
+        return self._isatty
+
+
+class _FrameReader(io.RawIOBase):
+    """
+    Read the standard input of the client, requesting its next chunk as a
+    STDIN frame whenever the last one is consumed.
+    """
+    def __init__(self, sock: socket.socket, infile: ty.BinaryIO):
+        super().__init__()
+        self._sock = sock
+        self._infile = infile
+        self._chunk = memoryview(b'')
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        """
+        :raise ConnectionError: if the client replies with another frame
+        :raise EOFError: if the client disconnects
+        """
+        if not self._chunk and not self._eof:
+            send_frame(self._sock, STDIN, b'')
+            kind, payload = recv_frame(self._infile)
+            if kind != STDIN:
+                raise ConnectionError(f'unexpected frame: {kind!r}')
+            self._chunk = memoryview(payload)
+            self._eof = not payload
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+
+def _cfg_stamp(config_path: ty.Optional[Path]) -> tuple:
+    """
+    :return: what changes whenever ``config.read_cfg(config_path)`` may
+             return something else
+    """
+    stamp = []
+    for path in config.cfg_read_order(config_path):
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            stamp.append((path, None))
+        else:
+            stamp.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(stamp)
+
+
+class Daemon:
+    def __init__(self, max_entries: int = 100000) -> None:
+        """
+        :param max_entries: the maximum number of files to remember the
+               annotations of per configuration
+        """
+        self._max_entries = max_entries
+        # the keywords and the patterns by ``_cfg_stamp``
+        self._patterns: ty.Dict[tuple, ty.Tuple[config.KeywordsConfig,
+                                                todotex.Patterns]] = {}
+        # the annotation caches by ``cache.fingerprint``
+        self._caches: ty.Dict[str, cache.MemoryAnnotationCache] = {}
+
+    def get_patterns(
+        self,
+        config_path: ty.Optional[Path],
+    ) -> ty.Tuple[config.KeywordsConfig, todotex.Patterns]:
+        """
+        :return: the keywords read from the configuration file, and their
+                 patterns, compiled again only if the configuration changes
+        """
+        stamp = _cfg_stamp(config_path)
+        try:
+            return self._patterns[stamp]
+        except KeyError:
+            pass
+        if len(self._patterns) >= _MAX_CONFIGS:
+            self._patterns.clear()
+        keywords = config.read_cfg(config_path)
+        self._patterns[stamp] = keywords, todotex.Patterns(keywords)
+        return self._patterns[stamp]
+
+    def open_cache(self, keywords, chardet, args):
+        """Same as ``todotex.__main__.open_cache``, but in memory."""
+        fp = cli.cache_fingerprint(keywords, chardet, args)
+        if fp not in self._caches and len(self._caches) >= _MAX_CONFIGS:
+            self._caches.clear()
+        annot_cache = self._caches.setdefault(
+            fp, cache.MemoryAnnotationCache(self._max_entries))
+        return contextlib.nullcontext(annot_cache)
+
+    def handle(self, conn: socket.socket) -> None:
+        """
+        Answer one request.
+
+        :raise ConnectionError: if the client disconnects
+        :raise EOFError: if the client disconnects
+        :raise socket.timeout: if ``conn`` has a timeout, and the client
+               stalls longer than it
+        """
+        with conn.makefile('rb') as infile:
+            kind, payload = recv_frame(infile)
+            if kind != REQUEST:
+                return
+            try:
+                req = _parse_request(payload)
+            except ValueError as err:
+                send_frame(conn, STDERR,
+                           f'todotex daemon: {err}\n'.encode('utf-8'))
+                send_frame(conn, EXIT, b'2')
+                return
+            stdout = io.TextIOWrapper(
+                io.BufferedWriter(_FrameWriter(conn, STDOUT, req['isatty'])),
+                encoding=req['encoding'] or 'utf-8',
+                errors='replace',
+            )
+            stderr = io.TextIOWrapper(
+                io.BufferedWriter(_FrameWriter(conn, STDERR, False)),
+                encoding='utf-8',
+                errors='replace',
+            )
+            prev_cwd = os.getcwd()
+            prev_stdin = sys.stdin
+            try:
+                with contextlib.redirect_stdout(stdout), \
+                        contextlib.redirect_stderr(stderr):
+                    status = self._run(req, conn, infile)
+                stdout.flush()
+                stderr.flush()
+            finally:
+                sys.stdin = prev_stdin
+                os.chdir(prev_cwd)
+            send_frame(conn, EXIT, str(status).encode('ascii'))
+
+    def _run(self, req, conn: socket.socket, infile: ty.BinaryIO) -> int:
+        """
+        :return: the exit status
+        """
+        try:
+            os.chdir(req['cwd'])
+            args = cli.parse_args(req['argv'])
+            if args.serve or args.watch:
+                print('--serve and --watch are not supported by the daemon',
+                      file=sys.stderr)
+                return 2
+            keywords, pat = self.get_patterns(args.config)
+            # streamed from the client only if read
+            sys.stdin = io.TextIOWrapper(
+                io.BufferedReader(_FrameReader(conn, infile), 65536),
+                encoding=req['stdin_encoding'])
+            cli.run(args, keywords, pat, self.open_cache)
+        except SystemExit as err:
+            # raised by argparse
+            if err.code is None or isinstance(err.code, int):
+                return err.code or 0
+            print(err.code, file=sys.stderr)
+            return 1
+        except (ConnectionError, EOFError, socket.timeout):
+            raise
+        except Exception as err:
+            print(err, file=sys.stderr)
+            return 1
+        return 0
+
+
+def _parse_request(payload: bytes) -> ty.Dict[str, ty.Any]:
+    """
+    :return: the request sent by ``todotex.client.request``
+    :raise ValueError: if the request is malformed
+    """
+    try:
+        req = json.loads(payload)
+    except ValueError as err:
+        raise ValueError(f'malformed request: {err}') from None
+    if not isinstance(req, dict):
+        raise ValueError('malformed request')
+    for key, types in [
+        ('argv', list),
+        ('cwd', str),
+        ('isatty', bool),
+        ('encoding', (str, type(None))),
+        ('stdin_encoding', (str, type(None))),
+    ]:
+        if not isinstance(req.get(key), types):
+            raise ValueError(f'malformed request: bad {key!r}')
+    if not all(isinstance(arg, str) for arg in req['argv']):
+        raise ValueError("malformed request: bad 'argv'")
+    for key in ['encoding', 'stdin_encoding']:
+        if req[key] is not None:
+            try:
+                codecs.lookup(req[key])
+            except LookupError:
+                raise ValueError(f'unknown encoding: {req[key]}') from None
+    return req
+
+
+def _remove_stale_socket(path: str) -> None:
+    """
+    :raise RuntimeError: if a daemon is already listening on ``path``
+    """
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f'todotex daemon already running at {path}')
+
+
+def serve(socket_path: str = None, max_entries: int = 100000) -> None:
+    """
+    Answer the requests of ``todotex.client`` forever.
+
+    :param socket_path: default to ``todotex.client.default_socket_path()``
+    :param max_entries: see ``Daemon``
+    """
+    socket_path = socket_path or default_socket_path()
+    _remove_stale_socket(socket_path)
+    daemon = Daemon(max_entries)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        # accessible to the current user only
+        prev_umask = os.umask(0o077)
+        try:
+            sock.bind(socket_path)
+        finally:
+            os.umask(prev_umask)
+        try:
+            sock.listen()
+            while True:
+                conn, _ = sock.accept()
+                conn.settimeout(_CONN_TIMEOUT)
+                with conn:
+                    try:
+                        daemon.handle(conn)
+                    except (ConnectionError, EOFError):
+                        pass
+                    except socket.timeout:
+                        print('todotex daemon: client timed out',
+                              file=sys.stderr)
+                    except Exception as err:
+                        # no request is to take the daemon down
+                        print(f'todotex daemon: {err!r}', file=sys.stderr)
+        finally:
+            os.unlink(socket_path)
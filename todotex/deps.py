@@ -0,0 +1,272 @@
+import concurrent.futures
+import functools
+import io
+import os
+import re
+import threading
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import (
+    FileProfile,
+    Patterns,
+    ScanStats,
+    TexAnnotation,
+    scan_tex_text,
+    _body_encoding,
+    _is_ascii_transparent,
+    _read_tex_file,
+    _Stopwatch,
+)
+
+# the number of threads to fetch and scan the TeX files with by default
+DEFAULT_WORKERS = 8
+
+# An include directive, as (command, directory argument, file argument),
+# e.g. ``('subimport', 'chapters/', 'intro')``. The directory argument is
+# empty for the commands that take none.
+Directive = ty.Tuple[str, str, str]
+
+# the text before an unescaped '%' on each line
+_COMMENT = re.compile(r'^((?:[^\\%\n]|\\.)*)%.*$', re.M)
+_DIRECTIVE = re.compile(
+    r'\\(?:(?P<cmd1>input|include|subfile)\s*\{(?P<file1>[^{}]*)\}'
+    r'|(?P<cmd2>(?:sub)?(?:import|inputfrom|includefrom))\*?'
+    r'\s*\{(?P<dir2>[^{}]*)\}\s*\{(?P<file2>[^{}]*)\})')
+# found in the raw bytes of every TeX file with any directive, if encoded in
+# an ASCII-transparent encoding
+_DIRECTIVE_PREFILTER = re.compile(
+    rb'\\(?:sub)?(?:input|include|import|file)')
+
+# A node of the include graph, as (path, base directory), where the base
+# directory is what ``\input`` and ``\include`` in the file are relative to.
+_Node = ty.Tuple[str, str]
+
+
+def parse_includes(text: str) -> ty.List[Directive]:
+    """
+    Parse the ``\\input``, ``\\include``, ``\\subfile``, and ``\\import``
+    family of directives outside the comments in a TeX document.
+
+    :param text: the TeX document
+    :return: the directives in the order they appear
+    """
+    text = _COMMENT.sub(r'\1', text)
+    directives = []
+    for m in _DIRECTIVE.finditer(text):
+        if m.group('cmd1'):
+            directives.append((m.group('cmd1'), '', m.group('file1').strip()))
+        else:
+            directives.append((m.group('cmd2'), m.group('dir2').strip(),
+                               m.group('file2').strip()))
+    return directives
+
+
+def _resolve(
+    directive: Directive,
+    node: _Node,
+    rootdir: str,
+) -> ty.Optional[_Node]:
+    """
+    Resolve the file a directive in the file of ``node`` refers to.
+
+    :return: the included node, or ``None`` if the file does not exist
+    """
+    cmd, dir_arg, file_arg = directive
+    path, base = node
+    if cmd in ('input', 'include'):
+        directory = base
+    elif cmd == 'subfile':
+        directory = os.path.dirname(path)
+    elif cmd.startswith('sub'):
+        directory = os.path.join(base, dir_arg)
+    else:
+        directory = os.path.join(rootdir, dir_arg)
+    candidates = [file_arg + '.tex']
+    if 'include' not in cmd:
+        # ``\input`` and alike fall back to the name as is
+        candidates.append(file_arg)
+    for name in candidates:
+        child = os.path.normpath(os.path.join(directory, name))
+        if os.path.isfile(child):
+            if cmd in ('input', 'include'):
+                return child, base
+            if cmd == 'subfile':
+                return child, os.path.dirname(child)
+            return child, os.path.normpath(directory)
+    return None
+
+
+class _FileResult(ty.NamedTuple):
+    annots: ty.List[TexAnnotation]
+    directives: ty.List[Directive]
+    prefiltered: bool
+    cached: bool
+    profile: ty.Optional[FileProfile] = None
+
+
+def _decode(buf: bytes, ec: str, stopwatch: ty.Optional[_Stopwatch]) -> str:
+    # decode in the same way as ``open(path, encoding=ec)`` does
+    with io.TextIOWrapper(io.BytesIO(buf), encoding=ec) as infile:
+        text = infile.read()
+    if stopwatch is not None:
+        stopwatch.lap('decode')
+    return text
+
+
+def _may_include(buf: bytes, ec: str) -> bool:
+    """
+    :return: ``False`` if the TeX file of content ``buf`` in encoding ``ec``
+             surely has no include directive
+    """
+    if not ec or not _is_ascii_transparent(_body_encoding(ec)):
+        return True
+    return _DIRECTIVE_PREFILTER.search(buf) is not None
+
+
+def _scan_and_parse(
+    path: str,
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    cache,
+    profiling: bool = False,
+) -> _FileResult:
+    annots = directives = known_ec = None
+    detecting = not isinstance(chardet, str)
+    if cache is not None:
+        annots, stamp = cache.lookup(path)
+        directives, _ = cache.lookup_includes(path)
+        if annots is not None and directives is not None:
+            return _FileResult(annots, directives, False, True)
+        if detecting:
+            known_ec, _ = cache.lookup_encoding(path)
+    stopwatch = _Stopwatch() if profiling else None
+    buf, ec = _read_tex_file(path, chardet, known_ec, stopwatch)
+    # decoded only if scanned, not if skipped by both prefilters
+    text = None
+    prefiltered = False
+    if annots is None:
+        prefilter = p.prefilter(ec) if ec else None
+        if prefilter is not None and not prefilter.search(buf):
+            annots = []
+            prefiltered = True
+        else:
+            text = _decode(buf, ec, stopwatch)
+            annots = scan_tex_text(text, allow_continuation, p)
+    if directives is None:
+        if text is None and not _may_include(buf, ec):
+            directives = []
+        else:
+            if text is None:
+                text = _decode(buf, ec, stopwatch)
+            directives = parse_includes(text)
+    fp = None
+    if stopwatch is not None:
+        stopwatch.lap('scan')
+        fp = stopwatch.profile(buf, text, len(annots))
+    if cache is not None:
+        cache.put(path, stamp, annots)
+        cache.put_includes(path, stamp, directives)
+        if detecting and known_ec is None and ec:
+            cache.put_encoding(path, stamp, ec)
+    return _FileResult(annots, directives, prefiltered, False, fp)
+
+
+def iter_scan_tex_graph(
+    root: Path,
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    workers: int = DEFAULT_WORKERS,
+    cache=None,
+    stats: ScanStats = None,
+) -> ty.Iterator[ty.Tuple[Path, ty.List[TexAnnotation]]]:
+    """
+    Scan the TeX files reachable from the root document through
+    ``\\input``, ``\\include``, ``\\subfile``, and the ``\\import`` family
+    of directives, and yield those with annotations along with their
+    annotations in document order, i.e. the order in which the files are
+    first included when the root document is typeset. The files are fetched
+    and scanned concurrently, each included file being submitted as soon as
+    the file including it is parsed. Included files that do not exist are
+    skipped.
+
+    :param root: the root document, e.g. ``main.tex``
+    :param p: see ``iter_scan_tex_files``
+    :param allow_continuation: see ``iter_scan_tex_files``
+    :param chardet: see ``iter_scan_tex_files``
+    :param workers: the number of threads to fetch and scan the files with
+    :param cache: if not ``None``, a ``todotex.cache.AnnotationCache`` to
+           reuse the annotations and the include directives of unchanged
+           files from, and to store those of the rest into
+    :param stats: if not ``None``, the statistics to add to
+    :return: an iterator of TeX file paths and their annotations
+    """
+    if stats is None:
+        stats = ScanStats()
+    profile = stats.profile
+    root = os.path.normpath(root)
+    rootdir = os.path.dirname(root)
+    lock = threading.Lock()
+    closed = False
+    futures: ty.Dict[str, concurrent.futures.Future] = {}
+    expanded: ty.Set[_Node] = set()
+    executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    def children(node: _Node) -> ty.List[_Node]:
+        result = futures[node[0]].result()
+        nodes = (_resolve(d, node, rootdir) for d in result.directives)
+        return [child for child in nodes if child is not None]
+
+    def expand(node: _Node) -> None:
+        # submit the file of the node if not yet, and its children once
+        # parsed, so that the whole graph is fetched ahead of the output
+        with lock:
+            if closed or node in expanded:
+                return
+            expanded.add(node)
+            if node[0] not in futures:
+                futures[node[0]] = executor.submit(_scan_and_parse, node[0],
+                                                   p, allow_continuation,
+                                                   chardet, cache,
+                                                   profile is not None)
+            fut = futures[node[0]]
+        fut.add_done_callback(functools.partial(expand_children, node))
+
+    def expand_children(node: _Node, fut: concurrent.futures.Future) -> None:
+        if fut.exception() is None:
+            for child in children(node):
+                expand(child)
+
+    root_node = (root, rootdir)
+    expand(root_node)
+    try:
+        # depth-first preorder, visiting each file once
+        stack = [root_node]
+        seen_nodes: ty.Set[_Node] = set()
+        seen_paths: ty.Set[str] = set()
+        while stack:
+            node = stack.pop()
+            if node in seen_nodes:
+                continue
+            seen_nodes.add(node)
+            # in case the callback that expands it has not run yet
+            expand(node)
+            with lock:
+                fut = futures[node[0]]
+            result = fut.result()
+            if node[0] not in seen_paths:
+                seen_paths.add(node[0])
+                stats.files += 1
+                stats.prefiltered += result.prefiltered
+                stats.cached += result.cached
+                if profile is not None and result.profile is not None:
+                    profile.add_file(Path(node[0]), result.profile)
+                if result.annots:
+                    yield Path(node[0]), result.annots
+            stack.extend(reversed(children(node)))
+    finally:
+        with lock:
+            closed = True
+        executor.shutdown(wait=True)
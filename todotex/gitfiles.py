@@ -0,0 +1,77 @@
+import os
+import subprocess
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import walk_tex_files, _compile_globs, _match_walked
+
+
+def _git(cwd: Path, *args: str) -> ty.List[str]:
+    """
+    Run git command under ``cwd``, and return the NUL-delimited output.
+
+    :raise RuntimeError: if git fails, e.g. if ``cwd`` is not in a git
+           repository
+    """
+    try:
+        proc = subprocess.run(
+            ['git', *args],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise RuntimeError('git not found') from None
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f'git failed under {cwd}: '
+            f'{os.fsdecode(proc.stderr).strip()}')
+    return [os.fsdecode(name) for name in proc.stdout.split(b'\0') if name]
+
+
+def iter_git_tex_files(
+    paths: ty.Iterable[Path],
+    recursive: bool,
+    since: ty.Optional[str] = None,
+    include: ty.Sequence[str] = (),
+    exclude: ty.Sequence[str] = (),
+) -> ty.Iterator[Path]:
+    """
+    List the TeX files under the directories in ``paths`` from the git
+    repositories they belong to, rather than by walking the directories, so
+    that git-ignored files are excluded, and ignored directories such as
+    build output are never visited. Untracked but not ignored TeX files are
+    included. The TeX files in ``paths`` are yielded as is.
+
+    :param paths: the files and directories
+    :param recursive: whether to list TeX files in subdirectories
+    :param since: if not ``None``, list only the TeX files changed relative
+           to this git revision, plus the untracked ones
+    :param include: see ``walk_tex_files``
+    :param exclude: see ``walk_tex_files``
+    :return: the TeX files, sorted by path under each directory
+    """
+    include_globs = _compile_globs(include) if include else None
+    exclude_globs = _compile_globs(exclude) if exclude else None
+    for path in paths:
+        if not path.is_dir():
+            yield from walk_tex_files([path], False)
+            continue
+        untracked = _git(path, 'ls-files', '-z', '--others',
+                         '--exclude-standard', '--', '*.tex')
+        if since is None:
+            tracked = _git(path, 'ls-files', '-z', '--cached', '--', '*.tex')
+            deleted = set(
+                _git(path, 'ls-files', '-z', '--deleted', '--', '*.tex'))
+            tracked = [name for name in tracked if name not in deleted]
+        else:
+            tracked = _git(path, 'diff', '-z', '--name-only', '--relative',
+                           '--diff-filter=d', since, '--', '*.tex')
+        # unmerged files are listed once per stage
+        names = sorted(set(tracked).union(untracked))
+        for name in names:
+            if not recursive and '/' in name:
+                continue
+            if _match_walked(name.split('/'), '', include_globs,
+                             exclude_globs):
+                yield path / name
@@ -1,10 +1,12 @@
 import argparse
+import os
 from pathlib import Path
 import sys
 import collections
+import collections.abc
 import typing as ty
 
-from todotex.todotex import TexAnnotation
+from todotex.todotex import TexAnnotation, ScanStats, _rate
 from todotex.config import KeywordsConfig
 
 
@@ -37,9 +39,171 @@ def make_parser():
         dest='recursive',
         action='store_true',
         help='search recursively into directories if provided as PATH')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help=('scan TeX files with N workers; 0 to use one worker per CPU. '
+              'Default to %(default)s'))
+    parser.add_argument(
+        '--pool',
+        choices=['process', 'thread'],
+        default='process',
+        help=('the kind of worker pool used when N > 1; `thread\' may suit '
+              'I/O-bound network mounts better. Default to `%(default)s\''))
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=[],
+        metavar='GLOB',
+        help=('scan only the TeX files matching GLOB, against the file name '
+              'if GLOB has no `/\', otherwise against the path relative to '
+              'the directory in PATH; may be repeated'))
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        metavar='GLOB',
+        help=('skip the TeX files and directories matching GLOB, matched as '
+              'in --include; may be repeated'))
+    parser.add_argument(
+        '--follow-symlinks',
+        action='store_true',
+        help=('descend into symbolic links to directories when searching '
+              'recursively; each directory is visited at most once'))
+    parser.add_argument(
+        '--archives',
+        action='store_true',
+        help=('scan the tar (.tar, .tar.gz, .tgz, .tar.bz2, .tar.xz) and zip '
+              'archives in PATH as if they were directories, without '
+              'extracting them, showing their TeX files as ARCHIVE!/FILE; '
+              'each archive is read by one worker when N > 1'))
+    parser.add_argument(
+        '--files-from',
+        metavar='FILE',
+        help=('also scan the TeX files and directories listed in FILE, one '
+              'per line, or `-\' to read the list from stdin; the list is '
+              'read as it is scanned, so it may be as long as needed'))
+    parser.add_argument(
+        '-0',
+        '--null',
+        action='store_true',
+        help=('the paths in --files-from are terminated by NUL rather than '
+              'by newline, as written by `find -print0\''))
+    parser.add_argument(
+        '--git',
+        action='store_true',
+        help=('list the TeX files under the directories in PATH from their '
+              'git repositories, so that git-ignored files are skipped'))
+    parser.add_argument(
+        '--since',
+        metavar='REF',
+        help=('scan only the TeX files changed relative to git revision REF, '
+              'plus the untracked ones; implies --git'))
+    parser.add_argument(
+        '--encoding',
+        metavar='ENCODING',
+        help=('the encoding of the TeX files; `auto\' to detect it per file '
+              'by the byte order mark, as UTF-8 if valid, and otherwise by '
+              'chardet if installed, remembering it in the cache if --cache '
+              'is given. Default to `auto\' on Windows, otherwise to '
+              '`utf-8\''))
+    parser.add_argument(
+        '--root',
+        type=Path,
+        metavar='FILE',
+        help=('scan only the TeX files reachable from the root document FILE '
+              'through \\input, \\include, \\subfile and \\import, and '
+              'show them in document order; cannot be used with PATH. The '
+              'files are scanned with 8 threads unless N > 1 is given'))
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help=('keep running, and scan again the TeX files created or '
+              'modified and show the result whenever they change; requires '
+              'PATH'))
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help=('run as a daemon that answers the requests of '
+              '`python -m todotex.client\', which takes the same arguments, '
+              'over a Unix domain socket; the configuration, the compiled '
+              'patterns and the annotations of unchanged files are kept in '
+              'memory between requests'))
+    parser.add_argument(
+        '--socket',
+        metavar='FILE',
+        help=('the socket of --serve, and of `python -m todotex.client\' to '
+              'connect to; default to $TODOTEX_SOCKET, '
+              '$XDG_RUNTIME_DIR/todotex.sock or /tmp/todotex-$UID.sock'))
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help=('print to stderr how many TeX files are found, and how many of '
+              'them are skipped for having no todo/done keys or are reused '
+              'from the cache; and where the time goes, i.e. the time, '
+              'files, bytes, lines, annotations and throughput of each '
+              'phase, and the slowest files'))
+    parser.add_argument(
+        '--stats-format',
+        choices=['text', 'json'],
+        default='text',
+        help='the format of --stats (default: %(default)s)')
+    parser.add_argument(
+        '--stats-top',
+        type=int,
+        default=10,
+        metavar='N',
+        help='the number of slowest files in --stats (default: %(default)s)')
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help=('remember the annotations of scanned TeX files, and reuse them '
+              'for files unchanged since the last run'))
+    parser.add_argument(
+        '--cache-dir',
+        type=Path,
+        metavar='DIR',
+        help=('where to store the cache; default to $XDG_CACHE_HOME/todotex '
+              'or ~/.cache/todotex'))
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=100000,
+        metavar='N',
+        help=('the maximum number of TeX files to remember in the cache, '
+              'the least recently used ones are evicted first. Default to '
+              '%(default)s'))
     layout = parser.add_argument_group(
         title='optional layout arguments',
         description='options controlling the layout of the command output')
+    layout.add_argument(
+        '--format',
+        choices=['text', 'jsonl'],
+        default='text',
+        help=('choose `jsonl\' to write one JSON object per line per entry, '
+              'with keys `path\', `ln\', `key\', `label\', `msg\' and '
+              '`kind\' (`todo\' or `done\'), for other tools to consume; '
+              'only -D and -a apply then. Default to `%(default)s\''))
+    counting = layout.add_mutually_exclusive_group()
+    counting.add_argument(
+        '--count',
+        action='store_true',
+        help=('print only the number of entries per label in total, e.g. '
+              '`12 TODO, 3 QUESTION, 40 DONE\'; faster, as the messages are '
+              'not read. Only -D, -a, --color and --format apply then, where '
+              '`jsonl\' writes {"path": null, "type": "total", "counts": '
+              '{LABEL: N, ...}}'))
+    counting.add_argument(
+        '--summary',
+        action='store_true',
+        help=('same as --count, followed by the number of entries per label '
+              'in each directory and each TeX file with any, as a tree; a '
+              'directory counts all the TeX files under it. With `jsonl\', '
+              'the `type\' of the lines after the total is `dir\' or '
+              '`file\''))
     layout.add_argument(
         '-L',
         dest='print_linenumber',
@@ -89,6 +253,11 @@ def make_parser():
     return parser
 
 
+def clear_screen(outfile: ty.TextIO = None) -> None:
+    outfile = outfile if outfile else sys.stdout
+    outfile.write('\33[H\33[2J')
+
+
 class NoLeadingTrailingEmptyLinesBufferedWriter:
     """
     A buffered text writer that never echos leading/trailing newlines.
@@ -154,7 +323,10 @@ class NoLeadingTrailingEmptyLinesBufferedWriter:
 
 
 def show_result(
-    per_file_annots: ty.OrderedDict[ty.Optional[Path], ty.List[TexAnnotation]],
+    per_file_annots: ty.Union[
+        ty.Mapping[ty.Optional[Path], ty.Iterable[TexAnnotation]],
+        ty.Iterable[ty.Tuple[ty.Optional[Path], ty.Iterable[TexAnnotation]]],
+    ],
     keywords: KeywordsConfig,
     print_linenumber: bool,
     print_done: bool,
@@ -166,6 +338,13 @@ def show_result(
     # only set when debugging
     _out_buff: ty.TextIO = None,
 ) -> None:
+    """
+    Print the annotations, as soon as they are taken from ``per_file_annots``.
+
+    :param per_file_annots: TeX file paths, or ``None`` for stdin, mapped to
+           their annotations, either as a mapping, or an iterable of pairs
+           such as ``todotex.iter_scan_fs_for_tex``
+    """
     outfile = _out_buff if _out_buff else sys.stdout
     heading: bool = {
         'always': True,
@@ -178,77 +357,400 @@ def show_result(
         'auto': sys.stdout.isatty(),
     }[color]
 
-    def to_show_annot(_a: TexAnnotation) -> bool:
-        return (_a.key in keywords.todo
-                or (print_done and _a.key in keywords.done))
-
-    with NoLeadingTrailingEmptyLinesBufferedWriter(outfile, True) as w:
-        if heading:
-            for texfile, annots in per_file_annots.items():
-                if texfile is not None:
-                    if absolute_path:
-                        texfile = texfile.resolve()
-                    if color:
-                        w.append(Colors.purple, str(texfile), Colors.reset)
-                    else:
-                        w.append(str(texfile))
-                    w.commit()
-
-                if print_linenumber or print_label or print_message:
-                    a: TexAnnotation
-                    for a in filter(to_show_annot, annots):
-                        sbuf: ty.List[str] = []
-                        if print_linenumber:
-                            if color:
-                                sbuf.append(
-                                    f'{Colors.green}{a.ln}{Colors.reset}')
-                            else:
-                                sbuf.append(f'{a.ln}')
-                        if print_label:
-                            try:
-                                label = keywords.todo[a.key]
-                            except KeyError:
-                                label = keywords.done[a.key]
-                            if color:
-                                sbuf.append(
-                                    f'{Colors.bold_red}{label}{Colors.reset}')
-                            else:
-                                sbuf.append(label)
-                        if print_message and a.msg:
-                            sbuf.append(a.msg)
-                        line = ':'.join(sbuf)
-                        w.append(line).commit()
+    # the labels of the keys to show, as shown
+    labels: ty.Dict[str, str] = {}
+    for key_labels in ([keywords.done, keywords.todo]
+                       if print_done else [keywords.todo]):
+        for key, label in key_labels.items():
+            labels[key] = (f'{Colors.bold_red}{label}{Colors.reset}'
+                           if color else label)
+
+    if isinstance(per_file_annots, collections.abc.Mapping):
+        per_file_annots = per_file_annots.items()
+
+    w = _HoldLastLineWriter(outfile)
+    try:
+        for texfile, annots in per_file_annots:
+            lines: ty.List[str] = []
+            prefix = None
+            if texfile is not None:
+                if absolute_path:
+                    texfile = texfile.resolve()
+                shown_path = (f'{Colors.purple}{texfile}{Colors.reset}'
+                              if color else str(texfile))
+                if heading:
+                    lines.append(shown_path)
+                else:
+                    prefix = shown_path
+            if heading and not (print_linenumber or print_label
+                                or print_message):
+                w.write_lines(lines)
+                continue
+            formatted = _format_annots(annots, labels, prefix,
+                                       print_linenumber, print_label,
+                                       print_message, color)
+            if not heading and not (prefix is not None or print_linenumber
+                                    or print_label):
+                # the empty messages, which are shown as empty lines only
+                # under heading
+                formatted = filter(None, formatted)
+            if isinstance(annots, collections.abc.Sequence):
+                # in memory already, and thus written at once
+                lines.extend(formatted)
+                w.write_lines(lines)
+            else:
+                # written as soon as taken
+                w.write_lines(lines)
+                for line in formatted:
+                    w.write_lines([line])
+    finally:
+        w.close()
+
+
+def _format_annots(
+    annots: ty.Iterable[TexAnnotation],
+    labels: ty.Dict[str, str],
+    prefix: ty.Optional[str],
+    print_linenumber: bool,
+    print_label: bool,
+    print_message: bool,
+    color: bool,
+) -> ty.Iterator[str]:
+    """
+    Format the annotations of a TeX file as lines of ``show_result``, the
+    annotations not to show skipped.
+
+    :param labels: the labels of the keys to show, as shown
+    :param prefix: the TeX file as shown before each line, if any
+    """
+    # The line of an annotation is the ':'-joined prefix, line number, label
+    # and message, those not shown left out. Except for the message, the
+    # line is the same for all the annotations of a key but for the line
+    # number, so it's formatted once per key as what comes before and after
+    # the line number.
+    formats: ty.Dict[str, ty.Optional[ty.Tuple[str, str]]] = {}
+    before = [] if prefix is None else [prefix]
+    msg_sep = ':' if before or print_linenumber or print_label else ''
+    green = Colors.green if color else ''
+    reset = Colors.reset if color else ''
+    for a in annots:
+        try:
+            fmt = formats[a.key]
+        except KeyError:
+            fmt = None
+            if a.key in labels:
+                after = [labels[a.key]] if print_label else []
+                if print_linenumber:
+                    fmt = (''.join(f'{part}:' for part in before) + green,
+                           reset + ''.join(f':{part}' for part in after))
+                else:
+                    fmt = ':'.join(before + after), ''
+            formats[a.key] = fmt
+        if fmt is None:
+            continue
+        if print_linenumber:
+            line = f'{fmt[0]}{a.ln}{fmt[1]}'
         else:
-            for texfile, annots in per_file_annots.items():
-                if texfile is not None:
-                    if absolute_path:
-                        texfile = texfile.resolve()
-                a: TexAnnotation
-                for a in filter(to_show_annot, annots):
-                    sbuf: ty.List[str] = []
-                    if texfile is not None:
-                        if color:
-                            sbuf.append(
-                                f'{Colors.purple}{texfile}{Colors.reset}')
-                        else:
-                            sbuf.append(str(texfile))
-                    if print_linenumber:
-                        if color:
-                            sbuf.append(f'{Colors.green}{a.ln}{Colors.reset}')
-                        else:
-                            sbuf.append(str(a.ln))
-                    if print_label:
-                        try:
-                            label = keywords.todo[a.key]
-                        except KeyError:
-                            label = keywords.done[a.key]
-                        if color:
-                            sbuf.append(
-                                f'{Colors.bold_red}{label}{Colors.reset}')
-                        else:
-                            sbuf.append(label)
-                    if print_message and a.msg:
-                        sbuf.append(a.msg)
-                    line = ':'.join(sbuf)
-                    if line:
-                        w.append(line).commit()
+            line = fmt[0]
+        if print_message and a.msg:
+            line = f'{line}{msg_sep}{a.msg}'
+        yield line
+
+
+class _HoldLastLineWriter:
+    """
+    Write lines like ``NoLeadingTrailingEmptyLinesBufferedWriter`` does in
+    ``show_result``, where every line is committed nonempty, i.e. hold back
+    the last line until the next one or ``close``, but many lines at a time.
+    """
+    def __init__(self, outfile: ty.TextIO) -> None:
+        self._outfile = outfile
+        # the last line with its newline, or '' if none yet
+        self._held = ''
+
+    def write_lines(self, lines: ty.List[str]) -> None:
+        """
+        :param lines: the lines without newlines
+        """
+        if not lines:
+            return
+        last = len(lines) - 1
+        if last:
+            self._outfile.write(self._held + '\n'.join(lines[:last]) + '\n')
+        elif self._held:
+            self._outfile.write(self._held)
+        self._held = f'{lines[last]}\n'
+
+    def close(self) -> None:
+        if self._held:
+            self._outfile.write(self._held)
+            self._held = ''
+
+
+def show_result_jsonl(
+    per_file_annots: ty.Union[
+        ty.Mapping[ty.Optional[Path], ty.Iterable[TexAnnotation]],
+        ty.Iterable[ty.Tuple[ty.Optional[Path], ty.Iterable[TexAnnotation]]],
+    ],
+    keywords: KeywordsConfig,
+    print_done: bool,
+    absolute_path: bool,
+    outfile: ty.TextIO = None,
+) -> None:
+    """
+    Write the annotations as JSON Lines, one JSON object per annotation with
+    keys ``path`` (``null`` for stdin), ``ln``, ``key``, ``label``, ``msg``
+    and ``kind`` (``"todo"`` or ``"done"``), as soon as they are taken from
+    ``per_file_annots``. The output is flushed after each file.
+
+    :param per_file_annots: see ``show_result``
+    :param keywords: the keywords configuration
+    :param print_done: whether to write the annotations of done keys
+    :param absolute_path: whether to write the TeX files in absolute path
+    :param outfile: default to stdout
+    """
+    # imported only when needed, to speed up startup
+    import json
+
+    outfile = outfile if outfile else sys.stdout
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    if isinstance(per_file_annots, collections.abc.Mapping):
+        per_file_annots = per_file_annots.items()
+    for texfile, annots in per_file_annots:
+        if texfile is not None:
+            if absolute_path:
+                texfile = texfile.resolve()
+            texfile = str(texfile)
+        for a in annots:
+            if a.key in keywords.todo:
+                label = keywords.todo[a.key]
+                kind = 'todo'
+            elif print_done and a.key in keywords.done:
+                label = keywords.done[a.key]
+                kind = 'done'
+            else:
+                # e.g. matched by a regular expression key, or by the empty
+                # key when nothing is configured, skipped as by
+                # ``show_result``
+                continue
+            outfile.write(
+                dumps({
+                    'path': texfile,
+                    'ln': a.ln,
+                    'key': a.key,
+                    'label': label,
+                    'msg': a.msg,
+                    'kind': kind,
+                }))
+            outfile.write('\n')
+        outfile.flush()
+
+
+class _CountNode:
+    """A directory or a TeX file in ``show_counts``."""
+    def __init__(self, path: ty.Optional[Path], is_file: bool) -> None:
+        self.path = path
+        # the number of annotations by label
+        self.counts: ty.Dict[str, int] = {}
+        # the directories and the TeX files in the directory by name
+        self.children: ty.Optional[ty.Dict[str, '_CountNode']] = (
+            None if is_file else {})
+
+    def add(self, counts: ty.Mapping[str, int]) -> None:
+        for label, n in counts.items():
+            self.counts[label] = self.counts.get(label, 0) + n
+
+
+def show_counts(
+    per_file_counts: ty.Union[
+        ty.Mapping[ty.Optional[Path], ty.Mapping[str, int]],
+        ty.Iterable[ty.Tuple[ty.Optional[Path], ty.Mapping[str, int]]],
+    ],
+    keywords: KeywordsConfig,
+    print_done: bool,
+    summary: bool,
+    absolute_path: bool,
+    color: ty.Literal['always', 'never', 'auto'],
+    fmt: ty.Literal['text', 'jsonl'] = 'text',
+    outfile: ty.TextIO = None,
+) -> None:
+    """
+    Print the number of annotations per label in total, once all are taken
+    from ``per_file_counts``, e.g. ``12 TODO, 3 QUESTION, 40 DONE``. If
+    ``summary``, also print those of each directory and each TeX file with
+    any, indented as a tree below the total, where a directory counts all the
+    TeX files under it. The directories common to all the TeX files are left
+    out.
+
+    :param per_file_counts: TeX file paths, or ``None`` for stdin, mapped to
+           the number of their annotations by key, either as a mapping, or an
+           iterable of pairs such as ``todotex.iter_count_tex_files``
+    :param keywords: the keywords configuration
+    :param print_done: whether to count the annotations of done keys
+    :param summary: whether to print the counts per directory and TeX file
+    :param absolute_path: whether to print the TeX files in absolute path
+    :param color: see ``show_result``
+    :param fmt: ``'text'``, or ``'jsonl'`` to write one JSON object per line
+           instead, with keys ``path`` (``null`` for the total), ``type``
+           (``'total'``, ``'dir'`` or ``'file'``) and ``counts``, the labels
+           mapped to the numbers
+    :param outfile: default to stdout
+    """
+    outfile = outfile if outfile else sys.stdout
+    color: bool = fmt == 'text' and {
+        'always': True,
+        'never': False,
+        'auto': sys.stdout.isatty(),
+    }[color]
+
+    # the labels of the keys to count, and the labels in the order shown
+    labels: ty.Dict[str, str] = {}
+    for key_labels in ([keywords.done, keywords.todo]
+                       if print_done else [keywords.todo]):
+        labels.update(key_labels)
+    order = list(keywords.todo.values())
+    if print_done:
+        order.extend(keywords.done.values())
+    order = list(dict.fromkeys(order))
+
+    if isinstance(per_file_counts, collections.abc.Mapping):
+        per_file_counts = per_file_counts.items()
+    root = _CountNode(None, False)
+    for texfile, counts in per_file_counts:
+        label_counts: ty.Dict[str, int] = {}
+        for key, n in counts.items():
+            label = labels.get(key)
+            if label is not None:
+                label_counts[label] = label_counts.get(label, 0) + n
+        if not label_counts:
+            continue
+        root.add(label_counts)
+        if not summary or texfile is None:
+            continue
+        if absolute_path:
+            texfile = texfile.resolve()
+        node = root
+        parts = texfile.parts
+        for i, name in enumerate(parts):
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = _CountNode(
+                    Path(*parts[:i + 1]), i == len(parts) - 1)
+            child.add(label_counts)
+            node = child
+
+    # the total, with the labels of no annotations too, then the tree
+    rows = [(0, root)]
+    if summary:
+        top = root
+        while len(top.children) == 1:
+            child, = top.children.values()
+            if child.children is None:
+                break
+            top = child
+        stack = [(0, child) for child in reversed(top.children.values())]
+        while stack:
+            depth, node = stack.pop()
+            rows.append((depth, node))
+            if node.children is not None:
+                stack.extend((depth + 1, child)
+                             for child in reversed(node.children.values()))
+
+    if fmt == 'jsonl':
+        # imported only when needed, to speed up startup
+        import json
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        for _, node in rows:
+            if node is root:
+                kind = 'total'
+            else:
+                kind = 'file' if node.children is None else 'dir'
+            outfile.write(
+                dumps({
+                    'path': None if node.path is None else str(node.path),
+                    'type': kind,
+                    'counts': {
+                        label: node.counts.get(label, 0)
+                        for label in order
+                        if node is root or label in node.counts
+                    },
+                }))
+            outfile.write('\n')
+        return
+    label_fmt = f'{Colors.bold_red}{{}}{Colors.reset}' if color else '{}'
+    path_fmt = f'{Colors.purple}{{}}{Colors.reset}' if color else '{}'
+    lines = []
+    for depth, node in rows:
+        line = ', '.join(f'{node.counts.get(label, 0)} '
+                         f'{label_fmt.format(label)}' for label in order
+                         if node is root or label in node.counts)
+        if node is not root:
+            shown_path = str(node.path)
+            if node.children is not None:
+                shown_path = os.path.join(shown_path, '')
+            line = f'{"  " * depth}{path_fmt.format(shown_path)}: {line}'
+        lines.append(line)
+    outfile.write(''.join(f'{line}\n' for line in lines))
+
+
+def show_stats(
+    stats: ScanStats,
+    outfile: ty.TextIO = None,
+    fmt: ty.Literal['text', 'json'] = 'text',
+) -> None:
+    """
+    :param stats: the statistics, with or without ``stats.profile``
+    :param outfile: default to ``sys.stderr``
+    :param fmt: 'text' for humans, or 'json' for one JSON object
+    """
+    outfile = outfile if outfile else sys.stderr
+    if fmt == 'json':
+        # imported only when needed, to speed up startup
+        import json
+        obj = {
+            'files': stats.files,
+            'prefiltered': stats.prefiltered,
+            'cached': stats.cached,
+        }
+        if stats.profile is not None:
+            obj.update(stats.profile.as_dict())
+            obj['files_per_s'] = _rate(stats.files, stats.profile.wall)
+        print(json.dumps(obj), file=outfile)
+        return
+    print(
+        f'{stats.files} TeX files found, {stats.prefiltered} skipped by '
+        f'prefilter, {stats.cached} reused from cache',
+        file=outfile)
+    if stats.profile is None:
+        return
+    profile = stats.profile.as_dict()
+    print(
+        f'{"phase":<8}{"seconds":>10}{"files":>8}{"bytes":>12}'
+        f'{"lines":>10}{"annots":>8}{"MB/s":>9}{"files/s":>10}',
+        file=outfile)
+    for phase, ph in profile['phases'].items():
+        print(
+            f'{phase:<8}{ph["seconds"]:>10.4f}{ph["files"]:>8}'
+            f'{ph["bytes"]:>12}{ph["lines"]:>10}{ph["annots"]:>8}'
+            f'{_format_rate(ph["mb_per_s"]):>9}'
+            f'{_format_rate(ph["files_per_s"]):>10}',
+            file=outfile)
+    files_per_s = _rate(stats.files, stats.profile.wall)
+    print(
+        f'wall time {profile["wall_seconds"]:.4f}s, '
+        f'{_format_rate(profile["mb_per_s"])} MB/s, '
+        f'{_format_rate(files_per_s)} files/s '
+        f'(phases summed over workers)',
+        file=outfile)
+    if profile['slowest']:
+        print('slowest files:', file=outfile)
+        for fp in profile['slowest']:
+            print(
+                f'{fp["seconds"]:>10.4f}s  {fp["path"]} (read '
+                f'{fp["read"]:.4f}s, detect {fp["detect"]:.4f}s, decode '
+                f'{fp["decode"]:.4f}s, scan {fp["scan"]:.4f}s)',
+                file=outfile)
+
+
+def _format_rate(rate: ty.Optional[float]) -> str:
+    return '-' if rate is None else f'{rate:.1f}'
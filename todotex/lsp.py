@@ -0,0 +1,695 @@
+"""
+The todotex language server, started by ``todotex-lsp``, which publishes the
+todo/done annotations of TeX files as diagnostics, and lists them as
+workspace symbols, to any editor speaking the Language Server Protocol over
+the standard input and output.
+
+The documents open in the editor are scanned once when opened; after that,
+each edit rescans only the edited lines, extended to the continuation block
+they are in or next to, and the annotations after them are moved by the
+number of lines added or removed. The rest of the workspace is scanned once
+in a background thread, and a file is scanned again when the editor reports
+it changed on disk, or closes it.
+
+Usage::
+
+    todotex-lsp [-C CONFIG] [-c] [-D] [--encoding ENCODING]
+"""
+import argparse
+import bisect
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import typing as ty
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from todotex import __main__ as cli
+from todotex import config
+from todotex.todotex import (
+    Patterns,
+    TexAnnotation,
+    iter_scan_tex_doc,
+    iter_scan_tex_files,
+    walk_tex_files,
+    _scan_tex_file,
+)
+
+# the JSON-RPC error codes
+_METHOD_NOT_FOUND = -32601
+_INTERNAL_ERROR = -32603
+
+# the LSP enumerations used
+_SYNC_INCREMENTAL = 2
+_SEVERITY_INFORMATION = 3
+_SEVERITY_HINT = 4
+_SYMBOL_KEY = 20
+_MESSAGE_ERROR = 1
+
+_EOL = re.compile(r'\r\n|\r|\n')
+
+
+def read_message(infile: ty.BinaryIO) -> ty.Optional[dict]:
+    """
+    :param infile: the binary stream to read from
+    :return: the next JSON-RPC message, or ``None`` at the end of stream
+    """
+    length = None
+    while True:
+        line = infile.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length is None:
+        raise ValueError('missing Content-Length header')
+    body = infile.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body)
+
+
+def write_message(outfile: ty.BinaryIO, msg: dict) -> None:
+    body = json.dumps(msg, ensure_ascii=False).encode('utf-8')
+    outfile.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    outfile.flush()
+
+
+def split_lines(text: str) -> ty.List[str]:
+    """
+    :return: the lines of ``text`` without line breaks, as the positions of
+             the protocol count them; there is always at least one line
+    """
+    return _EOL.split(text)
+
+
+class Entry(ty.NamedTuple):
+    annot: TexAnnotation
+    # the 0-based index of the last line of the annotation, which is the line
+    # of ``annot`` unless continued
+    end: int
+    # the index of the '%' starting the annotation in its line
+    col: int
+
+
+def scan_entries(
+    lines: ty.Sequence[str],
+    start: int,
+    stop: int,
+    allow_continuation: bool,
+    p: Patterns,
+) -> ty.List[Entry]:
+    """
+    Scan ``lines[start:stop]`` as if it were a document of its own, except
+    that the line numbers are those in ``lines``.
+
+    The last line of each annotation is told by when ``iter_scan_tex_doc``
+    yields it: when continued, an annotation is yielded once the first line
+    not continuing it has been read, or at the end of the lines.
+    """
+    # the number of lines read so far, and whether all have been read
+    n_read = 0
+    exhausted = False
+
+    def feed():
+        nonlocal n_read, exhausted
+        for i in range(start, stop):
+            n_read += 1
+            yield lines[i]
+        exhausted = True
+
+    entries = []
+    for a in iter_scan_tex_doc(feed(), allow_continuation, p):
+        head = start + a.ln - 1
+        if not allow_continuation:
+            end = head
+        elif exhausted:
+            end = stop - 1
+        else:
+            # the line just read ends the block
+            end = start + n_read - 2
+        matched = p.key.search(lines[head])
+        col = matched.start('pfx_space') - 1 if matched else 0
+        entries.append(Entry(a._replace(ln=head + 1), end, col))
+    return entries
+
+
+class Document:
+    """
+    The lines and the annotations of a TeX document open in the editor, kept
+    up to date edit by edit.
+    """
+    def __init__(
+        self,
+        text: str,
+        allow_continuation: bool,
+        p: Patterns,
+    ) -> None:
+        self.allow_continuation = allow_continuation
+        self.p = p
+        self.lines = split_lines(text)
+        self.entries = scan_entries(self.lines, 0, len(self.lines),
+                                    allow_continuation, p)
+
+    @property
+    def annots(self) -> ty.List[TexAnnotation]:
+        return [e.annot for e in self.entries]
+
+    def replace(
+        self,
+        start: ty.Tuple[int, int],
+        end: ty.Tuple[int, int],
+        text: str,
+    ) -> range:
+        """
+        Replace the text between two positions, and rescan the lines it may
+        change the annotations of.
+
+        :param start: the 0-based line and the index in the line where the
+               replaced text starts
+        :param end: the same where the replaced text ends
+        :param text: the new text
+        :return: the indices of the lines rescanned
+        """
+        lines = self.lines
+        el, ec = end
+        if el >= len(lines):
+            el = len(lines) - 1
+            ec = len(lines[el])
+        sl, sc = start
+        sl = min(sl, el)
+        new_lines = split_lines(lines[sl][:sc] + text + lines[el][ec:])
+        lines[sl:el + 1] = new_lines
+        # the number of lines added
+        delta = len(new_lines) - (el - sl + 1)
+        n = len(lines)
+        ac = self.allow_continuation
+        old = self.entries
+        heads = [e.annot.ln - 1 for e in old]
+
+        # Rescan from the first edited line, or from the head of the block
+        # it is in or next to, since it may continue that block. Before
+        # there, nothing has changed.
+        a = sl
+        i = bisect.bisect_left(heads, sl)
+        if ac and i > 0 and old[i - 1].end >= sl - 1:
+            i -= 1
+            a = heads[i]
+
+        # Rescan up to the first line after the edited ones, and further on
+        # while a block, old or new, continues across. From the first line
+        # no block continues into, the lines are scanned the same as before,
+        # so the old annotations there only move by ``delta``.
+        j = sl + len(new_lines)
+        lookahead = 2
+        while True:
+            limit = min(n, j + lookahead) if ac else j
+            new = [
+                e for e in scan_entries(lines, a, limit, ac, self.p)
+                if e.annot.ln <= j
+            ]
+            if not ac or j == n:
+                break
+            next_j = j
+            if new and new[-1].end >= j:
+                next_j = new[-1].end + 1
+            m = bisect.bisect_left(heads, j - delta) - 1
+            if m >= 0 and old[m].end >= j - delta:
+                next_j = max(next_j, old[m].end + 1 + delta)
+            if next_j == j:
+                break
+            j = min(next_j, n)
+            lookahead *= 2
+
+        r = bisect.bisect_left(heads, j - delta)
+        moved = [
+            Entry(e.annot._replace(ln=e.annot.ln + delta), e.end + delta,
+                  e.col) for e in old[r:]
+        ] if delta else old[r:]
+        self.entries = old[:i] + new + moved
+        return range(a, j)
+
+
+def uri_to_key(uri: str) -> ty.Union[Path, str]:
+    """
+    :return: the path of a ``file:`` URI, otherwise the URI itself
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme != 'file':
+        return uri
+    path = unquote(parsed.path)
+    if os.name == 'nt' and re.match(r'/[A-Za-z]:', path):
+        path = path[1:]
+    return Path(path)
+
+
+def _to_utf16(line: str, index: int) -> int:
+    if line.isascii():
+        return index
+    return index + sum(1 for c in line[:index] if c > '\uffff')
+
+
+def _from_utf16(line: str, units: int) -> int:
+    if line.isascii():
+        return min(units, len(line))
+    n = 0
+    for i, c in enumerate(line):
+        if n >= units:
+            return i
+        n += 2 if c > '\uffff' else 1
+    return len(line)
+
+
+class Server:
+    def __init__(
+        self,
+        keywords: config.KeywordsConfig,
+        p: Patterns,
+        allow_continuation: bool,
+        chardet,
+        infile: ty.BinaryIO,
+        outfile: ty.BinaryIO,
+        print_done: bool = True,
+    ) -> None:
+        """
+        :param keywords: the keywords
+        :param p: the patterns of ``keywords``
+        :param allow_continuation: whether to allow message continuation
+        :param chardet: see ``iter_scan_tex_files``, for the files on disk
+        :param infile: the binary stream to read the messages from
+        :param outfile: the binary stream to write the messages to
+        :param print_done: whether to publish the annotations of done keys
+        """
+        self.keywords = keywords
+        self.p = p
+        self.allow_continuation = allow_continuation
+        self.chardet = chardet
+        self.print_done = print_done
+        self._infile = infile
+        self._outfile = outfile
+        # the documents open in the editor, by ``uri_to_key``, along with
+        # their URI
+        self.docs: ty.Dict[ty.Union[Path, str], ty.Tuple[str, Document]] = {}
+        # the annotations of the TeX files on disk with any
+        self.index: ty.Dict[Path, ty.List[TexAnnotation]] = {}
+        # set once the workspace is scanned
+        self.indexed = threading.Event()
+        # the TeX files to scan again in the background, ``None`` to stop
+        self.rescans: 'queue.Queue[ty.Optional[Path]]' = queue.Queue()
+        # set to stop the background scan, checked between files
+        self._stopping = threading.Event()
+        self._roots: ty.List[Path] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._utf16 = True
+        self._shutdown = False
+        self._indexer: ty.Optional[threading.Thread] = None
+        self._requests = {
+            'initialize': self._initialize,
+            'shutdown': self._shutdown_request,
+            'workspace/symbol': self._workspace_symbol,
+        }
+        self._notifications = {
+            'initialized': self._initialized,
+            'textDocument/didOpen': self._did_open,
+            'textDocument/didChange': self._did_change,
+            'textDocument/didClose': self._did_close,
+            'workspace/didChangeWatchedFiles': self._did_change_watched_files,
+        }
+
+    def serve(self) -> int:
+        """
+        Answer the messages until ``exit``.
+
+        :return: the exit status
+        """
+        try:
+            while True:
+                msg = read_message(self._infile)
+                if msg is None:
+                    return 1
+                if msg.get('method') == 'exit':
+                    return 0 if self._shutdown else 1
+                self.handle(msg)
+        finally:
+            self.stop()
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        Stop the background scan, once the file being scanned is done.
+
+        :param wait: whether to wait for it to stop
+        """
+        if self._indexer is None:
+            return
+        if not self._stopping.is_set():
+            self._stopping.set()
+            self.rescans.put(None)
+        if wait:
+            self._indexer.join()
+            self._indexer = None
+
+    def send(self, msg: dict) -> None:
+        msg['jsonrpc'] = '2.0'
+        with self._write_lock:
+            write_message(self._outfile, msg)
+
+    def handle(self, msg: dict) -> None:
+        method = msg.get('method')
+        params = msg.get('params') or {}
+        if 'id' not in msg:
+            handler = self._notifications.get(method)
+            if handler is None:
+                return
+            try:
+                handler(params)
+            except Exception as err:
+                self._log_error(f'{method}: {err}')
+            return
+        if method is None:
+            # a response, though no request is ever sent
+            return
+        handler = self._requests.get(method)
+        if handler is None:
+            self.send({
+                'id': msg['id'],
+                'error': {
+                    'code': _METHOD_NOT_FOUND,
+                    'message': f'method not found: {method}',
+                },
+            })
+            return
+        try:
+            result = handler(params)
+        except Exception as err:
+            self.send({
+                'id': msg['id'],
+                'error': {
+                    'code': _INTERNAL_ERROR,
+                    'message': str(err)
+                },
+            })
+        else:
+            self.send({'id': msg['id'], 'result': result})
+
+    def _log_error(self, message: str) -> None:
+        self.send({
+            'method': 'window/logMessage',
+            'params': {
+                'type': _MESSAGE_ERROR,
+                'message': message
+            },
+        })
+
+    def _initialize(self, params: dict) -> dict:
+        folders = params.get('workspaceFolders')
+        if folders:
+            uris = [folder['uri'] for folder in folders]
+        elif params.get('rootUri'):
+            uris = [params['rootUri']]
+        else:
+            uris = []
+        self._roots = [
+            key for key in map(uri_to_key, uris) if isinstance(key, Path)
+        ]
+        if not uris and params.get('rootPath'):
+            self._roots = [Path(params['rootPath'])]
+        capabilities = {
+            'textDocumentSync': {
+                'openClose': True,
+                'change': _SYNC_INCREMENTAL,
+            },
+            'workspaceSymbolProvider': True,
+        }
+        encodings = (params.get('capabilities', {}).get('general', {}).get(
+            'positionEncodings', []))
+        if 'utf-32' in encodings:
+            self._utf16 = False
+            capabilities['positionEncoding'] = 'utf-32'
+        return {
+            'capabilities': capabilities,
+            'serverInfo': {
+                'name': 'todotex'
+            },
+        }
+
+    def _initialized(self, params: dict) -> None:
+        self._indexer = threading.Thread(target=self._index, daemon=True)
+        self._indexer.start()
+
+    def _shutdown_request(self, params) -> None:
+        self._shutdown = True
+        # answered at once, even amid the scan of a large workspace
+        self.stop(wait=False)
+
+    def _index(self) -> None:
+        """Scan the workspace, then the TeX files queued in ``rescans``."""
+        try:
+            texfiles = walk_tex_files(self._roots, True)
+            for path, annots in iter_scan_tex_files(texfiles, self.p,
+                                                    self.allow_continuation,
+                                                    self.chardet):
+                if self._stopping.is_set():
+                    return
+                self._update_index(path, annots)
+        except Exception as err:
+            self._log_error(f'failed to scan the workspace: {err}')
+        finally:
+            self.indexed.set()
+        while True:
+            path = self.rescans.get()
+            try:
+                if path is None or self._stopping.is_set():
+                    return
+                try:
+                    annots = _scan_tex_file(path, self.p,
+                                            self.allow_continuation,
+                                            self.chardet)[0]
+                except FileNotFoundError:
+                    annots = []
+                except Exception as err:
+                    self._log_error(f'failed to scan {path}: {err}')
+                    continue
+                self._update_index(path, annots)
+            finally:
+                self.rescans.task_done()
+
+    def _update_index(
+        self,
+        path: Path,
+        annots: ty.List[TexAnnotation],
+    ) -> None:
+        with self._lock:
+            had_annots = self.index.pop(path, None) is not None
+            if annots:
+                self.index[path] = annots
+            is_open = path in self.docs
+        if not is_open and (annots or had_annots):
+            self.send(self._diagnostics(path.as_uri(), [
+                self._diagnostic(a, (a.ln - 1, 0), (a.ln, 0)) for a in annots
+            ]))
+
+    def _did_open(self, params: dict) -> None:
+        item = params['textDocument']
+        doc = Document(item['text'], self.allow_continuation, self.p)
+        with self._lock:
+            self.docs[uri_to_key(item['uri'])] = item['uri'], doc
+        self._publish(item['uri'], doc)
+
+    def _did_change(self, params: dict) -> None:
+        uri = params['textDocument']['uri']
+        with self._lock:
+            _, doc = self.docs[uri_to_key(uri)]
+        for change in params['contentChanges']:
+            if 'range' not in change:
+                doc = Document(change['text'], self.allow_continuation,
+                               self.p)
+                continue
+            start = self._position(doc, change['range']['start'])
+            end = self._position(doc, change['range']['end'])
+            doc.replace(start, end, change['text'])
+        with self._lock:
+            self.docs[uri_to_key(uri)] = uri, doc
+        self._publish(uri, doc)
+
+    def _did_close(self, params: dict) -> None:
+        uri = params['textDocument']['uri']
+        key = uri_to_key(uri)
+        with self._lock:
+            self.docs.pop(key, None)
+        if isinstance(key, Path):
+            # the file on disk may differ from the document as last edited
+            self.rescans.put(key)
+        else:
+            self.send(self._diagnostics(uri, []))
+
+    def _did_change_watched_files(self, params: dict) -> None:
+        for change in params['changes']:
+            key = uri_to_key(change['uri'])
+            if isinstance(key, Path) and key.suffix == '.tex':
+                # deleted files too, after the rescans already queued
+                self.rescans.put(key)
+
+    def _workspace_symbol(self, params: dict) -> ty.List[dict]:
+        query = params.get('query', '').lower()
+        with self._lock:
+            docs = list(self.docs.values())
+            indexed = [(path, annots) for path, annots in self.index.items()
+                       if path not in self.docs]
+        symbols = []
+
+        def add(uri, annot, start, end):
+            if not self._shown(annot.key):
+                return
+            name = self._message(annot)
+            if query not in name.lower():
+                return
+            symbols.append({
+                'name': name,
+                'kind': _SYMBOL_KEY,
+                'location': {
+                    'uri': uri,
+                    'range': self._range(start, end),
+                },
+            })
+
+        for uri, doc in docs:
+            for e in doc.entries:
+                head = e.annot.ln - 1
+                add(uri, e.annot, self._encode(doc, head, e.col),
+                    self._encode(doc, e.end, len(doc.lines[e.end])))
+        for path, annots in indexed:
+            uri = path.as_uri()
+            for a in annots:
+                add(uri, a, (a.ln - 1, 0), (a.ln, 0))
+        return symbols
+
+    def _position(self, doc: Document, pos: dict) -> ty.Tuple[int, int]:
+        """
+        :return: the line and the index in the line of a protocol position
+        """
+        line, character = pos['line'], pos['character']
+        if self._utf16 and line < len(doc.lines):
+            character = _from_utf16(doc.lines[line], character)
+        return line, character
+
+    def _encode(self, doc: Document, line: int,
+                index: int) -> ty.Tuple[int, int]:
+        """The inverse of ``_position``."""
+        if self._utf16:
+            index = _to_utf16(doc.lines[line], index)
+        return line, index
+
+    @staticmethod
+    def _range(start: ty.Tuple[int, int], end: ty.Tuple[int, int]) -> dict:
+        return {
+            'start': {
+                'line': start[0],
+                'character': start[1]
+            },
+            'end': {
+                'line': end[0],
+                'character': end[1]
+            },
+        }
+
+    def _shown(self, key: str) -> bool:
+        return key in self.keywords.todo or (self.print_done
+                                             and key in self.keywords.done)
+
+    def _message(self, annot: TexAnnotation) -> str:
+        if annot.key in self.keywords.todo:
+            label = self.keywords.todo[annot.key]
+        else:
+            label = self.keywords.done.get(annot.key, annot.key)
+        return f'{label}: {annot.msg}' if annot.msg else label
+
+    def _diagnostic(
+        self,
+        annot: TexAnnotation,
+        start: ty.Tuple[int, int],
+        end: ty.Tuple[int, int],
+    ) -> ty.Optional[dict]:
+        if not self._shown(annot.key):
+            return None
+        done = (annot.key in self.keywords.done
+                and annot.key not in self.keywords.todo)
+        return {
+            'range': self._range(start, end),
+            'severity': _SEVERITY_HINT if done else _SEVERITY_INFORMATION,
+            'code': annot.key,
+            'source': 'todotex',
+            'message': self._message(annot),
+        }
+
+    @staticmethod
+    def _diagnostics(uri: str, diagnostics: ty.List[ty.Optional[dict]]):
+        return {
+            'method': 'textDocument/publishDiagnostics',
+            'params': {
+                'uri': uri,
+                'diagnostics': [d for d in diagnostics if d is not None],
+            },
+        }
+
+    def _publish(self, uri: str, doc: Document) -> None:
+        self.send(self._diagnostics(uri, [
+            self._diagnostic(e.annot, self._encode(doc, e.annot.ln - 1, e.col),
+                             self._encode(doc, e.end, len(doc.lines[e.end])))
+            for e in doc.entries
+        ]))
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='todotex-lsp',
+        description=('Language server publishing the todo/done annotations '
+                     'of TeX files as diagnostics and workspace symbols, '
+                     'over the standard input and output.'))
+    parser.add_argument(
+        '-C',
+        '--config',
+        type=Path,
+        help='the configuration file, looked up as by todotex if not given')
+    parser.add_argument(
+        '-c',
+        dest='allow_continuation',
+        action='store_true',
+        help=('allow continuation of todo/done message on next lines by '
+              'prefixing message with extra spaces'))
+    parser.add_argument(
+        '-D',
+        dest='print_done',
+        action='store_false',
+        help='suppress publishing entries of `done\' keyword')
+    parser.add_argument(
+        '--encoding',
+        help=('the encoding of the TeX files on disk, or `auto\' to detect; '
+              'the open documents are as sent by the editor'))
+    return parser
+
+
+def main(argv: ty.List[str] = None) -> None:
+    args = make_parser().parse_args(argv)
+    keywords = config.read_cfg(args.config)
+    server = Server(
+        keywords,
+        Patterns(keywords),
+        args.allow_continuation,
+        cli.get_chardet(args.encoding),
+        sys.stdin.buffer,
+        sys.stdout.buffer,
+        args.print_done,
+    )
+    sys.exit(server.serve())
+
+
+if __name__ == '__main__':
+    main()
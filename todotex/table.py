@@ -0,0 +1,142 @@
+import array
+import bisect
+import collections.abc
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import TexAnnotation
+
+# the columns of ``AnnotationTable.iter_batches``
+COLUMNS = ('path', 'ln', 'pfxlen', 'key', 'msg')
+
+
+class AnnotationTable(collections.abc.Mapping):
+    """
+    A compact table of the annotations of TeX files, for result sets too
+    large to keep as a ``TexAnnotation`` per annotation. The annotations are
+    stored as columns, the integers in arrays, and each distinct path and key
+    is stored once and referred to by index.
+
+    As a mapping from TeX file paths to their annotations, the table may be
+    used in place of the result of ``scan_fs_for_tex``, e.g. by
+    ``show_result``; the ``TexAnnotation`` objects are built on access.
+    """
+    def __init__(self) -> None:
+        self.paths: ty.List[ty.Optional[Path]] = []
+        self._path_index: ty.Dict[ty.Optional[Path], int] = {}
+        # the row where the annotations of each path start, followed by the
+        # number of rows
+        self._starts = array.array('Q', [0])
+        self.keys: ty.List[str] = []
+        self._key_index: ty.Dict[str, int] = {}
+        self.ln = array.array('L')
+        self.pfxlen = array.array('L')
+        self.key_id = array.array('L')
+        self.msg: ty.List[ty.Optional[str]] = []
+
+    @classmethod
+    def from_scan(
+        cls,
+        per_file_annots: ty.Union[
+            ty.Mapping[ty.Optional[Path], ty.Iterable[TexAnnotation]],
+            ty.Iterable[ty.Tuple[ty.Optional[Path],
+                                 ty.Iterable[TexAnnotation]]],
+        ],
+    ) -> 'AnnotationTable':
+        """
+        :param per_file_annots: TeX file paths mapped to their annotations,
+               e.g. from ``scan_fs_for_tex`` or ``iter_scan_fs_for_tex``; in
+               the latter case the annotations are stored as they are
+               scanned, without ever holding all of them as objects
+        """
+        if isinstance(per_file_annots, collections.abc.Mapping):
+            per_file_annots = per_file_annots.items()
+        table = cls()
+        for path, annots in per_file_annots:
+            table.append(path, annots)
+        return table
+
+    def append(
+        self,
+        path: ty.Optional[Path],
+        annots: ty.Iterable[TexAnnotation],
+    ) -> None:
+        """
+        Append the annotations of a TeX file.
+
+        :param path: the TeX file, or ``None`` for stdin
+        :param annots: the annotations
+        :raise ValueError: if ``path`` is already in the table
+        """
+        if path in self._path_index:
+            raise ValueError(f'already in the table: {path}')
+        for a in annots:
+            key_id = self._key_index.get(a.key)
+            if key_id is None:
+                key_id = self._key_index[a.key] = len(self.keys)
+                self.keys.append(a.key)
+            self.ln.append(a.ln)
+            self.pfxlen.append(a.pfxlen)
+            self.key_id.append(key_id)
+            self.msg.append(a.msg)
+        self._path_index[path] = len(self.paths)
+        self.paths.append(path)
+        self._starts.append(len(self.msg))
+
+    @property
+    def n_rows(self) -> int:
+        """The number of annotations."""
+        return len(self.msg)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> ty.Iterator[ty.Optional[Path]]:
+        return iter(self.paths)
+
+    def __contains__(self, path) -> bool:
+        return path in self._path_index
+
+    def __getitem__(self, path: ty.Optional[Path]) -> ty.List[TexAnnotation]:
+        i = self._path_index[path]
+        keys = self.keys
+        return [
+            TexAnnotation(self.ln[r], self.pfxlen[r], keys[self.key_id[r]],
+                          self.msg[r])
+            for r in range(self._starts[i], self._starts[i + 1])
+        ]
+
+    def iter_batches(
+        self,
+        batch_size: int = 65536,
+    ) -> ty.Iterator[ty.Dict[str, ty.Sequence]]:
+        """
+        Export the annotations as columnar batches for analytics, e.g.
+        ``pandas.DataFrame(batch)`` or ``pyarrow.RecordBatch.from_pydict``.
+
+        :param batch_size: the maximum number of rows per batch
+        :return: an iterator of batches, each mapping the names in
+                 ``COLUMNS`` to the columns of equal length: ``path`` as
+                 strings (``None`` for stdin), ``ln`` and ``pfxlen`` as
+                 integer arrays, ``key`` and ``msg`` as strings
+        """
+        for lo in range(0, self.n_rows, batch_size):
+            hi = min(lo + batch_size, self.n_rows)
+            # the first path with rows in the batch
+            i = bisect.bisect_right(self._starts, lo) - 1
+            paths = []
+            while len(paths) < hi - lo:
+                path = self.paths[i]
+                path = None if path is None else str(path)
+                count = (min(self._starts[i + 1], hi) -
+                         max(self._starts[i], lo))
+                paths.extend([path] * count)
+                i += 1
+            keys = self.keys
+            yield {
+                'path': paths,
+                'ln': self.ln[lo:hi],
+                'pfxlen': self.pfxlen[lo:hi],
+                'key': [keys[k] for k in self.key_id[lo:hi]],
+                'msg': self.msg[lo:hi],
+            }
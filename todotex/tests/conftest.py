@@ -0,0 +1,30 @@
+import pytest
+
+from todotex import config
+from todotex import todotex
+
+
+@pytest.fixture
+def patterns():
+    """The patterns of the todo key 'todo' and of the done key 'done'."""
+    return todotex.Patterns(
+        config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'}))
+
+
+@pytest.fixture
+def tex_tree(tmp_path):
+    """
+    ``tmp_path``, with the TeX files ``ch{i}/sec{j}.tex`` for ``i`` in
+    ``range(3)`` and ``j`` in ``range(5)``, where each has ``j`` todo
+    annotations, and a non-TeX file in each ``ch{i}``.
+    """
+    for i in range(3):
+        subdir = tmp_path / f'ch{i}'
+        subdir.mkdir()
+        for j in range(5):
+            lines = [
+                f'line {k} % todo ch{i} sec{j} item{k}\n' for k in range(j)
+            ]
+            (subdir / f'sec{j}.tex').write_text(''.join(lines))
+        (subdir / 'notes.txt').write_text('% todo not a tex file\n')
+    return tmp_path
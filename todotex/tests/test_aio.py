@@ -0,0 +1,135 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from todotex import aio
+from todotex import todotex
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+class TestAscanDoc:
+    def test_text_and_lines(self, patterns):
+        lines = ['% todo message\n', '%   continued\n']
+        for doc in [''.join(lines), lines]:
+            assert asyncio.run(aio.ascan_doc(doc, True, patterns)) == [
+                todotex.TexAnnotation(1, 1, 'todo', 'message continued')
+            ]
+
+    def test_timeout(self, patterns):
+        def slow_doc():
+            time.sleep(0.3)
+            yield '% todo late\n'
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(
+                aio.ascan_doc(slow_doc(), False, patterns, timeout=0.05))
+
+
+class TestAscanPaths:
+    def test_same_as_sync(self, tex_tree, patterns):
+        stats = todotex.ScanStats()
+        result = asyncio.run(
+            _collect(
+                aio.ascan_paths([tex_tree],
+                                patterns,
+                                True,
+                                False,
+                                'utf-8',
+                                concurrency=3,
+                                stats=stats)))
+        expected = todotex.scan_fs_for_tex([tex_tree], patterns, True,
+                                           False, 'utf-8')
+        assert dict(result) == dict(expected)
+        assert len(result) == 12
+        assert stats.files == 15
+        assert stats.prefiltered == 3
+
+    def test_process_pool(self, tex_tree, patterns):
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            result = asyncio.run(
+                _collect(
+                    aio.ascan_paths([tex_tree],
+                                    patterns,
+                                    True,
+                                    False,
+                                    'utf-8',
+                                    executor=executor)))
+        assert sorted(path.relative_to(tex_tree).as_posix()
+                      for path, _ in result) == [
+                          f'ch{i}/sec{j}.tex' for i in range(3)
+                          for j in range(1, 5)
+                      ]
+
+    def _slow_scan(self, monkeypatch, seconds):
+        lock = threading.Lock()
+        state = {'running': 0, 'max_running': 0, 'started': 0}
+        scan = todotex._scan_tex_file
+
+        def slow_scan(*args):
+            with lock:
+                state['started'] += 1
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'],
+                                           state['running'])
+            time.sleep(seconds)
+            try:
+                return scan(*args)
+            finally:
+                with lock:
+                    state['running'] -= 1
+
+        monkeypatch.setattr(aio, '_scan_tex_file', slow_scan)
+        return state
+
+    def test_concurrency(self, tex_tree, patterns, monkeypatch):
+        state = self._slow_scan(monkeypatch, 0.02)
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            result = asyncio.run(
+                _collect(
+                    aio.ascan_paths([tex_tree],
+                                    patterns,
+                                    True,
+                                    False,
+                                    'utf-8',
+                                    concurrency=2,
+                                    executor=executor)))
+        assert len(result) == 12
+        assert state['max_running'] == 2
+
+    def test_timeout(self, tex_tree, patterns, monkeypatch):
+        state = self._slow_scan(monkeypatch, 0.2)
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(
+                _collect(
+                    aio.ascan_paths([tex_tree],
+                                    patterns,
+                                    True,
+                                    False,
+                                    'utf-8',
+                                    concurrency=1,
+                                    timeout=0.1)))
+        assert state['started'] == 1
+
+    def test_close_early(self, tex_tree, patterns, monkeypatch):
+        state = self._slow_scan(monkeypatch, 0.02)
+
+        async def first():
+            agen = aio.ascan_paths([tex_tree],
+                                   patterns,
+                                   True,
+                                   False,
+                                   'utf-8',
+                                   concurrency=2)
+            async for item in agen:
+                await agen.aclose()
+                return item
+
+        assert asyncio.run(first()) is not None
+        # no more files are submitted once closed
+        assert state['started'] <= 3
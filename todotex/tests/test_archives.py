@@ -0,0 +1,213 @@
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from todotex import archives
+from todotex import todotex
+
+# the members of the archives, in the order they are stored
+MEMBERS = [
+    ('./main.tex', '% todo main\n'),
+    ('./notes.txt', '% todo not a tex file\n'),
+    ('./ch/intro.tex', 'x % todo intro\n% nothing\n'),
+    ('./ch/empty.tex', '% nothing\n'),
+    ('./ch/sec/deep.tex', '% todo deep\n'),
+]
+
+
+def _make_tar(path, mode):
+    with tarfile.open(path, mode) as tar:
+        for name, text in MEMBERS:
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('./ch/sec')
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+
+
+def _make_zip(path):
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('ch/', '')
+        for name, text in MEMBERS:
+            zf.writestr(name[2:], text)
+
+
+@pytest.fixture(params=['book.tar', 'book.tar.gz', 'book.tar.xz', 'book.zip'])
+def archive_path(request, tmp_path):
+    path = tmp_path / request.param
+    if path.suffix == '.zip':
+        _make_zip(path)
+    else:
+        _make_tar(path, 'w:' + {'.tar': '', '.gz': 'gz', '.xz': 'xz'}[
+            path.suffix])
+    return path
+
+
+def _walked_path(item):
+    return item.path if isinstance(item, todotex.TexArchive) else item
+
+
+class TestIterTexMembers:
+    def test_recursive(self, archive_path):
+        archive = todotex.TexArchive(archive_path, True)
+        assert list(archives.iter_tex_members(archive)) == [
+            ('main.tex', b'% todo main\n'),
+            ('ch/intro.tex', b'x % todo intro\n% nothing\n'),
+            ('ch/empty.tex', b'% nothing\n'),
+            ('ch/sec/deep.tex', b'% todo deep\n'),
+        ]
+
+    def test_not_recursive(self, archive_path):
+        archive = todotex.TexArchive(archive_path, False)
+        assert [relpath for relpath, _ in archives.iter_tex_members(archive)
+                ] == ['main.tex']
+
+    def test_globs(self, archive_path):
+        def relpaths(include=(), exclude=()):
+            texfiles = todotex.walk_tex_files([archive_path.parent], True,
+                                              include, exclude, archives=True)
+            return [
+                relpath for archive in texfiles
+                for relpath, _ in archives.iter_tex_members(archive)
+            ]
+
+        assert relpaths(exclude=['sec']) == [
+            'main.tex',
+            'ch/intro.tex',
+            'ch/empty.tex',
+        ]
+        assert relpaths(include=[f'{archive_path.name}!/ch/*']) == [
+            'ch/intro.tex',
+            'ch/empty.tex',
+            'ch/sec/deep.tex',
+        ]
+        assert relpaths(exclude=[archive_path.name]) == []
+
+    def test_bad_archive(self, tmp_path):
+        path = tmp_path / 'bad.tar.gz'
+        path.write_bytes(b'not an archive')
+        with pytest.raises(OSError, match='bad.tar.gz'):
+            list(archives.iter_tex_members(todotex.TexArchive(path, True)))
+
+
+class TestScanArchives:
+    def test_walk(self, tmp_path):
+        (tmp_path / 'a.tex').write_text('')
+        (tmp_path / 'b').mkdir()
+        (tmp_path / 'b' / 'c.tex').write_text('')
+        _make_zip(tmp_path / 'a.zip')
+        _make_tar(tmp_path / 'z.tar', 'w')
+        assert list(todotex.walk_tex_files([tmp_path], True)) == [
+            tmp_path / 'a.tex',
+            tmp_path / 'b' / 'c.tex',
+        ]
+        texfiles = list(
+            todotex.walk_tex_files([tmp_path], True, archives=True))
+        # the archives are visited along with the subdirectories, in the
+        # order they are listed
+        assert texfiles[0] == tmp_path / 'a.tex'
+        assert sorted(texfiles[1:], key=_walked_path) == [
+            todotex.TexArchive(tmp_path / 'a.zip', True, 'a.zip!/'),
+            tmp_path / 'b' / 'c.tex',
+            todotex.TexArchive(tmp_path / 'z.tar', True, 'z.tar!/'),
+        ]
+        # archives are not descended into unless recursive, like directories
+        assert list(
+            todotex.walk_tex_files([tmp_path], False, archives=True)) == [
+                tmp_path / 'a.tex'
+            ]
+        assert list(
+            todotex.walk_tex_files([tmp_path / 'z.tar'], False,
+                                   archives=True)) == [
+                                       todotex.TexArchive(
+                                           tmp_path / 'z.tar', False)
+                                   ]
+
+    def test_same_result(self, tmp_path, patterns):
+        for i in range(5):
+            _make_tar(tmp_path / f'b{i}.tar.gz', 'w:gz')
+        (tmp_path / 'top.tex').write_text('% todo top\n')
+        texfiles = list(
+            todotex.walk_tex_files([tmp_path], True, archives=True))
+        stats = todotex.ScanStats(todotex.ScanProfile())
+        serial = list(
+            todotex.iter_scan_tex_files(texfiles, patterns, False, 'utf-8',
+                                        stats=stats))
+        assert serial[0] == (tmp_path / 'top.tex',
+                             [todotex.TexAnnotation(1, 1, 'todo', 'top')])
+        # the TeX files of an archive in the order they are stored
+        b0 = [item for item in serial if 'b0.tar.gz!' in str(item[0])]
+        assert b0 == [
+            (Path(f'{tmp_path}/b0.tar.gz!/main.tex'),
+             [todotex.TexAnnotation(1, 1, 'todo', 'main')]),
+            (Path(f'{tmp_path}/b0.tar.gz!/ch/intro.tex'),
+             [todotex.TexAnnotation(1, 1, 'todo', 'intro')]),
+            (Path(f'{tmp_path}/b0.tar.gz!/ch/sec/deep.tex'),
+             [todotex.TexAnnotation(1, 1, 'todo', 'deep')]),
+        ]
+        assert len(serial) == 16
+        assert stats.files == 21
+        assert stats.prefiltered == 5
+        assert stats.profile.phases['scan'].files == 21
+        for pool in ['thread', 'process']:
+            assert list(
+                todotex.iter_scan_tex_files(texfiles, patterns, False,
+                                            'utf-8', 3, pool)) == serial
+        counts = todotex.iter_count_tex_files(texfiles, patterns, False,
+                                              'utf-8', 2, 'thread')
+        assert list(counts) == [(path, {
+            'todo': len(annots)
+        }) for path, annots in serial]
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_bad_archive(self, tmp_path, patterns, capsys, jobs):
+        (tmp_path / 'bad.zip').write_bytes(b'not an archive')
+        _make_tar(tmp_path / 'good.tar', 'w')
+        # truncated right after the data of ch/intro.tex
+        data = (tmp_path / 'good.tar').read_bytes()
+        (tmp_path / 'cut.tar').write_bytes(data[:2600])
+        texfiles = todotex.walk_tex_files([tmp_path], True, archives=True)
+        scanned = dict(
+            todotex.iter_scan_tex_files(texfiles, patterns, False, 'utf-8',
+                                        jobs, 'thread'))
+        # the TeX files stored before the truncation are kept
+        assert sorted(scanned) == [
+            Path(f'{tmp_path}/cut.tar!/ch/intro.tex'),
+            Path(f'{tmp_path}/cut.tar!/main.tex'),
+            Path(f'{tmp_path}/good.tar!/ch/intro.tex'),
+            Path(f'{tmp_path}/good.tar!/ch/sec/deep.tex'),
+            Path(f'{tmp_path}/good.tar!/main.tex'),
+        ]
+        err = capsys.readouterr().err
+        assert 'warning: cannot read archive' in err
+        assert 'bad.zip' in err and 'cut.tar' in err
+
+    def test_corrupt_member(self, tmp_path, patterns, capsys):
+        path = tmp_path / 'a.zip'
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('main.tex', '% todo main\n')
+            zf.writestr('ch/intro.tex', '% todo intro\n' * 100)
+        with zipfile.ZipFile(path) as zf:
+            info = zf.getinfo('ch/intro.tex')
+        data = bytearray(path.read_bytes())
+        # overwrite the deflate stream of ch/intro.tex past its local header
+        start = info.header_offset + 30 + len(info.filename)
+        data[start:start + 8] = b'\xff' * 8
+        path.write_bytes(bytes(data))
+        _make_tar(tmp_path / 'z.tar', 'w')
+        texfiles = todotex.walk_tex_files([tmp_path], True, archives=True)
+        scanned = dict(
+            todotex.iter_scan_tex_files(texfiles, patterns, False, 'utf-8'))
+        # the archives after the corrupt member are still scanned
+        assert sorted(scanned) == [
+            Path(f'{tmp_path}/a.zip!/main.tex'),
+            Path(f'{tmp_path}/z.tar!/ch/intro.tex'),
+            Path(f'{tmp_path}/z.tar!/ch/sec/deep.tex'),
+            Path(f'{tmp_path}/z.tar!/main.tex'),
+        ]
+        assert 'cannot read archive' in capsys.readouterr().err
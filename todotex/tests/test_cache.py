@@ -0,0 +1,111 @@
+import os
+
+from todotex import cache
+from todotex import config
+from todotex import todotex
+from todotex.todotex import TexAnnotation
+
+
+def _keywords():
+    return config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+
+
+class TestFingerprint:
+    def test_depends_on_config(self):
+        fp = cache.fingerprint(_keywords(), False, 'utf-8')
+        assert fp == cache.fingerprint(_keywords(), False, 'utf-8')
+        assert fp != cache.fingerprint(_keywords(), True, 'utf-8')
+        assert fp != cache.fingerprint(_keywords(), False, None)
+        assert fp != cache.fingerprint(
+            config.KeywordsConfig({'todo': 'TODO'}, {}), False, 'utf-8')
+
+
+class TestAnnotationCache:
+    def test_hit_and_stale(self, tmp_path):
+        texfile = tmp_path / 'a.tex'
+        texfile.write_text('% todo x\n')
+        annots = [TexAnnotation(1, 1, 'todo', 'x')]
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            cached, stamp = c.lookup(texfile)
+            assert cached is None
+            c.put(texfile, stamp, annots)
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            assert c.lookup(texfile)[0] == annots
+        with cache.AnnotationCache(tmp_path / 'cache', 'other') as c:
+            assert c.lookup(texfile)[0] is None
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            # dropped by the lookup with another fingerprint
+            assert c.lookup(texfile)[0] is None
+            c.put(texfile, c.lookup(texfile)[1], annots)
+        st = texfile.stat()
+        os.utime(texfile, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            assert c.lookup(texfile)[0] is None
+
+    def test_lru_eviction(self, tmp_path):
+        texfiles = [tmp_path / f'{i}.tex' for i in range(3)]
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp', 2) as c:
+            for texfile in texfiles:
+                texfile.write_text('')
+                c.put(texfile, c.lookup(texfile)[1], [])
+            # make the oldest one recently used
+            assert c.lookup(texfiles[0])[0] == []
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp', 2) as c:
+            assert c.lookup(texfiles[0])[0] == []
+            assert c.lookup(texfiles[1])[0] is None
+            assert c.lookup(texfiles[2])[0] == []
+
+
+class TestScanFsForTexWithCache:
+    def test_warm_run_skips_scanning(self, tmp_path, monkeypatch):
+        (tmp_path / 'a.tex').write_text('% todo x\n')
+        (tmp_path / 'b.tex').write_text('nothing\n')
+        p = todotex.Patterns(_keywords())
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            cold = todotex.scan_fs_for_tex([tmp_path], p, False, False,
+                                           'utf-8', cache=c)
+
+        def fail(*_args, **_kwargs):
+            raise AssertionError('should not be scanned')
+
+        monkeypatch.setattr(todotex, '_scan_tex_file', fail)
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            warm = todotex.scan_fs_for_tex([tmp_path], p, False, False,
+                                           'utf-8', cache=c)
+            assert c.hits == 2
+        assert list(warm.items()) == list(cold.items())
+
+
+class TestMemoryAnnotationCache:
+    def test_hit_stale_and_eviction(self, tmp_path):
+        texfiles = [tmp_path / f'{i}.tex' for i in range(3)]
+        c = cache.MemoryAnnotationCache(2)
+        for texfile in texfiles:
+            texfile.write_text('')
+            annots, stamp = c.lookup(texfile)
+            assert annots is None
+            c.put(texfile, stamp, [TexAnnotation(1, 1, 'todo', 'x')])
+        assert c.lookup(texfiles[0])[0] is None
+        assert c.lookup(texfiles[2])[0] == [TexAnnotation(1, 1, 'todo', 'x')]
+        texfiles[2].write_text('changed')
+        assert c.lookup(texfiles[2])[0] is None
+        c.put_includes(texfiles[1], c.lookup(texfiles[1])[1], [])
+        assert c.lookup_includes(texfiles[1])[0] == []
+
+    def test_encoding_reused_across_configs(self, tmp_path, monkeypatch):
+        (tmp_path / 'a.tex').write_bytes('% todo café\n'.encode('latin-1'))
+        p = todotex.Patterns(_keywords())
+        detector = todotex.EncodingDetector()
+        monkeypatch.setattr(detector, 'detect_encoding', lambda _buf: 'cp1252')
+        with cache.AnnotationCache(tmp_path / 'cache', 'fp') as c:
+            todotex.scan_fs_for_tex([tmp_path], p, False, False, detector,
+                                    cache=c)
+
+        def fail(_buf):
+            raise AssertionError('should not be detected')
+
+        monkeypatch.setattr(detector, 'detect_encoding', fail)
+        with cache.AnnotationCache(tmp_path / 'cache', 'other') as c:
+            annots = todotex.scan_fs_for_tex([tmp_path], p, False, False,
+                                             detector, cache=c)
+        assert annots[tmp_path / 'a.tex'][0].msg == 'café'
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from todotex import chunked
+from todotex import config
+from todotex import todotex
+from todotex.tests import test_todotex
+
+
+class TestIterScanTexBuffer:
+    lines = test_todotex.TestCountTexText.lines + [
+        '% todo 完成了',
+        'x' * 50 + ' % todo after a long line',
+        '\\%\\% todo',
+    ]
+    keywords = config.KeywordsConfig(
+        {
+            'todo': 'TODO',
+            'to': 'TODO',
+            r'continue ?\.{3,}': 'TODO',
+        }, {
+            'question solved': 'SOLVED',
+            'do': 'DONE',
+        })
+
+    @pytest.mark.parametrize('allow_continuation', [False, True])
+    @pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'cp1252'])
+    def test_same_as_scan(self, monkeypatch, allow_continuation, encoding):
+        # so that lines and '\r\n' cross the chunks
+        monkeypatch.setattr(chunked, '_CHUNK_SIZE', 7)
+        p = todotex.Patterns(self.keywords)
+        rng = random.Random(0)
+        for _ in range(100):
+            doc = [
+                rng.choice(self.lines) + rng.choice(['\n', '\r\n', '\r'])
+                for _ in range(rng.randrange(20))
+            ]
+            if doc and rng.random() < 0.5:
+                doc[-1] = doc[-1].rstrip('\r\n')
+            buf = ''.join(doc).encode(encoding, 'replace')
+            text = buf.decode(encoding, 'replace')
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+            expected = todotex.scan_tex_text(text, allow_continuation, p)
+            assert list(
+                chunked.iter_scan_tex_buffer(buf, encoding, allow_continuation,
+                                             p)) == expected, buf
+            assert [
+                a.key for a in chunked.iter_scan_tex_buffer(
+                    buf, encoding, allow_continuation, p, msg=False)
+            ] == [a.key for a in expected]
+
+    def test_chunkable(self):
+        assert chunked._is_chunkable('utf-8')
+        assert chunked._is_chunkable('utf_8_sig')
+        assert chunked._is_chunkable('latin-1')
+        assert chunked._is_chunkable('cp1252')
+        assert not chunked._is_chunkable('gb18030')
+        assert not chunked._is_chunkable('utf-16')
+        assert not chunked._is_chunkable('no-such-encoding')
+
+    def test_max_msg_len(self):
+        p = todotex.Patterns(self.keywords)
+        buf = ('% todo ' + '完' * 10 + '\n%   ' + 'x' * 10 + '\n').encode()
+        annots = chunked.iter_scan_tex_buffer(buf, 'utf-8', False, p, 4)
+        assert list(annots) == [todotex.TexAnnotation(1, 1, 'todo', '完' * 4)]
+        # including the continuation
+        annots = chunked.iter_scan_tex_buffer(buf, 'utf-8', True, p, 12)
+        assert list(annots) == [
+            todotex.TexAnnotation(1, 1, 'todo', '完' * 10 + ' x')
+        ]
+
+    def test_huge_line(self):
+        p = todotex.Patterns(self.keywords)
+        buf = b'x' * 10**7 + b' % todo ' + b'y' * 10**7 + b'\n% todo z'
+        annots = chunked.iter_scan_tex_buffer(buf, 'utf-8', True, p, 3)
+        assert list(annots) == [
+            todotex.TexAnnotation(1, 1, 'todo', 'yyy'),
+            todotex.TexAnnotation(2, 1, 'todo', 'z'),
+        ]
+
+    @pytest.mark.parametrize('count', [False, True])
+    def test_files(self, tex_tree, monkeypatch, count):
+        (tex_tree / 'none.tex').write_text('% nothing\n')
+        (tex_tree / 'utf16.tex').write_text('% todo utf-16\n',
+                                            encoding='utf-16')
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        texfiles = list(todotex.walk_tex_files([tex_tree], True))
+        if count:
+            scan = todotex.iter_count_tex_files
+        else:
+            scan = todotex.iter_scan_tex_files
+        expected_stats = todotex.ScanStats(todotex.ScanProfile())
+        expected = list(
+            scan(texfiles,
+                 p,
+                 True,
+                 todotex.EncodingDetector(),
+                 stats=expected_stats))
+        monkeypatch.setattr(todotex, '_MMAP_MIN_SIZE', 1)
+        stats = todotex.ScanStats(todotex.ScanProfile())
+        assert list(
+            scan(texfiles,
+                 p,
+                 True,
+                 todotex.EncodingDetector(),
+                 stats=stats)) == expected
+        assert stats.prefiltered == expected_stats.prefiltered
+        assert stats.profile.phases['scan'].lines == (
+            expected_stats.profile.phases['scan'].lines)
@@ -0,0 +1,253 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import todotex
+from todotex import client as client_module
+from todotex import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                                reason='Unix domain socket not available')
+
+REPO_ROOT = Path(todotex.__file__).resolve().parent.parent
+
+
+class TestDaemon:
+    def test_patterns_recompiled_on_config_change(self, tmp_path):
+        cfg = tmp_path / 'todotex.toml'
+        cfg.write_text('todo = [{key = "todo", label = "TODO"}]\n')
+        d = daemon.Daemon()
+        keywords, pat = d.get_patterns(cfg)
+        assert keywords.todo == {'todo': 'TODO'}
+        assert d.get_patterns(cfg)[1] is pat
+        cfg.write_text('todo = [{key = "fixme", label = "FIXME"}]\n')
+        keywords, pat2 = d.get_patterns(cfg)
+        assert keywords.todo == {'fixme': 'FIXME'}
+        assert pat2 is not pat
+
+
+def _handle(payload):
+    """
+    :return: the frames the daemon replies to the request ``payload`` with
+    """
+    server, client = socket.socketpair()
+    with server, client:
+        client_file = client.makefile('rb')
+        client_module.send_frame(client, client_module.REQUEST, payload)
+        daemon.Daemon().handle(server)
+        server.shutdown(socket.SHUT_WR)
+        frames = []
+        while True:
+            try:
+                frames.append(client_module.recv_frame(client_file))
+            except EOFError:
+                return frames
+
+
+class TestHandle:
+    def _request(self, **kwargs):
+        return json.dumps({
+            'argv': [],
+            'cwd': os.getcwd(),
+            'isatty': False,
+            'encoding': 'utf-8',
+            'stdin_encoding': 'utf-8',
+            **kwargs,
+        }).encode('utf-8')
+
+    def test_bad_cwd(self, tmp_path):
+        cwd = os.getcwd()
+        frames = _handle(self._request(cwd=str(tmp_path / 'none')))
+        assert frames[-1] == (client_module.EXIT, b'1')
+        assert b'No such file or directory' in b''.join(
+            payload for kind, payload in frames
+            if kind == client_module.STDERR)
+        assert os.getcwd() == cwd
+
+    @pytest.mark.parametrize('payload', [
+        b'not json',
+        b'[]',
+        json.dumps({'argv': 'not a list'}).encode('utf-8'),
+    ])
+    def test_malformed(self, payload):
+        frames = _handle(payload)
+        assert frames[0][0] == client_module.STDERR
+        assert frames[-1] == (client_module.EXIT, b'2')
+
+    def test_unknown_encoding(self):
+        frames = _handle(self._request(encoding='no-such-encoding'))
+        assert frames == [
+            (client_module.STDERR,
+             b'todotex daemon: unknown encoding: no-such-encoding\n'),
+            (client_module.EXIT, b'2'),
+        ]
+
+
+@pytest.fixture
+def served(tmp_path):
+    sock = str(tmp_path / 'todotex.sock')
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), TODOTEX_SOCKET=sock)
+    proc = subprocess.Popen([sys.executable, '-m', 'todotex', '--serve'],
+                            env=env)
+    try:
+        deadline = time.monotonic() + 10
+        while not os.path.exists(sock):
+            assert proc.poll() is None and time.monotonic() < deadline
+            time.sleep(0.02)
+        yield env
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _run(env, cwd, *args, stdin=None):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=cwd,
+        env=env,
+        input=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def test_client_matches_cli(served, tmp_path):
+    (tmp_path / 'a.tex').write_text('% todo a\n')
+    (tmp_path / 'b.tex').write_text('% fixme b\n')
+    cfg = tmp_path / 'cfg.toml'
+    cfg.write_text('todo = [{key = "todo", label = "TODO"}]\n')
+    for args in [
+        ['-C', 'cfg.toml', '.'],
+        ['-C', 'cfg.toml', '--format', 'jsonl', '--heading', 'always', '.'],
+        ['-C', 'cfg.toml', '--bogus'],
+    ]:
+        direct = _run(served, tmp_path, '-m', 'todotex', *args)
+        client = _run(served, tmp_path, '-m', 'todotex.client', *args)
+        assert (client.returncode, client.stdout, client.stderr) == (
+            direct.returncode, direct.stdout, direct.stderr)
+    client = _run(served, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  stdin='% todo stdin\n')
+    assert client.stdout == '1:TODO:stdin\n'
+    cfg.write_text('todo = [{key = "fixme", label = "FIXME"}]\n')
+    client = _run(served, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '.')
+    assert client.stdout == 'b.tex:1:FIXME:b\n'
+
+
+def test_client_without_daemon(tmp_path):
+    (tmp_path / 'a.tex').write_text('% todo a\n')
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    env = dict(os.environ,
+               PYTHONPATH=str(REPO_ROOT),
+               TODOTEX_SOCKET=str(tmp_path / 'none.sock'))
+    client = _run(env, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '.')
+    assert client.stdout == 'a.tex:1:TODO:a\n'
+
+
+def test_daemon_survives_bad_requests(served, tmp_path):
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    for payload in [
+            b'not json',
+            TestHandle()._request(cwd=str(tmp_path / 'none')),
+    ]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(served['TODOTEX_SOCKET'])
+            client_module.send_frame(sock, client_module.REQUEST, payload)
+            with sock.makefile('rb') as infile:
+                while True:
+                    kind, status = client_module.recv_frame(infile)
+                    if kind == client_module.EXIT:
+                        break
+            assert status != b'0'
+    client = _run(served, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  stdin='% todo still served\n')
+    assert client.stdout == '1:TODO:still served\n'
+
+
+def test_client_socket_option(served, tmp_path):
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    env = dict(served, TODOTEX_SOCKET=str(tmp_path / 'none.sock'))
+    client = _run(env, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '--socket', served['TODOTEX_SOCKET'], stdin='% todo x\n')
+    assert client.stdout == '1:TODO:x\n'
+    assert client.stderr == ''
+
+
+def test_client_ignores_foreign_socket(tmp_path):
+    (tmp_path / 'a.tex').write_text('% todo a\n')
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    (tmp_path / 'fake.sock').write_text('')
+    env = dict(os.environ,
+               PYTHONPATH=str(REPO_ROOT),
+               TODOTEX_SOCKET=str(tmp_path / 'fake.sock'))
+    client = _run(env, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '.')
+    # run in the client process instead
+    assert client.stdout == 'a.tex:1:TODO:a\n'
+    assert 'not a socket' in client.stderr
+
+
+def test_socket_path_in():
+    assert client_module.socket_path_in(['-r', '.']) is None
+    assert client_module.socket_path_in(['--socket', 'a', '.']) == 'a'
+    assert client_module.socket_path_in(['--socket=a', '--socket', 'b']) == 'b'
+    assert client_module.socket_path_in(['--', '--socket', 'a']) is None
+
+
+def test_client_streams_stdin(served, tmp_path):
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    # spans several STDIN frames
+    client = _run(served, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '--count', stdin='% todo x\n' * 30000)
+    assert client.stdout == '30000 TODO\n'
+    for i in range(3):
+        (tmp_path / f'{i}.tex').write_text(f'% todo {i}\n')
+    client = _run(served, tmp_path, '-m', 'todotex.client', '-C', 'cfg.toml',
+                  '--files-from', '-', '-0', stdin='0.tex\0002.tex\0')
+    assert client.stdout == '0.tex:1:TODO:0\n2.tex:1:TODO:2\n'
+
+
+def test_stalled_client(tmp_path):
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    cwd = os.getcwd()
+    server, client = socket.socketpair()
+    with server, client:
+        server.settimeout(0.2)
+        client_module.send_frame(
+            client, client_module.REQUEST,
+            TestHandle()._request(argv=['-C', 'cfg.toml'],
+                                  cwd=str(tmp_path)))
+        # never answers the request for the standard input
+        with pytest.raises(socket.timeout):
+            daemon.Daemon().handle(server)
+    assert os.getcwd() == cwd
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_client_without_unix_sockets(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'a.tex').write_text('% todo a\n')
+    (tmp_path / 'cfg.toml').write_text(
+        'todo = [{key = "todo", label = "TODO"}]\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delattr(socket, 'AF_UNIX')
+    monkeypatch.delattr(os, 'getuid')
+    monkeypatch.delenv('TODOTEX_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert client_module.default_socket_path().endswith('todotex.sock')
+    monkeypatch.setattr(sys, 'argv', ['todotex', '-C', 'cfg.toml', '.'])
+    client_module.main()
+    assert capsys.readouterr().out == 'a.tex:1:TODO:a\n'
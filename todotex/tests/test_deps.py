@@ -0,0 +1,135 @@
+from pathlib import Path
+
+import pytest
+
+from todotex import cache
+from todotex import deps
+from todotex import todotex
+
+
+@pytest.fixture
+def scan(patterns):
+    """Scan the include graph from a root, keeping only the messages."""
+    def scan(root, **kwargs):
+        return [(path, [a.msg for a in annots])
+                for path, annots in deps.iter_scan_tex_graph(
+                    root, patterns, False, 'utf-8', **kwargs)]
+
+    return scan
+
+
+@pytest.fixture
+def book(tmp_path):
+    (tmp_path / 'main.tex').write_text(
+        '% todo main\n'
+        '\\input{preamble}\n'
+        '% \\input{dead}\n'
+        '\\include{ch/one}\n'
+        '\\subfile{parts/part}\n'
+        '\\subimport{ch/}{two}\n'
+        '\\input{missing}\n'
+        '\\input{preamble}\n')
+    (tmp_path / 'preamble.tex').write_text('% todo preamble\n')
+    (tmp_path / 'dead.tex').write_text('% todo dead\n')
+    (tmp_path / 'ch').mkdir()
+    (tmp_path / 'ch' / 'one.tex').write_text('% todo one\n')
+    (tmp_path / 'ch' / 'two.tex').write_text('% todo two\n\\input{three}\n')
+    (tmp_path / 'ch' / 'three.tex').write_text('% todo three\n')
+    (tmp_path / 'parts').mkdir()
+    (tmp_path / 'parts' / 'part.tex').write_text(
+        '\\input{sec}\n% todo part\n\\import{ch/}{one}\n')
+    (tmp_path / 'parts' / 'sec.tex').write_text('% todo sec\n')
+    return tmp_path
+
+
+class TestParseIncludes:
+    def test_parse(self):
+        text = ('\\input{a} % \\input{b}\n'
+                '100\\% \\include {c}\\includegraphics{d.png}\n'
+                '\\subimport*{dir/}{e}\\inputfrom{f}{g}\n')
+        assert deps.parse_includes(text) == [
+            ('input', '', 'a'),
+            ('include', '', 'c'),
+            ('subimport', 'dir/', 'e'),
+            ('inputfrom', 'f', 'g'),
+        ]
+
+
+class TestIterScanTexGraph:
+    @pytest.mark.parametrize('workers', [1, 8])
+    def test_document_order(self, book, workers, scan):
+        assert scan(book / 'main.tex', workers=workers) == [
+            (book / 'main.tex', ['main']),
+            (book / 'preamble.tex', ['preamble']),
+            (book / 'ch' / 'one.tex', ['one']),
+            (book / 'parts' / 'part.tex', ['part']),
+            (book / 'parts' / 'sec.tex', ['sec']),
+            (book / 'ch' / 'two.tex', ['two']),
+            (book / 'ch' / 'three.tex', ['three']),
+        ]
+
+    def test_profile(self, book, scan):
+        profile = todotex.ScanProfile()
+        stats = todotex.ScanStats(profile)
+        scan(book / 'main.tex', stats=stats)
+        assert profile.phases['read'].files == stats.files
+        assert profile.phases['scan'].annots == 7
+
+    def test_decode_only_if_scanned(self, tmp_path, monkeypatch, scan):
+        (tmp_path / 'main.tex').write_text('\\input{a}\n\\input{b}\n')
+        (tmp_path / 'a.tex').write_text('% todo a\n')
+        # skipped by both prefilters, so never decoded
+        (tmp_path / 'b.tex').write_bytes(b'\xff plain text\n')
+        decoded = []
+        decode = deps._decode
+
+        def logged_decode(buf, *args):
+            decoded.append(buf)
+            return decode(buf, *args)
+
+        monkeypatch.setattr(deps, '_decode', logged_decode)
+        assert scan(tmp_path / 'main.tex') == [(tmp_path / 'a.tex', ['a'])]
+        # main.tex is decoded for its directives only
+        assert sorted(decoded) == [b'% todo a\n', b'\\input{a}\n\\input{b}\n']
+
+    def test_cycle(self, tmp_path, scan):
+        (tmp_path / 'a.tex').write_text('% todo a\n\\input{b}\n')
+        (tmp_path / 'b.tex').write_text('% todo b\n\\input{a}\n')
+        assert scan(tmp_path / 'a.tex') == [
+            (tmp_path / 'a.tex', ['a']),
+            (tmp_path / 'b.tex', ['b']),
+        ]
+
+    def test_missing_root(self, tmp_path, scan):
+        with pytest.raises(FileNotFoundError):
+            scan(tmp_path / 'main.tex')
+
+    def test_relative_root(self, book, monkeypatch, scan):
+        monkeypatch.chdir(book)
+        paths = [path for path, _ in scan(Path('main.tex'))]
+        assert paths[:3] == [
+            Path('main.tex'),
+            Path('preamble.tex'),
+            Path('ch/one.tex'),
+        ]
+
+    def test_cache(self, book, monkeypatch, scan):
+        with cache.AnnotationCache(book / 'cache', 'fp') as c:
+            cold = scan(book / 'main.tex', cache=c)
+
+        def fail(*_args, **_kwargs):
+            raise AssertionError('should not be read')
+
+        with monkeypatch.context() as m:
+            m.setattr(deps, '_read_tex_file', fail)
+            with cache.AnnotationCache(book / 'cache', 'fp') as c:
+                assert scan(book / 'main.tex', cache=c) == cold
+        (book / 'ch' / 'two.tex').write_text('% todo new two\n')
+        stats = todotex.ScanStats()
+        with cache.AnnotationCache(book / 'cache', 'fp') as c:
+            warm = scan(book / 'main.tex', cache=c, stats=stats)
+        # three.tex is no longer included
+        assert stats.files == len(cold) - 1
+        assert stats.cached == len(cold) - 2
+        assert warm == [(path, ['new two'] if path.name == 'two.tex' else msgs)
+                        for path, msgs in cold if path.name != 'three.tex']
@@ -0,0 +1,81 @@
+import shutil
+import subprocess
+
+import pytest
+
+from todotex import gitfiles
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None, reason='git is not installed')
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost',
+         *args],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, 'init', '-q')
+    (tmp_path / '.gitignore').write_text('build/\n')
+    (tmp_path / 'build').mkdir()
+    (tmp_path / 'build' / 'out.tex').write_text('')
+    (tmp_path / 'main.tex').write_text('')
+    (tmp_path / 'notes.txt').write_text('')
+    (tmp_path / 'ch').mkdir()
+    (tmp_path / 'ch' / 'one.tex').write_text('')
+    (tmp_path / 'ch' / 'two.tex').write_text('')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-q', '-m', 'init')
+    return tmp_path
+
+
+class TestIterGitTexFiles:
+    def test_list(self, repo):
+        (repo / 'ch' / 'three.tex').write_text('')
+        (repo / 'ch' / 'two.tex').unlink()
+        assert list(gitfiles.iter_git_tex_files([repo], True)) == [
+            repo / 'ch' / 'one.tex',
+            repo / 'ch' / 'three.tex',
+            repo / 'main.tex',
+        ]
+        assert list(gitfiles.iter_git_tex_files([repo], False)) == [
+            repo / 'main.tex',
+        ]
+        assert list(gitfiles.iter_git_tex_files([repo / 'ch'], True)) == [
+            repo / 'ch' / 'one.tex',
+            repo / 'ch' / 'three.tex',
+        ]
+
+    def test_since(self, repo):
+        (repo / 'ch' / 'one.tex').write_text('% todo\n')
+        (repo / 'ch' / 'new.tex').write_text('')
+        (repo / 'main.tex').unlink()
+        assert list(gitfiles.iter_git_tex_files([repo], True, 'HEAD')) == [
+            repo / 'ch' / 'new.tex',
+            repo / 'ch' / 'one.tex',
+        ]
+
+    def test_globs(self, repo):
+        def listed(**kwargs):
+            return [
+                path.relative_to(repo).as_posix()
+                for path in gitfiles.iter_git_tex_files([repo], True, **kwargs)
+            ]
+
+        # matched as ``walk_tex_files`` does
+        assert listed(exclude=['ch']) == ['main.tex']
+        assert listed(exclude=['ch/one.tex']) == ['ch/two.tex', 'main.tex']
+        assert listed(include=['t*.tex']) == ['ch/two.tex']
+        assert listed(include=['ch/*']) == ['ch/one.tex', 'ch/two.tex']
+        (repo / 'ch' / 'one.tex').write_text('% todo\n')
+        assert listed(since='HEAD', exclude=['one.tex']) == []
+
+    def test_not_a_repo(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            list(gitfiles.iter_git_tex_files([tmp_path], True))
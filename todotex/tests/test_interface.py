@@ -1,10 +1,20 @@
 import io
+import json
 from pathlib import Path
 from collections import OrderedDict
 
+import pytest
+
 from todotex import interface
 from todotex.config import KeywordsConfig
-from todotex.todotex import TexAnnotation
+from todotex.todotex import (
+    FileProfile,
+    Patterns,
+    ScanProfile,
+    ScanStats,
+    TexAnnotation,
+    scan_tex_text,
+)
 
 
 class TestOneLineBufferedWriter:
@@ -191,3 +201,259 @@ class TestShowResult:
         )
         cbuf.seek(0)
         assert cbuf.read() == '3:TODO:some text\n4:SOLVED\n'
+
+    def test_stream(self):
+        cbuf = io.StringIO()
+        keywords = KeywordsConfig({'todo': 'TODO'}, {})
+
+        def annots():
+            yield TexAnnotation(3, 1, 'todo', 'some text')
+            yield TexAnnotation(4, 1, 'todo', 'more text')
+            # only the last line is held back, in case it's trailing empty
+            assert cbuf.getvalue() == 'sample.tex:3:TODO:some text\n'
+
+        interface.show_result(
+            iter([(Path('sample.tex'), annots())]),
+            keywords,
+            True,
+            True,
+            True,
+            True,
+            False,
+            'never',
+            'never',
+            cbuf,
+        )
+        assert cbuf.getvalue() == ('sample.tex:3:TODO:some text\n'
+                                   'sample.tex:4:TODO:more text\n')
+
+    def test_no_heading_color(self):
+        cbuf = io.StringIO()
+        annots = OrderedDict({
+            Path('sample.tex'): [
+                TexAnnotation(3, 1, 'todo', 'some text'),
+                TexAnnotation(4, 1, 'unknown', 'skipped'),
+                TexAnnotation(5, 1, 'todo', None),
+            ]
+        })
+        keywords = KeywordsConfig({'todo': 'TODO'}, {})
+        interface.show_result(annots, keywords, True, True, True, True,
+                              False, 'never', 'always', cbuf)
+        prefix = (f'{interface.Colors.purple}sample.tex'
+                  f'{interface.Colors.reset}:{interface.Colors.green}')
+        label = f'{interface.Colors.bold_red}TODO{interface.Colors.reset}'
+        assert cbuf.getvalue() == (
+            f'{prefix}3{interface.Colors.reset}:{label}:some text\n'
+            f'{prefix}5{interface.Colors.reset}:{label}\n')
+
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_empty_messages(self, lazy):
+        def annots():
+            result = [
+                (Path('a.tex'), [
+                    TexAnnotation(1, 1, 'todo', ''),
+                    TexAnnotation(2, 1, 'todo', 'x'),
+                    TexAnnotation(3, 1, 'todo', None),
+                ]),
+                (None, [TexAnnotation(4, 1, 'todo', '')]),
+            ]
+            if lazy:
+                return [(path, iter(a)) for path, a in result]
+            return result
+
+        keywords = KeywordsConfig({'todo': 'TODO'}, {})
+        outputs = []
+        for heading in ['always', 'never']:
+            cbuf = io.StringIO()
+            interface.show_result(annots(), keywords, False, True, False,
+                                  True, False, heading, 'never', cbuf)
+            outputs.append(cbuf.getvalue())
+        # kept as empty lines under heading, even the trailing one, but
+        # skipped otherwise if there's nothing else on the line
+        assert outputs == ['a.tex\n\nx\n\n\n', 'a.tex\na.tex:x\na.tex\n']
+
+
+class TestShowResultJsonl:
+    def test_records(self):
+        cbuf = io.StringIO()
+        keywords = KeywordsConfig({'todo': 'TODO'},
+                                  {'question solved': 'SOLVED'})
+        annots = OrderedDict([
+            (Path('sample.tex'), [
+                TexAnnotation(3, 1, 'todo', 'some "text" 中文'),
+                TexAnnotation(4, 1, 'question solved', None),
+            ]),
+            (None, [TexAnnotation(1, 0, 'todo', 'stdin')]),
+        ])
+        interface.show_result_jsonl(annots, keywords, True, False, cbuf)
+        assert cbuf.getvalue() == (
+            '{"path": "sample.tex", "ln": 3, "key": "todo", "label": "TODO", '
+            '"msg": "some \\"text\\" 中文", "kind": "todo"}\n'
+            '{"path": "sample.tex", "ln": 4, "key": "question solved", '
+            '"label": "SOLVED", "msg": null, "kind": "done"}\n'
+            '{"path": null, "ln": 1, "key": "todo", "label": "TODO", '
+            '"msg": "stdin", "kind": "todo"}\n')
+
+    def test_no_done_stream(self):
+        cbuf = io.StringIO()
+        keywords = KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+
+        def annots():
+            yield TexAnnotation(3, 1, 'done', 'x')
+            yield TexAnnotation(4, 1, 'todo', 'y')
+            # written as soon as taken, without holding back any line
+            assert cbuf.getvalue().count('\n') == 1
+
+        interface.show_result_jsonl(
+            iter([(Path('sample.tex'), annots())]), keywords, False, False,
+            cbuf)
+        assert '"ln": 4' in cbuf.getvalue()
+        assert '"ln": 3' not in cbuf.getvalue()
+
+    def test_regex_key(self):
+        keywords = KeywordsConfig({'todo': 'TODO'},
+                                  {r'continue ?\.{3,}': 'CONT'})
+        annots = scan_tex_text('% continue... later\n% todo x\n', False,
+                               Patterns(keywords))
+        assert [a.key for a in annots] == ['continue...', 'todo']
+        cbuf = io.StringIO()
+        interface.show_result_jsonl([(None, annots)], keywords, True, False,
+                                    cbuf)
+        # skipped as by ``show_result``, rather than raising ``KeyError``
+        assert [json.loads(line)['key']
+                for line in cbuf.getvalue().splitlines()] == ['todo']
+
+    def test_unconfigured_key(self):
+        keywords = KeywordsConfig({}, {})
+        annots = scan_tex_text('% any comment\n', False, Patterns(keywords))
+        assert [a.key for a in annots] == ['']
+        for print_done in [False, True]:
+            cbuf = io.StringIO()
+            interface.show_result_jsonl([(None, annots)], keywords,
+                                        print_done, False, cbuf)
+            assert cbuf.getvalue() == ''
+
+
+class TestShowCounts:
+    keywords = KeywordsConfig({
+        'todo': 'TODO',
+        'fixme': 'TODO',
+        'question': 'QUESTION'
+    }, {'done': 'DONE'})
+    counts = [
+        (Path('book/ch1/a.tex'), {
+            'todo': 2,
+            'fixme': 1,
+            'done': 4
+        }),
+        (Path('book/ch1/sec/b.tex'), {
+            'todo': 1,
+            'unknown': 5
+        }),
+        (Path('book/ch2/c.tex'), {
+            'done': 1
+        }),
+        (Path('book/ch2/d.tex'), {}),
+    ]
+
+    def test_total(self):
+        cbuf = io.StringIO()
+        interface.show_counts(iter(self.counts), self.keywords, True, False,
+                              False, 'never', outfile=cbuf)
+        assert cbuf.getvalue() == '4 TODO, 0 QUESTION, 5 DONE\n'
+
+    def test_summary(self):
+        cbuf = io.StringIO()
+        interface.show_counts(self.counts, self.keywords, False, True, False,
+                              'never', outfile=cbuf)
+        # with no done annotations counted, `book/ch2' has none, which
+        # leaves `book/ch1' as the directory common to the rest
+        assert cbuf.getvalue() == ('4 TODO, 0 QUESTION\n'
+                                   'book/ch1/a.tex: 3 TODO\n'
+                                   'book/ch1/sec/: 1 TODO\n'
+                                   '  book/ch1/sec/b.tex: 1 TODO\n')
+
+    def test_summary_jsonl(self):
+        cbuf = io.StringIO()
+        interface.show_counts(OrderedDict(self.counts), self.keywords, True,
+                              True, False, 'always', 'jsonl', cbuf)
+        records = [json.loads(line) for line in cbuf.getvalue().splitlines()]
+        assert records[0] == {
+            'path': None,
+            'type': 'total',
+            'counts': {
+                'TODO': 4,
+                'QUESTION': 0,
+                'DONE': 5
+            },
+        }
+        assert [(r['path'], r['type']) for r in records[1:]] == [
+            ('book/ch1', 'dir'),
+            ('book/ch1/a.tex', 'file'),
+            ('book/ch1/sec', 'dir'),
+            ('book/ch1/sec/b.tex', 'file'),
+            ('book/ch2', 'dir'),
+            ('book/ch2/c.tex', 'file'),
+        ]
+        assert records[1]['counts'] == {'TODO': 4, 'DONE': 4}
+
+    def test_stdin(self):
+        cbuf = io.StringIO()
+        interface.show_counts([(None, {
+            'todo': 1
+        })], self.keywords, True, True, False, 'never', outfile=cbuf)
+        assert cbuf.getvalue() == '1 TODO, 0 QUESTION, 0 DONE\n'
+
+
+class TestShowStats:
+    @staticmethod
+    def _stats():
+        profile = ScanProfile(top=1)
+        profile.add_phase('walk', 0.5, 2)
+        profile.add_file(
+            Path('a.tex'),
+            FileProfile(0.25, 0.0, 0.25, 0.5, 2000000, True, 10, 3))
+        profile.wall = 2.0
+        stats = ScanStats(profile)
+        stats.files = 2
+        stats.prefiltered = 1
+        return stats
+
+    def test_text(self):
+        cbuf = io.StringIO()
+        interface.show_stats(ScanStats(), cbuf)
+        assert cbuf.getvalue() == (
+            '0 TeX files found, 0 skipped by prefilter, 0 reused from cache\n')
+        cbuf = io.StringIO()
+        interface.show_stats(self._stats(), cbuf)
+        lines = cbuf.getvalue().splitlines()
+        assert lines[2].split() == ['walk', '0.5000', '2', '0', '0', '0',
+                                    '-', '4.0']
+        assert lines[3].split() == ['read', '0.2500', '1', '2000000', '0',
+                                    '0', '8.0', '4.0']
+        assert lines[-3].startswith('wall time 2.0000s, 1.0 MB/s, '
+                                    '1.0 files/s')
+        assert lines[-2:] == [
+            'slowest files:',
+            '    1.0000s  a.tex (read 0.2500s, detect 0.0000s, '
+            'decode 0.2500s, scan 0.5000s)',
+        ]
+
+    def test_json(self):
+        cbuf = io.StringIO()
+        interface.show_stats(self._stats(), cbuf, 'json')
+        obj = json.loads(cbuf.getvalue())
+        assert obj['files'] == 2
+        assert obj['prefiltered'] == 1
+        assert obj['files_per_s'] == 1.0
+        assert obj['phases']['scan'] == {
+            'seconds': 0.5,
+            'files': 1,
+            'bytes': 0,
+            'lines': 10,
+            'annots': 3,
+            'mb_per_s': None,
+            'files_per_s': 2.0,
+        }
+        assert obj['slowest'][0]['path'] == 'a.tex'
+        assert obj['slowest'][0]['seconds'] == 1.0
@@ -0,0 +1,364 @@
+import io
+import json
+import random
+import threading
+
+import pytest
+
+from todotex import config
+from todotex import lsp
+from todotex import todotex
+
+
+def _full_scan(lines, allow_continuation, p):
+    return lsp.scan_entries(lines, 0, len(lines), allow_continuation, p)
+
+
+class TestDocument:
+    # the pieces of text the edits insert, including the heads and the
+    # continuation lines of blocks, at various indentations
+    pieces = [
+        '',
+        '\n',
+        'x',
+        '%',
+        ' ',
+        '% todo a',
+        '%  todo b',
+        '%  more',
+        '%   more',
+        '%    deeper',
+        '% done 完成',
+        '\\% todo escaped',
+        'text % todo after text',
+        '%\n',
+        '\n%   cont\n',
+        '% todo x\n%   y\n%   z\n',
+    ]
+
+    def _random_text(self, rng, n):
+        return ''.join(rng.choice(self.pieces) for _ in range(n))
+
+    def _check_random_edits(self, allow_continuation, p):
+        rng = random.Random(0)
+        for _ in range(30):
+            text = '\n'.join(
+                self._random_text(rng, 2) for _ in range(rng.randint(1, 30)))
+            doc = lsp.Document(text, allow_continuation, p)
+            for _ in range(30):
+                sl = rng.randrange(len(doc.lines))
+                el = min(sl + rng.choice([0, 0, 1, 2, 5]), len(doc.lines) - 1)
+                sc = rng.randint(0, len(doc.lines[sl]))
+                ec = rng.randint(0, len(doc.lines[el]))
+                if el == sl and ec < sc:
+                    sc, ec = ec, sc
+                doc.replace((sl, sc), (el, ec),
+                            self._random_text(rng, rng.randint(0, 3)))
+                assert doc.entries == _full_scan(doc.lines,
+                                                 allow_continuation, p)
+
+    def test_random_edits(self, patterns):
+        self._check_random_edits(False, patterns)
+
+    def test_random_edits_cont(self, patterns):
+        self._check_random_edits(True, patterns)
+
+    def test_rescan_is_local(self, patterns):
+        text = '\n'.join(['% todo x', '%   y', 'text'] * 1000)
+        doc = lsp.Document(text, True, patterns)
+        # append to a continuation line in the middle
+        rescanned = doc.replace((1501, 5), (1501, 5), ' z')
+        assert rescanned.start == 1500
+        assert len(rescanned) < 10
+        assert doc.entries[500].annot.msg == 'x y z'
+        # continue the block on the next line
+        rescanned = doc.replace((1502, 0), (1502, 4), '%   w')
+        assert rescanned.start == 1500
+        assert len(rescanned) < 10
+        assert doc.entries[500].annot.msg == 'x y z w'
+        assert doc.entries[501].annot.msg == 'x y'
+        assert doc.entries == _full_scan(doc.lines, True, patterns)
+
+    def test_crlf(self, patterns):
+        doc = lsp.Document('% todo a\r\n%  b\r\n', True, patterns)
+        assert doc.annots == [todotex.TexAnnotation(1, 1, 'todo', 'a b')]
+        doc.replace((2, 0), (2, 0), '%  c\r\n')
+        assert doc.annots == [todotex.TexAnnotation(1, 1, 'todo', 'a b c')]
+
+
+def _frame(msg):
+    body = json.dumps(msg).encode('utf-8')
+    return b'Content-Length: %d\r\n\r\n' % len(body) + body
+
+
+def _read_all(buf):
+    infile = io.BytesIO(buf)
+    msgs = []
+    while True:
+        msg = lsp.read_message(infile)
+        if msg is None:
+            return msgs
+        msgs.append(msg)
+
+
+class _IndexedServer(lsp.Server):
+    """A server which finishes scanning the workspace before shutdown."""
+    def _shutdown_request(self, params) -> None:
+        self.indexed.wait()
+        super()._shutdown_request(params)
+
+
+class TestServer:
+    def _run(self, tmp_path, msgs, **kwargs):
+        infile = io.BytesIO(b''.join(map(_frame, msgs)))
+        outfile = io.BytesIO()
+        keywords = config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+        server = _IndexedServer(keywords, todotex.Patterns(keywords), True,
+                                'utf-8', infile, outfile, **kwargs)
+        status = server.serve()
+        return status, server, _read_all(outfile.getvalue())
+
+    def test_session(self, tmp_path):
+        (tmp_path / 'disk.tex').write_text('% todo on disk\n')
+        (tmp_path / 'none.tex').write_text('% nothing\n')
+        uri = (tmp_path / 'open.tex').as_uri()
+        status, server, out = self._run(tmp_path, [
+            {
+                'id': 1,
+                'method': 'initialize',
+                'params': {
+                    'rootUri': tmp_path.as_uri(),
+                    'capabilities': {},
+                },
+            },
+            {
+                'method': 'initialized',
+                'params': {}
+            },
+            {
+                'method': 'textDocument/didOpen',
+                'params': {
+                    'textDocument': {
+                        'uri': uri,
+                        'text': 'x🙂 % todo a\n%    b\n',
+                    },
+                },
+            },
+            {
+                'method': 'textDocument/didChange',
+                'params': {
+                    'textDocument': {
+                        'uri': uri
+                    },
+                    'contentChanges': [{
+                        'range': {
+                            'start': {
+                                'line': 1,
+                                'character': 7
+                            },
+                            'end': {
+                                'line': 1,
+                                'character': 7
+                            },
+                        },
+                        'text': ' c',
+                    }],
+                },
+            },
+            {
+                'id': 2,
+                'method': 'workspace/symbol',
+                'params': {
+                    'query': 'todo'
+                }
+            },
+            {
+                'id': 3,
+                'method': 'no/such/method'
+            },
+            {
+                'id': 4,
+                'method': 'shutdown'
+            },
+            {
+                'method': 'exit'
+            },
+        ])
+        assert status == 0
+        responses = {msg['id']: msg for msg in out if 'id' in msg}
+        assert responses[1]['result']['capabilities']['textDocumentSync'][
+            'change'] == 2
+        assert responses[3]['error']['code'] == -32601
+        assert responses[4]['result'] is None
+        published = [
+            msg['params'] for msg in out
+            if msg.get('method') == 'textDocument/publishDiagnostics'
+        ]
+        opened = [d for d in published if d['uri'] == uri]
+        assert [d['diagnostics'][0]['message'] for d in opened] == [
+            'TODO: a b',
+            'TODO: a b c',
+        ]
+        # the columns are counted in UTF-16 code units
+        assert opened[-1]['diagnostics'][0]['range'] == {
+            'start': {
+                'line': 0,
+                'character': 4
+            },
+            'end': {
+                'line': 1,
+                'character': 8
+            },
+        }
+        # the rest of the workspace, scanned in the background
+        assert [d['uri'] for d in published if d['uri'] != uri
+                ] == [(tmp_path / 'disk.tex').as_uri()]
+        assert server.index == {
+            tmp_path / 'disk.tex':
+            [todotex.TexAnnotation(1, 1, 'todo', 'on disk')],
+        }
+        # the file on disk is listed only once scanned in the background
+        names = sorted(s['name'] for s in responses[2]['result'])
+        assert names in (['TODO: a b c'], ['TODO: a b c', 'TODO: on disk'])
+
+    def test_close_and_watched_files(self, tmp_path):
+        path = tmp_path / 'a.tex'
+        path.write_text('% todo saved\n')
+        outfile = io.BytesIO()
+        keywords = config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+        server = lsp.Server(keywords, todotex.Patterns(keywords), True,
+                            'utf-8', io.BytesIO(), outfile, print_done=False)
+
+        def published():
+            msgs = _read_all(outfile.getvalue())
+            outfile.seek(0)
+            outfile.truncate()
+            return [[d['message'] for d in msg['params']['diagnostics']]
+                    for msg in msgs
+                    if msg.get('method') == 'textDocument/publishDiagnostics']
+
+        server.handle({
+            'id': 1,
+            'method': 'initialize',
+            'params': {
+                'capabilities': {
+                    'general': {
+                        'positionEncodings': ['utf-32', 'utf-16']
+                    }
+                },
+            },
+        })
+        assert _read_all(outfile.getvalue())[0]['result']['capabilities'][
+            'positionEncoding'] == 'utf-32'
+        server.handle({'method': 'initialized', 'params': {}})
+        server.indexed.wait()
+        published()
+        server.handle({
+            'method': 'textDocument/didOpen',
+            'params': {
+                'textDocument': {
+                    'uri': path.as_uri(),
+                    'text': '% todo unsaved\n% done old\n',
+                },
+            },
+        })
+        # done annotations are not published with ``print_done=False``
+        assert published() == [['TODO: unsaved']]
+        server.handle({
+            'method': 'textDocument/didClose',
+            'params': {
+                'textDocument': {
+                    'uri': path.as_uri()
+                }
+            },
+        })
+        server.rescans.join()
+        # the file on disk once closed
+        assert published() == [['TODO: saved']]
+        path.unlink()
+        server.handle({
+            'method': 'workspace/didChangeWatchedFiles',
+            'params': {
+                'changes': [{
+                    'uri': path.as_uri(),
+                    'type': 3
+                }]
+            },
+        })
+        server.rescans.join()
+        assert published() == [[]]
+        assert server.index == {}
+        server.stop()
+
+    @pytest.mark.parametrize('todo, shown', [
+        ({}, []),
+        ({'todo': 'TODO'}, ['TODO: x']),
+    ])
+    def test_unconfigured_keys(self, tmp_path, todo, shown):
+        keywords = config.KeywordsConfig(todo, {})
+        outfile = io.BytesIO()
+        server = lsp.Server(keywords, todotex.Patterns(keywords), False,
+                            'utf-8', io.BytesIO(), outfile)
+        server.handle({
+            'method': 'textDocument/didOpen',
+            'params': {
+                'textDocument': {
+                    'uri': (tmp_path / 'a.tex').as_uri(),
+                    'text': '% todo x\n% just a comment\n',
+                },
+            },
+        })
+        server.handle({
+            'id': 1,
+            'method': 'workspace/symbol',
+            'params': {
+                'query': ''
+            },
+        })
+        out = _read_all(outfile.getvalue())
+        # neither published nor listed, whatever they match
+        assert [d['message'] for d in out[0]['params']['diagnostics']
+                ] == shown
+        assert [sym['name'] for sym in out[1]['result']] == shown
+
+    def test_shutdown_amid_scan(self, tmp_path):
+        for name in ['a.tex', 'b.tex', 'c.tex']:
+            (tmp_path / name).write_text('% todo x\n')
+        outfile = io.BytesIO()
+        keywords = config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+        server = lsp.Server(keywords, todotex.Patterns(keywords), True,
+                            'utf-8', io.BytesIO(), outfile)
+        scanning = threading.Event()
+        resume = threading.Event()
+        updated = []
+
+        def update_index(path, annots):
+            updated.append(path)
+            scanning.set()
+            resume.wait()
+
+        server._update_index = update_index
+        server.handle({
+            'id': 1,
+            'method': 'initialize',
+            'params': {
+                'rootUri': tmp_path.as_uri()
+            },
+        })
+        server.handle({'method': 'initialized', 'params': {}})
+        assert scanning.wait(10)
+        # answered while the first file is still being indexed
+        server.handle({'id': 2, 'method': 'shutdown'})
+        assert _read_all(outfile.getvalue())[-1] == {
+            'jsonrpc': '2.0',
+            'id': 2,
+            'result': None,
+        }
+        resume.set()
+        server.stop()
+        # the rest of the workspace is not scanned
+        assert len(updated) == 1
+
+    def test_exit_without_shutdown(self, tmp_path):
+        status, _, _ = self._run(tmp_path, [{'method': 'exit'}])
+        assert status == 1
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import todotex
+
+# the budget of the cumulative time to import ``todotex.__main__``, in ms,
+# checked only if $TODOTEX_CHECK_IMPORT_TIME is set, since the wall-clock
+# time varies too much on loaded machines to be checked by default
+IMPORT_BUDGET_MS = float(os.environ.get('TODOTEX_IMPORT_BUDGET_MS', 35))
+
+# the modules deferred until the operation requested needs them
+DEFERRED_MODULES = [
+    'asyncio',
+    'chardet',
+    'colorama',
+    'concurrent.futures',
+    'dataclasses',
+    'inspect',
+    'mmap',
+    'socket',
+    'sqlite3',
+    'tarfile',
+    'todotex.aio',
+    'todotex.archives',
+    'todotex.cache',
+    'todotex.chunked',
+    'todotex.daemon',
+    'todotex.lsp',
+    'zipfile',
+]
+
+# the modules not imported by merely importing ``todotex.__main__``, besides
+# ``DEFERRED_MODULES``
+DEFERRED_BY_IMPORT = [
+    'heapq',
+    'tomli',
+]
+
+REPO_ROOT = Path(todotex.__file__).resolve().parent.parent
+
+
+def _run_importtime(args, tmp_path):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    # so that the bytecode is cached as it would be in an installation
+    env['PYTHONPYCACHEPREFIX'] = str(tmp_path / 'pycache')
+    env['PYTHONPATH'] = str(REPO_ROOT)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    # lines like 'import time:   self [us] | cumulative | imported package'
+    cumulative_us = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                cumulative_us[name.strip()] = int(cumulative)
+    return cumulative_us
+
+
+def test_import_defers(tmp_path):
+    imported = _run_importtime(['-c', 'import todotex.__main__'], tmp_path)
+    assert 'todotex.__main__' in imported
+    for name in DEFERRED_MODULES + DEFERRED_BY_IMPORT:
+        assert name not in imported
+
+
+@pytest.mark.skipif(not os.environ.get('TODOTEX_CHECK_IMPORT_TIME'),
+                    reason='set $TODOTEX_CHECK_IMPORT_TIME to check')
+def test_import_budget(tmp_path):
+    # warm up the bytecode cache
+    _run_importtime(['-c', 'import todotex.__main__'], tmp_path)
+    elapsed_ms = min(
+        _run_importtime(['-c', 'import todotex.__main__'], tmp_path)
+        ['todotex.__main__'] for _ in range(5)) / 1000
+    assert elapsed_ms < IMPORT_BUDGET_MS
+
+
+@pytest.mark.parametrize('args', [
+    ['sample.tex'],
+    ['-c', '-r', '--stats', '.'],
+])
+def test_deferred_imports(tmp_path, args):
+    imported = _run_importtime(
+        ['-m', 'todotex', '-C', 'todotex.example.toml', *args], tmp_path)
+    assert 'todotex.todotex' in imported
+    for name in DEFERRED_MODULES:
+        assert name not in imported
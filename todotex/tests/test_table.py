@@ -0,0 +1,66 @@
+import io
+from collections import OrderedDict
+from pathlib import Path
+
+from todotex import config
+from todotex import interface
+from todotex import todotex
+from todotex.table import AnnotationTable
+from todotex.todotex import TexAnnotation
+
+
+def _result():
+    return OrderedDict([
+        (Path('a.tex'), [
+            TexAnnotation(1, 1, 'todo', 'x'),
+            TexAnnotation(300, 2, 'done', None),
+        ]),
+        (Path('empty.tex'), []),
+        (Path('b.tex'), [TexAnnotation(7, 1, 'todo', 'y')]),
+        (None, [TexAnnotation(2, 0, 'todo', 'stdin')]),
+    ])
+
+
+class TestAnnotationTable:
+    def test_same_as_mapping(self):
+        result = _result()
+        table = AnnotationTable.from_scan(iter(result.items()))
+        assert list(table.items()) == list(result.items())
+        assert len(table) == 4
+        assert table.n_rows == 4
+        assert table.keys == ['todo', 'done']
+        assert Path('b.tex') in table and Path('c.tex') not in table
+
+    def test_show_result(self):
+        keywords = config.KeywordsConfig({'todo': 'TODO'}, {'done': 'DONE'})
+        outputs = []
+        for result in [_result(), AnnotationTable.from_scan(_result())]:
+            cbuf = io.StringIO()
+            interface.show_result(result, keywords, True, True, True, True,
+                                  False, 'always', 'never', cbuf)
+            outputs.append(cbuf.getvalue())
+        assert outputs[0] == outputs[1]
+
+    def test_iter_batches(self):
+        table = AnnotationTable.from_scan(_result())
+        batches = list(table.iter_batches(batch_size=3))
+        assert [len(b['msg']) for b in batches] == [3, 1]
+        assert batches[0]['path'] == ['a.tex', 'a.tex', 'b.tex']
+        assert list(batches[0]['ln']) == [1, 300, 7]
+        assert batches[0]['key'] == ['todo', 'done', 'todo']
+        assert batches[1] == {
+            'path': [None],
+            'ln': table.ln[3:4],
+            'pfxlen': table.pfxlen[3:4],
+            'key': ['todo'],
+            'msg': ['stdin'],
+        }
+
+    def test_keys_shared(self):
+        p = todotex.Patterns(
+            config.KeywordsConfig({'todo': 'TODO', 'fix ?me': 'TODO'}, {}))
+        annots = todotex.scan_tex_doc(
+            ['% todo a\n', '% todo b\n', '% fixme c\n', '% fixme d\n'], False,
+            p)
+        assert annots[0].key is annots[1].key
+        assert annots[2].key is annots[3].key
@@ -1,3 +1,12 @@
+import collections
+import io
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
 from todotex import config
 from todotex import todotex
 
@@ -22,6 +31,74 @@ class TestPatterns:
         assert matchobj.group('pfx_space') == ' '
         assert matchobj.group('msg') == 'how to elaborate this?'
 
+    def test_prefilter(self):
+        cfg = config.KeywordsConfig(
+            {
+                'todo': 'TODO',
+                r'continue ?\.{3,}': 'TODO',
+                'todos?': 'TODO',
+            }, {'done': 'DONE'})
+        p = todotex.Patterns(cfg)
+        prefilter = p.prefilter('utf-8')
+        assert prefilter.search(b'x %  continue...')
+        assert prefilter.search(b'%\ttodo')
+        assert prefilter.search(b'%done')
+        assert not prefilter.search(b'todo done % nothing here')
+        assert p.prefilter('utf-16') is None
+
+    def test_no_prefilter(self):
+        p = todotex.Patterns(config.KeywordsConfig({'[Tt]odo': 'TODO'}, {}))
+        assert p.prefilter('utf-8') is None
+        p = todotex.Patterns(config.KeywordsConfig({'todo|fixme': 'TODO'}, {}))
+        assert p.prefilter('utf-8') is None
+        p = todotex.Patterns(config.KeywordsConfig({}, {}))
+        assert p.prefilter('utf-8') is None
+
+
+class TestKeyMatcher:
+    def test_same_as_regex(self):
+        cfg = config.KeywordsConfig(
+            {
+                'todo': 'TODO',
+                'to': 'TODO',
+                r'continue ?\.{3,}': 'TODO',
+                'question': 'QUESTION',
+            }, {
+                'question solved': 'SOLVED',
+                'do': 'DONE',
+            })
+        p = todotex.Patterns(cfg)
+        lines = [
+            '',
+            'no comment',
+            '% todo',
+            '%todo: message',
+            '%todo::message',
+            'a \\% todo escaped',
+            'a \\%% todo escaped percent sign',
+            '%% todo',
+            '%%%',
+            '\t%\t question solved  x',
+            '% question solvedx',
+            '% questionsolved',
+            '% todo\x0b no match for \\S',
+            '% continue..... x',
+            '% continue... % todo x',
+            '% nothing % todo x',
+            '% continue.. % tod % todo',
+        ]
+        for line in lines:
+            expected = p.key.search(line)
+            if expected is not None:
+                expected = todotex.KeyMatch(expected.group('pfx_space'),
+                                            expected.group('key'),
+                                            expected.group('msg'))
+            assert p.key_matcher.search(line) == expected, line
+
+    def test_no_keys(self):
+        p = todotex.Patterns(config.KeywordsConfig({}, {}))
+        assert p.key_matcher.search('%% x') == todotex.KeyMatch(' ', '', 'x')
+
 
 class TestScanTexDoc:
     def test_two_lines_no_cont(self):
@@ -186,3 +263,433 @@ class TestScanTexDoc:
         assert annots[0].ln == 1
         assert annots[0].key == 'todo'
         assert annots[0].msg == '测试再次测试'
+
+    def test_many_lines_cont(self):
+        lines = ['test % todo 0\n']
+        lines.extend(f'  %   {i}\n' for i in range(1, 1000))
+        lines.append('  %   测试\n')
+        lines.append('  %   再次测试！\n')
+        lines.append('  %   done\n')
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        annots = todotex.scan_tex_doc(lines, True, p)
+        assert len(annots) == 1
+        assert annots[0].ln == 1
+        assert annots[0].msg == (' '.join(map(str, range(1000))) +
+                                 ' 测试再次测试！done')
+
+    def test_many_lines_cont_empty_lines_between(self):
+        lines = [
+            'test test test % todo\n',
+            '  %        \n',
+            '  %   message1\n',
+            '  %  \n',
+            '  %   message2\n',
+        ]
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        annots = todotex.scan_tex_doc(lines, True, p)
+        assert len(annots) == 1
+        assert annots[0].msg == 'message1 message2'
+
+
+class TestIterScanTexDoc:
+    @staticmethod
+    def _unbounded_doc():
+        yield 'test % todo message\n'
+        yield '   %   continued\n'
+        yield 'no more\n'
+        while True:
+            yield 'text\n'
+
+    def test_yield_before_exhausted(self):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        annots = todotex.iter_scan_tex_doc(self._unbounded_doc(), False, p)
+        assert next(annots) == todotex.TexAnnotation(1, 1, 'todo', 'message')
+        annots = todotex.iter_scan_tex_doc(self._unbounded_doc(), True, p)
+        assert next(annots) == todotex.TexAnnotation(1, 1, 'todo',
+                                                     'message continued')
+
+    def test_last_line_continued(self):
+        lines = [
+            'test % todo message\n',
+            '   %   continued',
+        ]
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        annots = list(todotex.iter_scan_tex_doc(lines, True, p))
+        assert annots == [
+            todotex.TexAnnotation(1, 1, 'todo', 'message continued')
+        ]
+
+
+class TestScanTexText:
+    # the lines of ``TestKeyMatcher``, and some with no literal prefix
+    lines = [
+        '',
+        'no comment',
+        '% todo',
+        '%todo: message',
+        'a \\% todo escaped',
+        'a \\%% todo escaped percent sign',
+        '%% todo',
+        '%%%',
+        '\t%\t question solved  x',
+        '% question solvedx',
+        '% todo\x0b no match for \\S',
+        '% continue..... x',
+        '% continue... % todo x',
+        '% nothing % todo x',
+        '% continue.. % tod % todo',
+        '% to% todo',
+        '% xxx later',
+        '% xxxxx',
+    ]
+
+    @pytest.mark.parametrize('todo', [
+        {
+            'todo': 'TODO',
+            'to': 'TODO',
+            r'continue ?\.{3,}': 'TODO',
+            'question': 'QUESTION',
+        },
+        {
+            'todo': 'TODO',
+            '(xx)+': 'TODO',
+        },
+        {},
+    ])
+    def test_same_as_line_based(self, todo):
+        p = todotex.Patterns(
+            config.KeywordsConfig(todo, {
+                'question solved': 'SOLVED',
+                'do': 'DONE',
+            }))
+        rng = random.Random(0)
+        for _ in range(50):
+            doc = [
+                rng.choice(self.lines) + '\n'
+                for _ in range(rng.randrange(20))
+            ]
+            if doc and rng.random() < 0.5:
+                doc[-1] = doc[-1].rstrip('\n')
+            text = ''.join(doc)
+            assert list(todotex.iter_scan_tex_text(
+                text, p)) == todotex.scan_tex_doc(doc, False, p), text
+
+    def test_continuation(self):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        text = '% todo message\n%   continued\n'
+        assert todotex.scan_tex_text(text, True, p) == [
+            todotex.TexAnnotation(1, 1, 'todo', 'message continued')
+        ]
+        assert todotex.scan_tex_text(text, False, p) == [
+            todotex.TexAnnotation(1, 1, 'todo', 'message')
+        ]
+
+
+class TestCountTexText:
+    lines = TestScanTexText.lines + [
+        '%  continued',
+        '%     todo continued or not',
+        '  %\ttodo indented continuation',
+        '%',
+    ]
+
+    @pytest.mark.parametrize('todo', [
+        {
+            'todo': 'TODO',
+            'to': 'TODO',
+            r'continue ?\.{3,}': 'TODO',
+            'question': 'QUESTION',
+        },
+        {
+            'todo': 'TODO',
+            '(xx)+': 'TODO',
+        },
+        {},
+    ])
+    @pytest.mark.parametrize('allow_continuation', [False, True])
+    def test_same_as_scan(self, todo, allow_continuation):
+        p = todotex.Patterns(
+            config.KeywordsConfig(todo, {
+                'question solved': 'SOLVED',
+                'do': 'DONE',
+            }))
+        rng = random.Random(0)
+        for _ in range(50):
+            doc = [
+                rng.choice(self.lines) + '\n'
+                for _ in range(rng.randrange(20))
+            ]
+            if doc and rng.random() < 0.5:
+                doc[-1] = doc[-1].rstrip('\n')
+            text = ''.join(doc)
+            annots = todotex.scan_tex_text(text, allow_continuation, p)
+            assert todotex.count_tex_text(
+                text, allow_continuation,
+                p) == collections.Counter(a.key for a in annots), text
+
+    def test_no_msg(self):
+        matcher = todotex.KeyMatcher(['todo', r'continue ?\.{3,}'])
+        assert matcher.search('% todo: x', False) == todotex.KeyMatch(
+            ' ', 'todo', None)
+        assert matcher.search('% continue.... x', False) == todotex.KeyMatch(
+            ' ', 'continue....', None)
+        assert matcher.search('% todo\x0b x', False) is None
+
+    def test_key_texts_bounded(self):
+        matcher = todotex.KeyMatcher(['todo', r'continue ?\.{3,}'])
+        first = matcher.search('% continue... x').key
+        for n in range(3, 3 + 2 * todotex._MAX_KEY_TEXTS):
+            key = 'continue' + '.' * n
+            assert matcher.search(f'% {key} x').key == key
+        assert len(matcher._key_texts) == todotex._MAX_KEY_TEXTS
+        # still shared once full
+        assert matcher.search('% continue... y').key is first
+
+    @pytest.mark.parametrize('jobs, pool', [(1, 'process'), (3, 'thread'),
+                                            (3, 'process')])
+    def test_files(self, tex_tree, jobs, pool):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        texfiles = list(todotex.walk_tex_files([tex_tree], True))
+        profile = todotex.ScanProfile()
+        counts = todotex.iter_count_tex_files(texfiles, p, False, 'utf-8',
+                                              jobs, pool,
+                                              todotex.ScanStats(profile))
+        annots = todotex.iter_scan_tex_files(texfiles, p, False, 'utf-8')
+        expected = [(path, {'todo': len(file_annots)})
+                    for path, file_annots in annots]
+        assert list(counts) == expected
+        assert profile.phases['scan'].annots == 30
+
+
+class TestScanFsForTex:
+    def test_recursive(self, tex_tree):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        annots = todotex.scan_fs_for_tex([tex_tree], p, True, False, 'utf-8')
+        assert sorted(annots) == sorted(
+            tex_tree / f'ch{i}' / f'sec{j}.tex' for i in range(3)
+            for j in range(1, 5))
+        assert annots[tex_tree / 'ch1' / 'sec3.tex'][2].msg == 'ch1 sec3 item2'
+
+    def test_jobs_same_order(self, tex_tree):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        serial = todotex.scan_fs_for_tex([tex_tree], p, True, False, 'utf-8')
+        for pool in ['thread', 'process']:
+            parallel = todotex.scan_fs_for_tex([tex_tree], p, True, False,
+                                               'utf-8', 3, pool)
+            assert list(parallel.items()) == list(serial.items())
+
+    def test_jobs_streamed(self, tex_tree):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        texfiles = list(todotex.walk_tex_files([tex_tree], True))
+        consumed = []
+
+        def feed():
+            for path in texfiles:
+                consumed.append(path)
+                yield path
+
+        annots = todotex.iter_scan_tex_files(feed(), p, False, 'utf-8', 2,
+                                             'thread')
+        first = next(annots)
+        # only a bounded window of paths is read ahead of the results
+        assert len(consumed) < len(texfiles)
+        assert [first] + list(annots) == list(
+            todotex.iter_scan_tex_files(texfiles, p, False, 'utf-8'))
+
+    def test_prefilter_same_result(self, tex_tree, monkeypatch):
+        (tex_tree / 'none.tex').write_text('% nothing\n')
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        stats = todotex.ScanStats()
+        annots = todotex.scan_fs_for_tex([tex_tree], p, True, False, 'utf-8',
+                                         stats=stats)
+        assert stats.files == 16
+        # 'none.tex', and 'sec0.tex' under each chapter
+        assert stats.prefiltered == 4
+        monkeypatch.setattr(p, 'prefilter', lambda _ec: None)
+        stats = todotex.ScanStats()
+        assert list(
+            todotex.scan_fs_for_tex([tex_tree], p, True, False, 'utf-8',
+                                    stats=stats).items()) == list(
+                                        annots.items())
+        assert stats.prefiltered == 0
+
+    def test_newlines_translated(self, tmp_path):
+        (tmp_path / 'a.tex').write_bytes(b'% todo x\r\n\r% todo y\r')
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        for allow_continuation in [False, True]:
+            annots = todotex.scan_fs_for_tex([tmp_path], p, True,
+                                             allow_continuation, 'utf-8')
+            assert annots[tmp_path / 'a.tex'] == [
+                todotex.TexAnnotation(1, 1, 'todo', 'x'),
+                todotex.TexAnnotation(3, 1, 'todo', 'y'),
+            ]
+
+
+class TestIterPathList:
+    def test_newline(self):
+        infile = io.BytesIO(b'a.tex\r\n\nb c.tex\n\xe4.tex')
+        assert list(todotex.iter_path_list(infile)) == [
+            Path('a.tex'),
+            Path('b c.tex'),
+            Path(os.fsdecode(b'\xe4.tex')),
+        ]
+
+    def test_null(self):
+        infile = io.BytesIO(b'a\nb.tex\0\0c.tex\r\0')
+        assert list(todotex.iter_path_list(infile, True)) == [
+            Path('a\nb.tex'),
+            Path('c.tex\r'),
+        ]
+
+    def test_split_across_blocks(self):
+        names = [f'dir{i}/sec{i}.tex' for i in range(100)]
+        infile = io.BytesIO('\0'.join(names).encode('ascii'))
+        paths = todotex.iter_path_list(infile, True, bufsize=7)
+        assert list(paths) == list(map(Path, names))
+
+
+class TestScanProfile:
+    @pytest.mark.parametrize('jobs, pool', [(1, 'process'), (3, 'thread'),
+                                            (3, 'process')])
+    def test_counts(self, tex_tree, jobs, pool):
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        profile = todotex.ScanProfile(top=3)
+        stats = todotex.ScanStats(profile)
+        annots = todotex.scan_fs_for_tex([tex_tree], p, True, False, 'utf-8',
+                                         jobs, pool, stats=stats)
+        phases = profile.phases
+        assert phases['read'].files == phases['scan'].files == 15
+        assert phases['read'].bytes == sum(
+            path.stat().st_size for path in tex_tree.rglob('*.tex'))
+        # 'sec0.tex' under each chapter is skipped by the prefilter
+        assert phases['decode'].files == 12
+        assert phases['scan'].lines == 30
+        assert phases['scan'].annots == sum(map(len, annots.values()))
+        slowest = profile.slowest()
+        assert len(slowest) == 3
+        assert [fp.seconds for _, fp in slowest] == sorted(
+            (fp.seconds for _, fp in slowest), reverse=True)
+
+    def test_hooks(self, tex_tree):
+
+        class Recorder(todotex.ScanProfile):
+            def __init__(self):
+                super().__init__()
+                self.paths = []
+
+            def add_file(self, path, fp):
+                super().add_file(path, fp)
+                self.paths.append(path)
+
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        profile = Recorder()
+        texfiles = list(todotex.walk_tex_files([tex_tree], True))
+        list(
+            todotex.iter_scan_tex_files(profile.timed('walk', texfiles),
+                                        p,
+                                        False,
+                                        'utf-8',
+                                        stats=todotex.ScanStats(profile)))
+        assert profile.paths == texfiles
+        assert profile.phases['walk'].files == 15
+
+    def test_time_consumer(self):
+        profile = todotex.ScanProfile()
+        shown = []
+        profile.time_consumer('show', iter([('a', [1, 2]), ('b', [3])]),
+                              shown.extend)
+        assert shown == [('a', [1, 2]), ('b', [3])]
+        assert profile.phases['show'].files == 2
+        assert profile.phases['show'].annots == 3
+
+
+class TestEncodingDetector:
+    @pytest.mark.parametrize('text, encoding, expected', [
+        ('% todo 中文\n', 'utf-8', 'utf-8'),
+        ('% todo 中文\n', 'utf-8-sig', 'utf-8-sig'),
+        ('% todo 中文\n', 'utf-16', 'utf-16'),
+        ('% todo 中文\n', 'utf-32', 'utf-32'),
+        ('% todo\n', 'ascii', 'utf-8'),
+    ])
+    def test_cheap_paths(self, text, encoding, expected, monkeypatch):
+        # chardet should not be needed
+        monkeypatch.setitem(sys.modules, 'chardet', None)
+        buf = text.encode(encoding)
+        detector = todotex.EncodingDetector()
+        assert detector.detect_encoding(buf) == expected
+        assert buf.decode(expected) == text
+
+    def test_fallback(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'chardet', None)
+        monkeypatch.setattr('locale.getpreferredencoding',
+                            lambda _do_setlocale: 'latin-1')
+        detector = todotex.EncodingDetector()
+        assert detector.detect_encoding('% todo café\n'.encode(
+            'latin-1')) == 'latin-1'
+
+    def test_scan(self, tmp_path):
+        (tmp_path / 'a.tex').write_bytes('% todo 中文\n'.encode('utf-16'))
+        (tmp_path / 'b.tex').write_bytes('% todo 中文\n'.encode('utf-8-sig'))
+        p = todotex.Patterns(config.KeywordsConfig({'todo': 'TODO'}, {}))
+        for jobs in [1, 2]:
+            annots = todotex.scan_fs_for_tex([tmp_path], p, False, False,
+                                             todotex.EncodingDetector(), jobs)
+            assert [a[0].msg for a in annots.values()] == ['中文', '中文']
+
+
+def _os_walk_tex_files(top):
+    for root, _, files in os.walk(top):
+        for name in files:
+            child = Path(root) / name
+            if child.suffix == '.tex':
+                yield child
+
+
+class TestWalkTexFiles:
+    def test_same_order_as_os_walk(self, tex_tree):
+        (tex_tree / 'ch1' / 'deeper').mkdir()
+        (tex_tree / 'ch1' / 'deeper' / 'x.tex').write_text('')
+        (tex_tree / 'top.tex').write_text('')
+        assert list(todotex.walk_tex_files([tex_tree], True)) == list(
+            _os_walk_tex_files(tex_tree))
+        assert list(todotex.walk_tex_files([tex_tree], False)) == [
+            tex_tree / 'top.tex'
+        ]
+
+    def test_include_exclude(self, tex_tree):
+
+        def walk(include=(), exclude=()):
+            return sorted(
+                path.relative_to(tex_tree).as_posix()
+                for path in todotex.walk_tex_files([tex_tree], True, include,
+                                                   exclude))
+
+        assert walk(exclude=['ch1', 'sec[0-3].tex']) == [
+            'ch0/sec4.tex',
+            'ch2/sec4.tex',
+        ]
+        assert walk(include=['sec4.tex'], exclude=['ch2/']) == [
+            'ch0/sec4.tex',
+            'ch1/sec4.tex',
+        ]
+        assert walk(include=['ch1/sec[34].tex']) == [
+            'ch1/sec3.tex',
+            'ch1/sec4.tex',
+        ]
+
+    def test_symlink_loop(self, tmp_path):
+        (tmp_path / 'a').mkdir()
+        (tmp_path / 'a' / 'x.tex').write_text('')
+        try:
+            (tmp_path / 'a' / 'loop').symlink_to(tmp_path, True)
+        except OSError:
+            pytest.skip('symbolic links not supported')
+        (tmp_path / 'b').symlink_to(tmp_path / 'a', True)
+        assert list(todotex.walk_tex_files([tmp_path], True)) == [
+            tmp_path / 'a' / 'x.tex'
+        ]
+        # either 'a' or 'b' is visited, depending on the listing order
+        texfiles = list(
+            todotex.walk_tex_files([tmp_path], True, follow_symlinks=True))
+        assert len(texfiles) == 1
+        assert texfiles[0].name == 'x.tex'
@@ -0,0 +1,187 @@
+import os
+import sys
+
+import pytest
+
+from todotex import todotex
+from todotex import watch
+
+
+def _touch(path, text):
+    path.write_text(text)
+    # make sure the change is visible to the polling watcher even on file
+    # systems of coarse timestamp resolution
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+class TestWatcher:
+    @pytest.mark.parametrize('kind', ['polling', 'inotify'])
+    def test_changes(self, tmp_path, kind):
+        if kind == 'inotify' and not sys.platform.startswith('linux'):
+            pytest.skip('inotify is only available on Linux')
+        (tmp_path / 'a.tex').write_text('')
+        if kind == 'polling':
+            w = watch.PollingWatcher([tmp_path], True, 0.01)
+        else:
+            w = watch.InotifyWatcher([tmp_path], True)
+        try:
+            assert not w.wait(0.05)
+            _touch(tmp_path / 'a.tex', '% todo x\n')
+            assert tmp_path / 'a.tex' in w.wait(1)
+            (tmp_path / 'sub').mkdir()
+            if kind == 'inotify':
+                assert tmp_path / 'sub' in w.wait(1)
+            _touch(tmp_path / 'sub' / 'b.tex', '% todo y\n')
+            changed = w.wait(1)
+            while not changed:
+                changed = w.wait(1)
+            assert tmp_path / 'sub' / 'b.tex' in changed
+        finally:
+            w.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'),
+                        reason='inotify is only available on Linux')
+    @pytest.mark.parametrize('follow_symlinks', [False, True])
+    def test_inotify_prunes_like_walk(self, tmp_path, follow_symlinks):
+        for d in ['src/ch', 'build/out', 'src/build', 'other']:
+            (tmp_path / d).mkdir(parents=True)
+        (tmp_path / 'src' / 'link').symlink_to(tmp_path / 'other')
+        # a cycle, visited once if followed
+        (tmp_path / 'other' / 'up').symlink_to(tmp_path / 'src')
+        w = watch.InotifyWatcher([tmp_path / 'src'],
+                                 True,
+                                 exclude=['build'],
+                                 follow_symlinks=follow_symlinks)
+        try:
+            expected = {tmp_path / 'src', tmp_path / 'src' / 'ch'}
+            if follow_symlinks:
+                expected.add(tmp_path / 'src' / 'link')
+            assert set(w._dirs.values()) == expected
+
+            # new directories are watched only if walked too
+            (tmp_path / 'src' / 'ch' / 'build').mkdir()
+            (tmp_path / 'src' / 'ch' / 'sec').mkdir()
+            changed = w.wait(1)
+            while tmp_path / 'src' / 'ch' / 'sec' not in changed:
+                changed |= w.wait(1)
+            expected.add(tmp_path / 'src' / 'ch' / 'sec')
+            assert set(w._dirs.values()) == expected
+        finally:
+            w.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'),
+                        reason='inotify is only available on Linux')
+    def test_inotify_reports_tex_files_only(self, tmp_path):
+        (tmp_path / 'ch').mkdir()
+        w = watch.InotifyWatcher([tmp_path], True, include=['a*'])
+        try:
+            # e.g. the outputs of a LaTeX build, and TeX files not included
+            for name in ['a.aux', 'a.log', 'a.pdf', 'b.tex']:
+                (tmp_path / name).write_text('x')
+            assert not w.wait(0.1)
+            (tmp_path / 'ch' / 'a.tex').write_text('% todo x\n')
+            (tmp_path / 'sec').mkdir()
+            changed = w.wait(1)
+            while tmp_path / 'sec' not in changed:
+                changed |= w.wait(1)
+            assert changed == {tmp_path / 'ch' / 'a.tex', tmp_path / 'sec'}
+        finally:
+            w.close()
+
+
+class TestIterWatch:
+    def test_rescan_only_changed(self, tmp_path, patterns):
+        for name in ['a', 'b', 'c']:
+            (tmp_path / f'{name}.tex').write_text(f'% todo {name}\n')
+        stats = todotex.ScanStats()
+        results = watch.iter_watch([tmp_path],
+                                   patterns,
+                                   False,
+                                   False,
+                                   'utf-8',
+                                   debounce=0.05,
+                                   poll_interval=0.01,
+                                   stats=stats)
+        try:
+            annots = next(results)
+            assert sorted(annots) == [tmp_path / f'{name}.tex'
+                                      for name in ['a', 'b', 'c']]
+            assert stats.files == 3
+
+            _touch(tmp_path / 'b.tex', '% todo bb\n')
+            annots = next(results)
+            assert stats.files == 4
+            assert annots[tmp_path / 'b.tex'][0].msg == 'bb'
+
+            (tmp_path / 'c.tex').unlink()
+            annots = next(results)
+            assert stats.files == 4
+            assert sorted(annots) == [tmp_path / 'a.tex', tmp_path / 'b.tex']
+        finally:
+            results.close()
+
+    def test_unreadable_file(self, tmp_path, patterns, capsys):
+        (tmp_path / 'a.tex').write_text('% todo a\n')
+        (tmp_path / 'b.tex').write_bytes(b'% todo \xff\n')
+        results = watch.iter_watch([tmp_path],
+                                   patterns,
+                                   False,
+                                   False,
+                                   'utf-8',
+                                   debounce=0.05,
+                                   poll_interval=0.01)
+        try:
+            annots = next(results)
+            assert list(annots) == [tmp_path / 'a.tex']
+            assert f'{tmp_path / "b.tex"}: ' in capsys.readouterr().err
+
+            # still watched, and scanned again once fixed
+            _touch(tmp_path / 'b.tex', '% todo b\n')
+            annots = next(results)
+            assert sorted(annots) == [tmp_path / 'a.tex', tmp_path / 'b.tex']
+        finally:
+            results.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'),
+                        reason='inotify is only available on Linux')
+    def test_no_walk_on_tex_changes(self, tmp_path, patterns, monkeypatch):
+        (tmp_path / 'a.tex').write_text('% todo a\n')
+        (tmp_path / 'b.tex').write_text('% todo b\n')
+        walked = []
+
+        def walk_tex_files(*args, **kwargs):
+            walked.append(args)
+            return todotex.walk_tex_files(*args, **kwargs)
+
+        monkeypatch.setattr(watch, 'walk_tex_files', walk_tex_files)
+        stats = todotex.ScanStats()
+        results = watch.iter_watch([tmp_path],
+                                   patterns,
+                                   True,
+                                   False,
+                                   'utf-8',
+                                   debounce=0.05,
+                                   stats=stats)
+        try:
+            assert len(next(results)) == 2
+            _touch(tmp_path / 'b.tex', '% todo bb\n')
+            (tmp_path / 'c.tex').write_text('% todo c\n')
+            annots = next(results)
+            while tmp_path / 'c.tex' not in annots:
+                annots = next(results)
+            assert [a.msg for path in sorted(annots)
+                    for a in annots[path]] == ['a', 'bb', 'c']
+            # only the changed TeX files scanned, without walking again
+            assert len(walked) == 1
+            assert stats.files == 4
+
+            (tmp_path / 'sub').mkdir()
+            (tmp_path / 'sub' / 'd.tex').write_text('% todo d\n')
+            annots = next(results)
+            while tmp_path / 'sub' / 'd.tex' not in annots:
+                annots = next(results)
+            # walked again as the subdirectory is created
+            assert len(walked) > 1
+        finally:
+            results.close()
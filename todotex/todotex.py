@@ -1,7 +1,11 @@
-import dataclasses
+import codecs
+import importlib
+import io
 import itertools
 import os
 import re
+import sys
+import time
 from pathlib import Path
 import collections
 import typing as ty
@@ -9,96 +13,1574 @@ import typing as ty
 from todotex.config import KeywordsConfig
 
 
+class KeyMatch(ty.NamedTuple):
+    pfx_space: str
+    key: str
+    msg: ty.Optional[str]
+
+
+class KeyMatcher:
+    """
+    Search a line for the first todo/done key in a comment, the same way as
+    ``Patterns.key`` does, except that literal keys are looked up in a trie
+    at each comment start, so that the cost per line doesn't grow with the
+    number of keys. The other keys, e.g. ``continue ?\\.{3,}``, are matched
+    by a fallback regular expression.
+    """
+    def __init__(self, keys: ty.Sequence[str]) -> None:
+        """
+        :param keys: the keys, the former of which take precedence
+        """
+        # an empty alternation matches the empty string
+        keys = keys or ['']
+        self._keys = list(keys)
+        # the texts matched by the non-literal keys, so that the annotations
+        # share rather than copy them, at most ``_MAX_KEY_TEXTS``
+        self._key_texts: ty.Dict[str, str] = {}
+        # map characters to child nodes, and ``None`` to the key index
+        self._trie: ty.Dict[ty.Optional[str], ty.Any] = {}
+        fallback = []
+        for i, key in enumerate(keys):
+            if (key and key[0] not in ' \t'
+                    and _REGEX_SPECIAL.isdisjoint(key)):
+                node = self._trie
+                for c in key:
+                    node = node.setdefault(c, {})
+                node.setdefault(None, i)
+            else:
+                fallback.append((i, key))
+        self._tail = re.compile(r'[ \t]*:?[ \t]*(?P<msg>\S.*)?$')
+        # the same as ``_tail`` matches, without reading the message
+        self._key_tail = re.compile(r'[ \t]*:?[ \t]*(?:\S|$)')
+        self._fallback_groups = [f'_k{i}' for i, _ in fallback]
+        self._fallback_min_index = min((i for i, _ in fallback),
+                                       default=len(keys))
+        self._fallback = None
+        self._key_fallback = None
+        if fallback:
+            fallback_key = (r'%(?P<pfx_space>[ \t]*)(?P<key>' + '|'.join(
+                f'(?P<_k{i}>{key})' for i, key in fallback) + ')')
+            self._fallback = re.compile(fallback_key + self._tail.pattern)
+            self._key_fallback = re.compile(fallback_key +
+                                            self._key_tail.pattern)
+
+    def search(self, line: str, msg: bool = True) -> ty.Optional[KeyMatch]:
+        """
+        :param line: a line without the trailing newline
+        :param msg: whether to capture the message; if not, the ``msg`` of
+               the match is ``None``, and the rest of the line is not read
+        :return: the match, or ``None`` if not found
+        """
+        pos = line.find('%')
+        if pos == 0 and line.startswith('%%'):
+            # ``([^\\]|^)%`` tries the second '%' before the first one
+            matched = (self._match_at(line, 1, msg)
+                       or self._match_at(line, 0, msg))
+            if matched:
+                return matched
+            pos = line.find('%', 2)
+        while pos >= 0:
+            if pos == 0 or line[pos - 1] != '\\':
+                matched = self._match_at(line, pos, msg)
+                if matched:
+                    return matched
+            pos = line.find('%', pos + 1)
+        return None
+
+    def _match_at(
+        self,
+        line: str,
+        pos: int,
+        msg: bool = True,
+    ) -> ty.Optional[KeyMatch]:
+        n = len(line)
+        key_start = pos + 1
+        while key_start < n and line[key_start] in ' \t':
+            key_start += 1
+
+        # the literal keys that match, by their precedence
+        candidates = []
+        node = self._trie
+        for key_end in range(key_start, n):
+            node = node.get(line[key_end])
+            if node is None:
+                break
+            if None in node:
+                candidates.append((node[None], key_end + 1))
+        candidates.sort()
+        literal = None
+        tail_match = self._tail.match if msg else self._key_tail.match
+        for i, key_end in candidates:
+            tail = tail_match(line, key_end)
+            if tail:
+                literal = i, key_end, tail
+                break
+
+        if self._fallback and (literal is None
+                               or literal[0] > self._fallback_min_index):
+            fallback = self._fallback if msg else self._key_fallback
+            matched = fallback.match(line, pos)
+            # the literal keys match only after the longest prefix space,
+            # which is tried first
+            if matched and (literal is None or
+                            (matched.end('pfx_space') == key_start and
+                             self._fallback_index(matched) < literal[0])):
+                key = matched.group('key')
+                if len(self._key_texts) < _MAX_KEY_TEXTS:
+                    key = self._key_texts.setdefault(key, key)
+                else:
+                    key = self._key_texts.get(key, key)
+                return KeyMatch(matched.group('pfx_space'), key,
+                                matched.group('msg') if msg else None)
+        if literal is None:
+            return None
+        i, _, tail = literal
+        # the very key string rather than a copy sliced from the line
+        return KeyMatch(line[pos + 1:key_start], self._keys[i],
+                        tail.group('msg') if msg else None)
+
+    def _fallback_index(self, matched: ty.Match[str]) -> int:
+        return next(
+            int(name[2:]) for name in self._fallback_groups
+            if matched.group(name) is not None)
+
+
+class _lazy_attribute:
+    """
+    Compute the attribute on first access and store it in the instance, like
+    ``functools.cached_property``, which is not available in Python 3.7.
+    """
+    def __init__(self, func) -> None:
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.name] = self.func(obj)
+        return value
+
+
 class Patterns:
+    """
+    The patterns are compiled lazily on first use, since not all of them are
+    needed in every run, and each costs startup time.
+    """
     def __init__(self, cfg: KeywordsConfig):
-        # the pattern matching the start of todo key
-        self.key = re.compile(r'([^\\]|^)%(?P<pfx_space>[ \t]*)(?P<key>'
-                              # note the order
-                              + '|'.join(itertools.chain(cfg.done, cfg.todo))
-                              + r')[ \t]*:?[ \t]*(?P<msg>\S.*)?$')
-        # the pattern matching the continual message
-        self.cont = re.compile(r'^[ \t]*%(?P<pfx_space>[ \t]*)(?P<msg>\S.*)?$')
-        # the Chinese characters
-        self.hans = re.compile(r'[\u4e00-\u9fa5\u3040-\u30ff]')
-        # the Chinese punctuations
-        self.hans_punc = re.compile(
+        # note the order
+        self._keys = list(itertools.chain(cfg.done, cfg.todo))
+        self._prefilters: ty.Dict[str, ty.Optional[ty.Pattern[bytes]]] = {}
+
+    @_lazy_attribute
+    def key(self) -> ty.Pattern[str]:
+        """The pattern matching the start of todo key."""
+        return re.compile(r'([^\\]|^)%(?P<pfx_space>[ \t]*)(?P<key>' +
+                          '|'.join(self._keys) +
+                          r')[ \t]*:?[ \t]*(?P<msg>\S.*)?$')
+
+    @_lazy_attribute
+    def key_matcher(self) -> KeyMatcher:
+        """The faster equivalent of ``key``."""
+        return KeyMatcher(self._keys)
+
+    @_lazy_attribute
+    def cont(self) -> ty.Pattern[str]:
+        """The pattern matching the continual message."""
+        return re.compile(r'^[ \t]*%(?P<pfx_space>[ \t]*)(?P<msg>\S.*)?$')
+
+    @_lazy_attribute
+    def cont_pfx(self) -> ty.Pattern[str]:
+        """
+        The pattern matching where ``cont`` does, up to the prefix space, to
+        be matched at the start of a line.
+        """
+        return re.compile(r'[ \t]*%(?P<pfx_space>[ \t]*)(?:\S|$)')
+
+    @_lazy_attribute
+    def hans(self) -> ty.Pattern[str]:
+        """The Chinese characters."""
+        return re.compile(r'[\u4e00-\u9fa5\u3040-\u30ff]')
+
+    @_lazy_attribute
+    def hans_punc(self) -> ty.Pattern[str]:
+        """The Chinese punctuations."""
+        return re.compile(
             r'[\u3002\uff1f\uff01\uff0c\u3001\uff1b'
             r'\uff1a\u201c\u201d\u2018\u2019\uff08\uff09\u300a\u300b\u3008'
             r'\u3009\u3010\u3011\u300e\u300f\u300c\u300d\ufe43\ufe44\u3014'
             r'\u3015\u2026\u2014\uff5e\ufe4f\uffe5]')
 
+    @_lazy_attribute
+    def _key_prefixes(self) -> ty.Optional[ty.List[str]]:
+        """The literal prefixes of the keys, or None if some key has none."""
+        return _literal_prefixes(self._keys)
+
+    @_lazy_attribute
+    def candidate(self) -> ty.Pattern[str]:
+        """
+        The pattern found in every line ``key`` matches, to locate such lines
+        in a whole text at once.
+        """
+        if self._key_prefixes is None:
+            return re.compile('%')
+        return re.compile(r'%[ \t]*(?:' +
+                          '|'.join(map(re.escape, self._key_prefixes)) + ')')
+
+    def prefilter(self, encoding: str) -> ty.Optional[ty.Pattern[bytes]]:
+        """
+        Get the pattern to search in the raw bytes of a TeX file encoded in
+        ``encoding``, such that ``key`` can't match any of its lines if the
+        pattern is not found.
+
+        :param encoding: the encoding of the TeX file
+        :return: the pattern, or ``None`` if no such pattern can be built
+        """
+        try:
+            return self._prefilters[encoding]
+        except KeyError:
+            pass
+        prefilter = None
+        body_ec = _body_encoding(encoding)
+        if (self._key_prefixes is not None
+                and _is_ascii_transparent(body_ec)):
+            try:
+                prefixes = [
+                    re.escape(pfx.encode(body_ec))
+                    for pfx in self._key_prefixes
+                ]
+            except UnicodeEncodeError:
+                pass
+            else:
+                prefilter = re.compile(rb'%[ \t]*(?:' + b'|'.join(prefixes) +
+                                       rb')')
+        self._prefilters[encoding] = prefilter
+        return prefilter
+
 
-@dataclasses.dataclass
-class TexAnnotation:
+# the characters that may make a key not a literal string
+_REGEX_SPECIAL = frozenset('\\.^$*+?{}[]|()')
+
+# the maximum number of texts matched by the non-literal keys that a
+# ``KeyMatcher`` shares, so that it doesn't grow forever in a long-running
+# process, e.g. the daemon, as ``continue ?\.{3,}`` matches ever new texts
+_MAX_KEY_TEXTS = 1024
+
+
+def _literal_prefixes(keys: ty.Iterable[str]) -> ty.Optional[ty.List[str]]:
+    """
+    Find for each key the longest literal string every match of it must begin
+    with.
+
+    :param keys: the keys, which may be regular expressions
+    :return: the prefixes, or ``None`` if it's empty for some key, or if there
+             is no key at all
+    """
+    prefixes = []
+    for key in keys:
+        if '|' in key:
+            return None
+        end = 0
+        while end < len(key) and key[end] not in _REGEX_SPECIAL:
+            end += 1
+        # the last character is optional, e.g. 'todos?'
+        if end < len(key) and key[end] in '*?{':
+            end -= 1
+        if end <= 0:
+            return None
+        prefixes.append(key[:end])
+    return prefixes or None
+
+
+def _body_encoding(encoding: str) -> str:
+    """
+    :return: the encoding of the text after any byte order mark ``encoding``
+             starts with
+    """
+    if encoding.lower().replace('_', '-') in ('utf-8-sig', 'utf8-sig'):
+        return 'utf-8'
+    return encoding
+
+
+def _is_ascii_transparent(encoding: str) -> bool:
+    """
+    Whether every ASCII character in text encoded in ``encoding`` is encoded
+    as the very same byte, regardless of context.
+    """
+    try:
+        name = codecs.lookup(encoding).name
+        if '%'.encode(encoding) != b'%':
+            return False
+    except (LookupError, UnicodeEncodeError):
+        return False
+    # stateful encodings
+    return not name.startswith(('utf-7', 'iso2022', 'hz'))
+
+
+class TexAnnotation(ty.NamedTuple):
+    """
+    An annotation found in a TeX file, with its line number.
+
+    A ``NamedTuple`` rather than a dataclass as in version 3.0, like
+    ``config.KeywordsConfig``.
+    """
     ln: int
     pfxlen: int
     key: str
     msg: str
 
 
-def scan_tex_doc(
+def iter_scan_tex_doc(
     doc: ty.Union[ty.Iterable[str], ty.TextIO],
     allow_continuation: bool,
     p: Patterns,
-) -> ty.List[TexAnnotation]:
+) -> ty.Iterator[TexAnnotation]:
     """
-    :param doc: an iterable of lines
-    :param allow_continuation: whether to allow message continuation
-    :param p: the patterns
-    :return: the annotations
+    Same as ``scan_tex_doc``, except that the annotations are yielded as soon
+    as they are complete, i.e. when the line is read if not
+    ``allow_continuation``, otherwise when the continuation ends.
     """
-    annotations = []
     if not allow_continuation:
         for ln, line in enumerate(doc, 1):
             line = line.rstrip('\n')
-            matched = p.key.search(line)
+            matched = p.key_matcher.search(line)
             if matched:
-                annotations.append(
-                    TexAnnotation(ln, len(matched.group('pfx_space')),
-                                  matched.group('key'), matched.group('msg')))
+                yield TexAnnotation(ln, len(matched.pfx_space), matched.key,
+                                    matched.msg)
     else:
-        continuing = False
+        # the annotation that may be continued on the next line
+        block: ty.Optional[_ContinuationBlock] = None
         for ln, line in enumerate(doc, 1):
             line = line.rstrip('\n')
-            if continuing:
-                if not annotations:
-                    continuing = False
-                else:
-                    prev_annot = annotations.pop()
-                    matched = p.cont.match(line)
-                    if (matched and len(matched.group('pfx_space')) >
-                            prev_annot.pfxlen):
-                        if not prev_annot.msg or not matched.group('msg'):
-                            msgsep = ''
-                        # handle Chinese and Chinese punctuation
-                        elif ((p.hans.match(prev_annot.msg[-1])
-                               and p.hans.match(matched.group('msg')[0])) or
-                              (p.hans_punc.match(prev_annot.msg[-1])
-                               or p.hans_punc.match(matched.group('msg')[0]))):
-                            msgsep = ''
-                        else:
-                            msgsep = ' '
-                        prev_annot_msg = prev_annot.msg or ''
-                        curr_annot_msg = matched.group('msg') or ''
-                        annotations.append(
-                            TexAnnotation(
-                                prev_annot.ln,
-                                prev_annot.pfxlen,
-                                prev_annot.key,
-                                f'{prev_annot_msg}{msgsep}{curr_annot_msg}',
-                            ))
-                    else:
-                        annotations.append(prev_annot)
-                        continuing = False
-            if not continuing:
-                matched = p.key.search(line)
-                if matched:
-                    annotations.append(
-                        TexAnnotation(ln, len(matched.group('pfx_space')),
-                                      matched.group('key'),
-                                      matched.group('msg')))
-                    continuing = True
-    return annotations
+            if block is not None:
+                matched = p.cont.match(line)
+                if matched and len(matched.group('pfx_space')) > block.pfxlen:
+                    block.extend(matched.group('msg'))
+                    continue
+                yield block.close()
+                block = None
+            matched = p.key_matcher.search(line)
+            if matched:
+                block = _ContinuationBlock(
+                    TexAnnotation(ln, len(matched.pfx_space), matched.key,
+                                  matched.msg), p)
+        if block is not None:
+            yield block.close()
+
+
+class _ContinuationBlock:
+    """
+    An annotation and its continuation lines so far. The message fragments
+    are collected and joined only once the block is closed, so that the cost
+    is linear in the length of the block.
+    """
+    def __init__(
+        self,
+        head: TexAnnotation,
+        p: Patterns,
+        max_len: int = None,
+    ) -> None:
+        """
+        :param head: the annotation on the first line of the block
+        :param p: the patterns
+        :param max_len: if not ``None``, the number of characters to truncate
+               the message of the whole block to
+        """
+        self._head = head
+        self.pfxlen = head.pfxlen
+        self._p = p
+        self._fragments: ty.List[str] = [head.msg] if head.msg else []
+        # the last character of the message so far, or '' if it's empty
+        self._last = head.msg[-1] if head.msg else ''
+        self._continued = False
+        self._max_len = max_len
+        # the length of the message so far, if ``max_len`` is given
+        self._len = len(head.msg) if max_len is not None and head.msg else 0
+
+    def extend(self, msg: ty.Optional[str]) -> None:
+        """
+        :param msg: the message on a continuation line
+        """
+        self._continued = True
+        if not msg:
+            return
+        if self._max_len is not None:
+            if self._len >= self._max_len:
+                return
+            self._len += len(msg) + 1
+        p = self._p
+        # handle Chinese and Chinese punctuation
+        if self._last and not ((p.hans.match(self._last)
+                                and p.hans.match(msg[0]))
+                               or p.hans_punc.match(self._last)
+                               or p.hans_punc.match(msg[0])):
+            self._fragments.append(' ')
+        self._fragments.append(msg)
+        self._last = msg[-1]
+
+    def close(self) -> TexAnnotation:
+        """
+        :return: the annotation with the message of the whole block
+        """
+        if not self._continued:
+            return self._head
+        msg = ''.join(self._fragments)
+        if self._max_len is not None:
+            msg = msg[:self._max_len]
+        return self._head._replace(msg=msg)
+
+
+def scan_tex_doc(
+    doc: ty.Union[ty.Iterable[str], ty.TextIO],
+    allow_continuation: bool,
+    p: Patterns,
+) -> ty.List[TexAnnotation]:
+    """
+    :param doc: an iterable of lines
+    :param allow_continuation: whether to allow message continuation
+    :param p: the patterns
+    :return: the annotations
+    """
+    return list(iter_scan_tex_doc(doc, allow_continuation, p))
+
+
+def iter_scan_tex_text(text: str, p: Patterns) -> ty.Iterator[TexAnnotation]:
+    """
+    Same as ``iter_scan_tex_doc`` without message continuation, but over the
+    whole text at once: the lines that may have an annotation are located by
+    searching ``p.candidate`` in the text, so that the other lines cost
+    nothing in Python, and the line numbers are then counted from the
+    newlines in between.
+
+    :param text: the text, with newlines translated to '\\n'
+    :param p: the patterns
+    :return: the annotations
+    """
+    key_search = p.key_matcher.search
+    # where the next line to scan starts
+    pos = 0
+    # the line number of the line starting at ``line_start``
+    ln = 1
+    line_start = 0
+    for matched in p.candidate.finditer(text):
+        cand_start = matched.start()
+        if cand_start < pos:
+            # on a line already scanned
+            continue
+        start = text.rfind('\n', 0, cand_start) + 1
+        end = text.find('\n', matched.end())
+        if end < 0:
+            end = len(text)
+        key_matched = key_search(text[start:end])
+        if key_matched:
+            ln += text.count('\n', line_start, start)
+            line_start = start
+            yield TexAnnotation(ln, len(key_matched.pfx_space),
+                                key_matched.key, key_matched.msg)
+        pos = end + 1
+
+
+def scan_tex_text(
+    text: str,
+    allow_continuation: bool,
+    p: Patterns,
+) -> ty.List[TexAnnotation]:
+    """
+    Same as ``scan_tex_doc``, but over the whole text of a TeX file, which
+    is scanned at once by ``iter_scan_tex_text`` if not
+    ``allow_continuation``.
+
+    :param text: the text, with newlines translated to '\\n'
+    """
+    if allow_continuation:
+        return scan_tex_doc(io.StringIO(text), True, p)
+    return list(iter_scan_tex_text(text, p))
+
+
+def count_tex_text(
+    text: str,
+    allow_continuation: bool,
+    p: Patterns,
+) -> ty.Dict[str, int]:
+    """
+    Count the annotations ``scan_tex_text`` finds by key, without building
+    them or reading their messages. As in ``iter_scan_tex_text``, only the
+    lines where ``p.candidate`` is found are searched for the keys; if
+    ``allow_continuation``, only the lines after an annotation are matched
+    as its continuation, to be skipped.
+
+    :param text: the text, with newlines translated to '\\n'
+    :param allow_continuation: whether to allow message continuation
+    :param p: the patterns
+    :return: the keys mapped to the number of their annotations
+    """
+    counts: ty.Dict[str, int] = {}
+    key_search = p.key_matcher.search
+    cont_match = p.cont_pfx.match
+    n = len(text)
+    # where the next line to scan starts
+    pos = 0
+    for matched in p.candidate.finditer(text):
+        cand_start = matched.start()
+        if cand_start < pos:
+            # on a line already scanned
+            continue
+        start = text.rfind('\n', 0, cand_start) + 1
+        end = text.find('\n', matched.end())
+        if end < 0:
+            end = n
+        pos = end + 1
+        key_matched = key_search(text[start:end], False)
+        if not key_matched:
+            continue
+        counts[key_matched.key] = counts.get(key_matched.key, 0) + 1
+        if allow_continuation:
+            pfxlen = len(key_matched.pfx_space)
+            while pos <= n:
+                end = text.find('\n', pos)
+                if end < 0:
+                    end = n
+                cont = cont_match(text, pos, end)
+                if not cont or len(cont.group('pfx_space')) <= pfxlen:
+                    break
+                pos = end + 1
+    return counts
+
+
+class _ModuleRef:
+    """
+    A picklable stand-in for a module such as ``chardet``, so that it can be
+    sent to worker processes; the module is re-imported on first use there.
+    """
+    def __init__(self, module) -> None:
+        self.name = module.__name__
+
+    def detect(self, buf: bytes):
+        return importlib.import_module(self.name).detect(buf)
+
+
+class EncodingDetector:
+    """
+    Detect the encoding of a TeX file from its content, cheaply in the common
+    cases: by the byte order mark if any, as UTF-8 if the content is valid
+    UTF-8, and only otherwise by ``chardet`` if installed, or else as the
+    preferred encoding of the locale.
+    """
+    # UTF-32 first, as the BOM of UTF-32-LE starts with that of UTF-16-LE
+    _BOMS = [
+        (codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    ]
+
+    def detect_encoding(self, buf: bytes) -> str:
+        """
+        :param buf: the whole content of the file
+        :return: the encoding
+        """
+        for bom, ec in self._BOMS:
+            if buf.startswith(bom):
+                return ec
+        try:
+            buf.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+        else:
+            return 'utf-8'
+        try:
+            # imported only when needed, to speed up startup
+            import chardet
+        except ImportError:
+            pass
+        else:
+            # sample the first 64 KiB for chardet
+            ec = chardet.detect(buf[:1024 * 64])['encoding']
+            if ec:
+                return ec
+        import locale
+        return locale.getpreferredencoding(False)
+
+
+def _is_tex_name(name: str) -> bool:
+    # same as ``Path(name).suffix == '.tex'``
+    return name.endswith('.tex') and name != '.tex'
+
+
+# the suffixes of the archives ``walk_tex_files`` treats as directories
+_ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                     '.tar.xz', '.txz', '.zip')
+
+
+def _is_archive_name(name: str) -> bool:
+    return name.endswith(_ARCHIVE_SUFFIXES)
+
+
+# the patterns to match names and relative paths against
+_Globs = ty.Tuple[ty.Optional[ty.Pattern[str]], ty.Optional[ty.Pattern[str]]]
+
+
+class TexArchive(ty.NamedTuple):
+    """
+    A tar or zip archive found by ``walk_tex_files``, whose TeX files are to
+    be scanned as if it were a directory, without extracting it.
+    """
+    path: Path
+    # whether to scan the TeX files in the subdirectories of the archive
+    recursive: bool
+    # the path of the archive relative to the directory being walked,
+    # followed by '!/', against which the globs with '/' are matched
+    reldir: str = ''
+    include_globs: ty.Optional[_Globs] = None
+    exclude_globs: ty.Optional[_Globs] = None
+
+    def member_path(self, relpath: str) -> Path:
+        """
+        :param relpath: the path of a TeX file relative to the archive
+        :return: the path to show for the TeX file, e.g.
+                 ``book.tar.gz!/ch/intro.tex``
+        """
+        return Path(f'{os.fspath(self.path)}!/{relpath}')
+
+
+def _compile_globs(globs: ty.Iterable[str]) -> _Globs:
+    """
+    :return: the pattern to match against the name of a file or directory,
+             from the globs without '/'; and the pattern to match against the
+             path relative to the directory being walked, from the others
+    """
+    # imported only when needed, to speed up startup
+    import fnmatch
+    name_globs, path_globs = [], []
+    for glob in globs:
+        if '/' in glob:
+            path_globs.append(fnmatch.translate(glob.strip('/')))
+        else:
+            name_globs.append(fnmatch.translate(glob))
+    return tuple(
+        re.compile('|'.join(regexes)) if regexes else None
+        for regexes in (name_globs, path_globs))
+
+
+def _match_globs(
+    globs: _Globs,
+    name: str,
+    relpath: str,
+) -> bool:
+    name_pattern, path_pattern = globs
+    return bool((name_pattern and name_pattern.match(name))
+                or (path_pattern and path_pattern.match(relpath)))
+
+
+def _match_walked(
+    parts: ty.Sequence[str],
+    reldir: str,
+    include_globs: ty.Optional[_Globs],
+    exclude_globs: ty.Optional[_Globs],
+) -> bool:
+    """
+    Whether a TeX file not found by walking, e.g. listed from an archive, is
+    to be yielded by ``walk_tex_files`` under the globs, as if the
+    directories matching ``exclude_globs`` were not descended into.
+
+    :param parts: the path of the TeX file relative to ``reldir``, split by
+           '/'
+    :param reldir: the path relative to the directory being walked that
+           ``parts`` is relative to, followed by '/' or '!/' unless empty
+    """
+    if exclude_globs:
+        relpath = reldir
+        for part in parts:
+            relpath += part
+            if _match_globs(exclude_globs, part, relpath):
+                return False
+            relpath += '/'
+    return not include_globs or _match_globs(include_globs, parts[-1],
+                                             reldir + '/'.join(parts))
+
+
+def walk_tex_files(
+    paths: ty.Iterable[Path],
+    recursive: bool,
+    include: ty.Sequence[str] = (),
+    exclude: ty.Sequence[str] = (),
+    follow_symlinks: bool = False,
+    archives: bool = False,
+) -> ty.Iterator[ty.Union[Path, TexArchive]]:
+    """
+    Find the TeX files, i.e. the regular files with suffix '.tex', in
+    ``paths``. Directories are walked top-down with ``os.scandir``, yielding
+    the TeX files in a directory before descending into its subdirectories,
+    in the order they are listed.
+
+    A glob in ``include`` or ``exclude`` is matched against the file or
+    directory name if it has no '/', otherwise against the path relative to
+    the directory in ``paths`` being walked. The files and directories in
+    ``paths`` are never excluded.
+
+    :param paths: the TeX files and directories to find TeX files in
+    :param recursive: whether to find TeX files in subdirectories
+    :param include: if not empty, find only the TeX files matching any of
+           these globs
+    :param exclude: skip the TeX files matching any of these globs, and
+           don't descend into the directories matching any of these globs
+    :param follow_symlinks: whether to descend into symbolic links to
+           directories; each directory is visited at most once, so that
+           symbolic link cycles are not followed forever
+    :param archives: whether to treat the tar and zip archives, e.g.
+           'book.tar.gz', in ``paths`` as directories, yielding a
+           ``TexArchive`` in place of each, to be scanned by
+           ``iter_scan_tex_files``; the globs are matched against the paths
+           in an archive as if it were a directory named e.g. 'book.tar.gz!'
+    :return: the TeX files, and the archives if ``archives``
+    """
+    include_globs = _compile_globs(include) if include else None
+    exclude_globs = _compile_globs(exclude) if exclude else None
+    for path in paths:
+        if path.is_file():
+            if path.suffix == '.tex':
+                yield path
+            elif archives and _is_archive_name(path.name):
+                yield TexArchive(path, recursive, '', include_globs,
+                                 exclude_globs)
+        elif path.is_dir():
+            yield from _walk_dir(path, recursive, include_globs, exclude_globs,
+                                 follow_symlinks, archives)
+
+
+def _descend_into(
+    entry: ty.Union[os.DirEntry, Path],
+    relpath: str,
+    exclude_globs: ty.Optional[_Globs],
+    follow_symlinks: bool,
+    visited: ty.Set[ty.Tuple[int, int]],
+) -> bool:
+    """
+    :param entry: a directory
+    :param relpath: the path of ``entry`` relative to the directory being
+           walked
+    :param visited: the device and inode numbers of the directories visited,
+           added to if ``follow_symlinks``
+    :return: whether ``walk_tex_files`` descends into ``entry``
+    """
+    if exclude_globs and _match_globs(exclude_globs, entry.name, relpath):
+        return False
+    if not follow_symlinks:
+        return not entry.is_symlink()
+    try:
+        st = entry.stat()
+    except OSError:
+        return False
+    if (st.st_dev, st.st_ino) in visited:
+        return False
+    visited.add((st.st_dev, st.st_ino))
+    return True
+
+
+def _walk_subdirs(
+    top: Path,
+    reldir: str,
+    exclude_globs: ty.Optional[_Globs],
+    follow_symlinks: bool,
+    visited: ty.Set[ty.Tuple[int, int]],
+) -> ty.Iterator[ty.Tuple[Path, str]]:
+    """
+    :param top: a directory that ``walk_tex_files`` descends into
+    :param reldir: the path of ``top`` relative to the directory being
+           walked, followed by '/' unless empty
+    :param visited: see ``_descend_into``
+    :return: ``top`` and the directories under it that ``walk_tex_files``
+             descends into recursively, along with their relative paths as
+             ``reldir``
+    """
+    stack = [(os.fspath(top), reldir)]
+    while stack:
+        dirpath, reldir = stack.pop()
+        yield Path(dirpath), reldir
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            relpath = reldir + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir and _descend_into(entry, relpath, exclude_globs,
+                                        follow_symlinks, visited):
+                stack.append((entry.path, relpath + '/'))
+
+
+def _walk_dir(
+    top: Path,
+    recursive: bool,
+    include_globs: ty.Optional[_Globs],
+    exclude_globs: ty.Optional[_Globs],
+    follow_symlinks: bool,
+    archives: bool,
+) -> ty.Iterator[ty.Union[Path, TexArchive]]:
+    visited: ty.Set[ty.Tuple[int, int]] = set()
+    if follow_symlinks:
+        st = os.stat(top)
+        visited.add((st.st_dev, st.st_ino))
+    # the directories and archives to visit, their paths relative to
+    # ``top``, and whether they are archives
+    stack = [(os.fspath(top), '', False)]
+    while stack:
+        dirpath, reldir, is_archive = stack.pop()
+        if is_archive:
+            yield TexArchive(Path(dirpath), True, reldir, include_globs,
+                             exclude_globs)
+            continue
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            if not reldir:
+                raise
+            # the same as ``os.walk``
+            continue
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            relpath = reldir + name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not recursive or not _descend_into(
+                        entry, relpath, exclude_globs, follow_symlinks,
+                        visited):
+                    continue
+                subdirs.append((entry.path, relpath + '/', False))
+            elif archives and recursive and _is_archive_name(name):
+                if exclude_globs and _match_globs(exclude_globs, name,
+                                                  relpath):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                # visited in the listing order among the subdirectories
+                subdirs.append((entry.path, relpath + '!/', True))
+            elif _is_tex_name(name):
+                if include_globs and not _match_globs(include_globs, name,
+                                                      relpath):
+                    continue
+                if exclude_globs and _match_globs(exclude_globs, name,
+                                                  relpath):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                yield Path(entry.path)
+        stack.extend(reversed(subdirs))
+
+
+def iter_path_list(
+    infile: ty.BinaryIO,
+    null: bool = False,
+    bufsize: int = 65536,
+) -> ty.Iterator[Path]:
+    """
+    Read the paths listed in ``infile``, e.g. by ``find -print0``, as they
+    are read, holding no more than a block and a path at a time. Empty
+    entries are skipped.
+
+    :param infile: the binary stream of the list
+    :param null: whether the paths are terminated by NUL rather than by
+           newline; if terminated by newline, a trailing carriage return of
+           each path is stripped
+    :param bufsize: the maximum number of bytes to read at a time
+    :return: the paths, decoded as ``os.fsdecode`` does
+    """
+    sep = b'\0' if null else b'\n'
+    # read what is available rather than wait for a whole block from a pipe
+    read = getattr(infile, 'read1', infile.read)
+    rest = b''
+    while True:
+        block = read(bufsize)
+        if not block:
+            break
+        entries = (rest + block).split(sep)
+        rest = entries.pop()
+        for entry in entries:
+            if not null:
+                entry = entry.rstrip(b'\r')
+            if entry:
+                yield Path(os.fsdecode(entry))
+    if not null:
+        rest = rest.rstrip(b'\r')
+    if rest:
+        yield Path(os.fsdecode(rest))
+
+
+def _read_tex_file(
+    path: Path,
+    chardet,
+    encoding: str = None,
+    stopwatch: '_Stopwatch' = None,
+) -> ty.Tuple[bytes, str]:
+    """
+    :param chardet: see ``iter_scan_tex_files``
+    :param encoding: if not ``None``, the encoding of the file already
+           detected, to use rather than ``chardet``
+    :param stopwatch: if not ``None``, where to time the reading and the
+           detection of the encoding
+    :return: the content of the TeX file, and its encoding
+    """
+    with open(path, 'rb') as infile:
+        buf = infile.read()
+    if stopwatch is not None:
+        stopwatch.lap('read')
+    ec = _detect_encoding(buf, chardet, encoding)
+    if stopwatch is not None:
+        stopwatch.lap('detect')
+    return buf, ec
+
+
+def _detect_encoding(buf: bytes, chardet, encoding: str = None) -> str:
+    """
+    :param chardet: see ``iter_scan_tex_files``
+    :param encoding: see ``_read_tex_file``
+    :return: the encoding of ``buf``
+    """
+    if encoding is not None:
+        return encoding
+    if isinstance(chardet, str):
+        return chardet
+    if isinstance(chardet, EncodingDetector):
+        return chardet.detect_encoding(buf)
+    # sample the first 64 KiB for chardet
+    return chardet.detect(buf[:1024 * 64])['encoding']
+
+
+# the TeX files of at least this many bytes are scanned in place by
+# ``todotex.chunked``, rather than read and decoded whole, if their encoding
+# allows
+_MMAP_MIN_SIZE = 64 * 1024 * 1024
+
+
+def _scan_tex_file(
+    path: Path,
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    encoding: str = None,
+    profiling: bool = False,
+    count: bool = False,
+) -> ty.Tuple[ty.Union[ty.List[TexAnnotation], ty.Dict[str, int]], bool, str,
+              ty.Optional['FileProfile']]:
+    """
+    :param encoding: see ``_read_tex_file``
+    :param profiling: whether to time the phases of scanning the file
+    :param count: whether to count the annotations by ``count_tex_text``
+           rather than to scan them
+    :return: the annotations, or their counts by key if ``count``, whether
+             the file was skipped by the prefilter of ``p``, the encoding of
+             the file, and its ``FileProfile`` if ``profiling`` else ``None``
+    """
+    stopwatch = _Stopwatch() if profiling else None
+    if os.stat(path).st_size >= _MMAP_MIN_SIZE:
+        # imported only when needed, to speed up startup
+        from todotex import chunked
+        scanned = chunked.scan_tex_file_mmap(path, p, allow_continuation,
+                                             chardet, encoding, stopwatch,
+                                             count)
+        if scanned is not None:
+            return scanned
+    buf, ec = _read_tex_file(path, chardet, encoding, stopwatch)
+    return _scan_tex_buf(buf, ec, p, allow_continuation, stopwatch, count)
+
+
+def _scan_tex_buf(
+    buf: bytes,
+    ec: str,
+    p: Patterns,
+    allow_continuation: bool,
+    stopwatch: ty.Optional['_Stopwatch'],
+    count: bool,
+) -> ty.Tuple[ty.Union[ty.List[TexAnnotation], ty.Dict[str, int]], bool, str,
+              ty.Optional['FileProfile']]:
+    """
+    Scan the content ``buf`` of a TeX file in encoding ``ec``. See
+    ``_scan_tex_file`` for the rest.
+    """
+    prefilter = p.prefilter(ec) if ec else None
+    if prefilter is not None and not prefilter.search(buf):
+        empty = {} if count else []
+        if stopwatch is not None:
+            stopwatch.lap('scan')
+            return empty, True, ec, stopwatch.profile(buf, None, 0)
+        return empty, True, ec, None
+    # decode in the same way as ``open(path, encoding=ec)`` does
+    with io.TextIOWrapper(io.BytesIO(buf), encoding=ec) as infile:
+        text = infile.read()
+    if stopwatch is not None:
+        stopwatch.lap('decode')
+    if count:
+        annots = count_tex_text(text, allow_continuation, p)
+    else:
+        annots = scan_tex_text(text, allow_continuation, p)
+    if stopwatch is not None:
+        stopwatch.lap('scan')
+        n_annots = sum(annots.values()) if count else len(annots)
+        return annots, False, ec, stopwatch.profile(buf, text, n_annots)
+    return annots, False, ec, None
+
+
+def _scan_tex_archive(
+    archive: TexArchive,
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    profiling: bool = False,
+    count: bool = False,
+) -> ty.Tuple[ty.List[tuple], ty.Optional[str]]:
+    """
+    Scan the TeX files in ``archive`` as ``_scan_tex_file`` does, reading
+    them one at a time in a single pass over the archive.
+
+    :return: for each TeX file, the path shown for it followed by what
+             ``_scan_tex_file`` returns; and why the rest of the archive
+             cannot be read, if so, or ``None``
+    """
+    # imported only when needed, to speed up startup
+    from todotex import archives
+    results = []
+    stopwatch = _Stopwatch() if profiling else None
+    try:
+        # the time to read a TeX file includes decompressing the members
+        # before
+        for relpath, buf in archives.iter_tex_members(archive):
+            if stopwatch is not None:
+                stopwatch.lap('read')
+            ec = _detect_encoding(buf, chardet)
+            if stopwatch is not None:
+                stopwatch.lap('detect')
+            results.append((archive.member_path(relpath),
+                            *_scan_tex_buf(buf, ec, p, allow_continuation,
+                                           stopwatch, count)))
+            if stopwatch is not None:
+                stopwatch = _Stopwatch()
+    except OSError as err:
+        # e.g. a corrupt or truncated archive among many
+        return results, str(err)
+    return results, None
+
+
+class FileProfile(ty.NamedTuple):
+    """The seconds spent on each phase of scanning a TeX file."""
+    read: float
+    detect: float
+    decode: float
+    scan: float
+    nbytes: int
+    # whether the file is decoded, i.e. not skipped by the prefilter
+    decoded: bool
+    lines: int
+    annots: int
+
+    @property
+    def seconds(self) -> float:
+        return self.read + self.detect + self.decode + self.scan
+
+
+class _Stopwatch:
+    """Time the phases of scanning a TeX file, for ``FileProfile``."""
+    def __init__(self) -> None:
+        self._seconds = dict.fromkeys(('read', 'detect', 'decode', 'scan'),
+                                      0.0)
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Add the time since the last lap to ``phase``."""
+        now = time.perf_counter()
+        self._seconds[phase] += now - self._last
+        self._last = now
+
+    def profile(
+        self,
+        buf: bytes,
+        text: ty.Optional[str],
+        n_annots: int,
+    ) -> FileProfile:
+        """
+        :param buf: the content of the file
+        :param text: the decoded content, or ``None`` if not decoded
+        :param n_annots: the number of annotations
+        """
+        lines = 0
+        if text:
+            lines = text.count('\n') + (not text.endswith('\n'))
+        return self.profile_sizes(len(buf), text is not None, lines, n_annots)
+
+    def profile_sizes(
+        self,
+        nbytes: int,
+        decoded: bool,
+        lines: int,
+        n_annots: int,
+    ) -> FileProfile:
+        """
+        Same as ``profile``, given the sizes rather than the content.
+        """
+        return FileProfile(nbytes=nbytes,
+                           decoded=decoded,
+                           lines=lines,
+                           annots=n_annots,
+                           **self._seconds)
+
+
+class PhaseProfile:
+    def __init__(self) -> None:
+        # the seconds spent on the phase, summed over the workers
+        self.seconds = 0.0
+        # the number of TeX files that went through the phase
+        self.files = 0
+        # the number of bytes read or decoded
+        self.bytes = 0
+        # the number of lines decoded or scanned
+        self.lines = 0
+        # the number of annotations found or shown
+        self.annots = 0
+
+
+class ScanProfile:
+    """
+    Where the time of a run goes, by phase:
+
+    - walk: finding the TeX files
+    - read: reading the TeX files
+    - detect: detecting their encodings
+    - decode: decoding them
+    - scan: searching them for annotations, including the prefilter
+    - show: printing the result
+
+    The files whose annotations are reused from the cache go through none of
+    the phases but walk and show.
+
+    The records are made through ``add_phase`` and ``add_file``, which may be
+    overridden in a subclass as hooks, e.g. to forward the records to a
+    tracing system as they are made.
+    """
+    PHASES = ('walk', 'read', 'detect', 'decode', 'scan', 'show')
+
+    def __init__(self, top: int = 10) -> None:
+        """
+        :param top: the number of slowest files to keep
+        """
+        self.phases = {phase: PhaseProfile() for phase in self.PHASES}
+        self.top = top
+        # the wall time of the run, set by ``finish``
+        self.wall = 0.0
+        self._start = time.perf_counter()
+        # a min-heap of the slowest files so far, as (seconds, order, path,
+        # profile), the order breaking ties
+        self._slowest: ty.List[tuple] = []
+        self._order = 0
+
+    def add_phase(
+        self,
+        phase: str,
+        seconds: float,
+        files: int = 0,
+        nbytes: int = 0,
+        lines: int = 0,
+        annots: int = 0,
+    ) -> None:
+        """Record some work done in ``phase``."""
+        ph = self.phases[phase]
+        ph.seconds += seconds
+        ph.files += files
+        ph.bytes += nbytes
+        ph.lines += lines
+        ph.annots += annots
+
+    def add_file(self, path: Path, fp: FileProfile) -> None:
+        """Record the scan of a TeX file."""
+        self.add_phase('read', fp.read, 1, fp.nbytes)
+        self.add_phase('detect', fp.detect, 1)
+        if fp.decoded:
+            self.add_phase('decode', fp.decode, 1, fp.nbytes, fp.lines)
+        self.add_phase('scan', fp.scan, 1, 0, fp.lines, fp.annots)
+        if self.top > 0:
+            # imported only when needed, to speed up startup
+            import heapq
+            item = fp.seconds, self._order, path, fp
+            self._order += 1
+            if len(self._slowest) < self.top:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def timed(self, phase: str, iterable: ty.Iterable) -> ty.Iterator:
+        """
+        Record the time spent to get each item from ``iterable`` in
+        ``phase``, e.g. the TeX files from ``walk_tex_files`` in 'walk'.
+        """
+        it = iter(iterable)
+        clock = time.perf_counter
+        while True:
+            tic = clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add_phase(phase, clock() - tic)
+                return
+            self.add_phase(phase, clock() - tic, 1)
+            yield item
+
+    def time_consumer(
+        self,
+        phase: str,
+        per_file_annots: ty.Iterable[ty.Tuple[ty.Any, ty.Iterable]],
+        consume: ty.Callable[[ty.Iterable], ty.Any],
+    ) -> None:
+        """
+        Record in ``phase`` the time spent in ``consume(per_file_annots)``,
+        e.g. ``show_result``, except for the time spent to get the items from
+        ``per_file_annots``, which is recorded in the other phases.
+        """
+        waited = 0.0
+        files = annots = 0
+        clock = time.perf_counter
+
+        def waiting():
+            nonlocal waited, files, annots
+            it = iter(per_file_annots)
+            while True:
+                tic = clock()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    waited += clock() - tic
+                    return
+                waited += clock() - tic
+                files += 1
+                if isinstance(item[1], ty.Mapping):
+                    # the number of annotations by key
+                    annots += sum(item[1].values())
+                elif isinstance(item[1], ty.Sized):
+                    annots += len(item[1])
+                yield item
+
+        tic = clock()
+        consume(waiting())
+        self.add_phase(phase, clock() - tic - waited, files, 0, 0, annots)
+
+    def finish(self) -> None:
+        """Set the wall time of the run to the time since creation."""
+        self.wall = time.perf_counter() - self._start
+
+    def slowest(self) -> ty.List[ty.Tuple[Path, FileProfile]]:
+        """:return: the slowest files, the slowest first"""
+        return [(path, fp) for _, _, path, fp in sorted(self._slowest,
+                                                        reverse=True)]
+
+    def as_dict(self) -> ty.Dict[str, ty.Any]:
+        """:return: the profile as JSON-serializable dict"""
+        phases = {}
+        for phase, ph in self.phases.items():
+            phases[phase] = {
+                'seconds': ph.seconds,
+                'files': ph.files,
+                'bytes': ph.bytes,
+                'lines': ph.lines,
+                'annots': ph.annots,
+                'mb_per_s': _rate(ph.bytes / 1e6, ph.seconds),
+                'files_per_s': _rate(ph.files, ph.seconds),
+            }
+        return {
+            'wall_seconds': self.wall,
+            'mb_per_s': _rate(self.phases['read'].bytes / 1e6, self.wall),
+            'phases': phases,
+            'slowest': [dict(fp._asdict(), path=str(path), seconds=fp.seconds)
+                        for path, fp in self.slowest()],
+        }
+
+
+def _rate(amount: float, seconds: float) -> ty.Optional[float]:
+    return amount / seconds if amount and seconds > 0 else None
+
+
+class ScanStats:
+    def __init__(self, profile: ScanProfile = None) -> None:
+        # the number of TeX files found
+        self.files = 0
+        # the number of TeX files skipped by the prefilter without decoding
+        self.prefiltered = 0
+        # the number of TeX files whose annotations are reused from the cache
+        self.cached = 0
+        # if not ``None``, where to record the time spent on each phase
+        self.profile = profile
+
+
+def iter_scan_tex_files(
+    texfiles: ty.Iterable[Path],
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    jobs: int = 1,
+    pool: ty.Literal['process', 'thread'] = 'process',
+    cache=None,
+    stats: ScanStats = None,
+) -> ty.Iterator[ty.Tuple[Path, ty.List[TexAnnotation]]]:
+    """
+    Scan the TeX files, and yield those with annotations along with their
+    annotations as soon as they are scanned.
+
+    :param texfiles: the TeX files, e.g. from ``walk_tex_files``, where each
+           ``TexArchive`` is scanned as a whole by one worker, and its TeX
+           files are yielded in the order they are stored, without caching;
+           if an archive cannot be read, e.g. corrupt, a warning is printed
+           to stderr and its TeX files read so far are kept
+    :param p: the patterns
+    :param allow_continuation: whether to allow message continuation
+    :param chardet: if of type ``str``, the encoding for the TeX files to open;
+           otherwise, an ``EncodingDetector``, or the ``chardet`` package
+           (https://github.com/chardet/chardet)
+    :param jobs: number of workers to scan the TeX files with; ``1`` scans
+           them serially in the current process, ``0`` or negative uses as
+           many workers as there are CPUs
+    :param pool: ``'process'`` to scan in a process pool, or ``'thread'`` to
+           scan in a thread pool, which suits I/O-bound network mounts better;
+           ignored if ``jobs`` is ``1``
+    :param cache: if not ``None``, a ``todotex.cache.AnnotationCache`` to
+           reuse the annotations of unchanged files from, and to store those
+           of the rest into; the detected encodings are also reused from and
+           stored into it, regardless of the fingerprint
+    :param stats: if not ``None``, the statistics to add to
+    :return: an iterator of TeX file paths and their annotations, in the same
+             order regardless of ``jobs`` and ``pool``
+    """
+    return _iter_scan_tex_files(texfiles, p, allow_continuation, chardet, jobs,
+                                pool, cache, stats, False)
+
+
+def iter_count_tex_files(
+    texfiles: ty.Iterable[Path],
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    jobs: int = 1,
+    pool: ty.Literal['process', 'thread'] = 'process',
+    stats: ScanStats = None,
+) -> ty.Iterator[ty.Tuple[Path, ty.Dict[str, int]]]:
+    """
+    Same as ``iter_scan_tex_files``, except that the annotations are counted
+    by ``count_tex_text`` rather than scanned, and that no cache is used.
+
+    :return: an iterator of TeX file paths and the number of their
+             annotations by key, for those with any
+    """
+    return _iter_scan_tex_files(texfiles, p, allow_continuation, chardet, jobs,
+                                pool, None, stats, True)
+
+
+def _iter_scan_tex_files(
+    texfiles: ty.Iterable[Path],
+    p: Patterns,
+    allow_continuation: bool,
+    chardet,
+    jobs: int,
+    pool: ty.Literal['process', 'thread'],
+    cache,
+    stats: ty.Optional[ScanStats],
+    count: bool,
+) -> ty.Iterator[ty.Tuple[Path, ty.Any]]:
+    """
+    :param count: whether to count the annotations rather than to scan them,
+           see ``_scan_tex_file``
+    """
+    if stats is None:
+        stats = ScanStats()
+    profile = stats.profile
+    profiling = profile is not None
+    # whether the encodings are detected, and thus worth caching
+    detecting = not isinstance(chardet, str)
+
+    def finish_archive(scanned: ty.List[tuple], error: ty.Optional[str]):
+        """
+        Yield the TeX files of an archive with annotations, in order, and
+        warn if the archive cannot be read entirely.
+        """
+        if error is not None:
+            print(f'todotex: warning: {error}', file=sys.stderr)
+        stats.files += len(scanned)
+        for path, annots, prefiltered, _, fp in scanned:
+            stats.prefiltered += prefiltered
+            if profiling:
+                profile.add_file(path, fp)
+            if annots:
+                yield path, annots
+
+    if jobs == 1:
+        for path in texfiles:
+            if isinstance(path, TexArchive):
+                yield from finish_archive(*_scan_tex_archive(
+                    path, p, allow_continuation, chardet, profiling, count))
+                continue
+            stats.files += 1
+            annots = None
+            if cache is not None:
+                annots, stamp = cache.lookup(path)
+            if annots is None:
+                known_ec = None
+                if cache is not None and detecting:
+                    known_ec, _ = cache.lookup_encoding(path)
+                annots, prefiltered, ec, fp = _scan_tex_file(
+                    path, p, allow_continuation, chardet, known_ec,
+                    profiling, count)
+                stats.prefiltered += prefiltered
+                if profiling:
+                    profile.add_file(path, fp)
+                if cache is not None:
+                    cache.put(path, stamp, annots)
+                    if detecting and known_ec is None and ec:
+                        cache.put_encoding(path, stamp, ec)
+            else:
+                stats.cached += 1
+            if annots:
+                yield path, annots
+        return
+
+    # imported only when needed, to speed up startup
+    import concurrent.futures
+
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    if pool == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        if detecting and not isinstance(chardet, EncodingDetector):
+            chardet = _ModuleRef(chardet)
+        # amortize the cost of sending the patterns to the workers
+        chunksize = 16
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(jobs)
+        chunksize = 1
+
+    def submit(chunk: ty.List[Path]) -> tuple:
+        """
+        Submit the TeX files of ``chunk`` not in the cache to scan, and each
+        archive in ``chunk`` to scan on its own.
+        """
+        results: ty.List[ty.Any] = [None] * len(chunk)
+        stamps: ty.List[ty.Any] = [None] * len(chunk)
+        known_ecs: ty.List[ty.Optional[str]] = [None] * len(chunk)
+        # the futures of the archives by their indices in ``chunk``
+        archives: ty.Dict[int, ty.Any] = {}
+        for i, path in enumerate(chunk):
+            if isinstance(path, TexArchive):
+                archives[i] = executor.submit(_scan_tex_archive, path, p,
+                                              allow_continuation, chardet,
+                                              profiling, count)
+            elif cache is not None:
+                results[i], stamps[i] = cache.lookup(path)
+                if results[i] is None and detecting:
+                    known_ecs[i], _ = cache.lookup_encoding(path)
+        missing = [
+            i for i, annots in enumerate(results)
+            if annots is None and i not in archives
+        ]
+        stats.files += len(chunk) - len(archives)
+        stats.cached += len(chunk) - len(archives) - len(missing)
+        future = None
+        if missing:
+            future = executor.submit(_scan_tex_file_chunk, [
+                (chunk[i], p, allow_continuation, chardet, known_ecs[i],
+                 profiling, count) for i in missing
+            ])
+        return chunk, results, stamps, known_ecs, missing, archives, future
+
+    def finish(submitted: tuple):
+        """Yield the TeX files of a chunk with annotations, in order."""
+        chunk, results, stamps, known_ecs, missing, archives, future = (
+            submitted)
+        scanned = zip(missing, future.result() if future else [])
+        for i, (path, annots) in enumerate(zip(chunk, results)):
+            if i in archives:
+                yield from finish_archive(*archives[i].result())
+                continue
+            if annots is None:
+                j, (annots, prefiltered, ec, fp) = next(scanned)
+                stats.prefiltered += prefiltered
+                if profiling:
+                    profile.add_file(path, fp)
+                if cache is not None:
+                    cache.put(path, stamps[j], annots)
+                    if detecting and known_ecs[j] is None and ec:
+                        cache.put_encoding(path, stamps[j], ec)
+            if annots:
+                yield path, annots
+
+    # The TeX files are taken from ``texfiles`` only a few chunks per worker
+    # ahead of those yielded, rather than all at once as ``Executor.map``
+    # does, so that the memory stays bounded however many they are, and the
+    # scanning starts as soon as the first TeX files are found.
+    window = jobs * 4
+    texfiles = iter(texfiles)
+    pending: ty.Deque[tuple] = collections.deque()
+    with executor:
+        try:
+            while True:
+                chunk = list(itertools.islice(texfiles, chunksize))
+                if chunk:
+                    pending.append(submit(chunk))
+                    if len(pending) < window:
+                        continue
+                if not pending:
+                    break
+                yield from finish(pending.popleft())
+        finally:
+            # those not started yet, if closed early
+            for *_, archives, future in pending:
+                for archive_future in archives.values():
+                    archive_future.cancel()
+                if future is not None:
+                    future.cancel()
+
+
+def _scan_tex_file_chunk(args_list: ty.List[tuple]) -> ty.List[tuple]:
+    """
+    Call ``_scan_tex_file`` on each of the arguments, so that the patterns
+    are sent to a worker once per chunk rather than once per TeX file.
+    """
+    return [_scan_tex_file(*args) for args in args_list]
+
+
+def iter_scan_fs_for_tex(
+    paths: ty.Iterable[Path],
+    p: Patterns,
+    recursive: bool,
+    allow_continuation: bool,
+    chardet,
+    jobs: int = 1,
+    pool: ty.Literal['process', 'thread'] = 'process',
+    cache=None,
+    stats: ScanStats = None,
+) -> ty.Iterator[ty.Tuple[Path, ty.List[TexAnnotation]]]:
+    """
+    Same as ``scan_fs_for_tex``, except that the TeX files with annotations
+    are yielded along with their annotations as soon as they are scanned.
+    See ``iter_scan_tex_files`` for the parameters.
+    """
+    return iter_scan_tex_files(
+        walk_tex_files(paths, recursive),
+        p,
+        allow_continuation,
+        chardet,
+        jobs,
+        pool,
+        cache,
+        stats,
+    )
 
 
 def scan_fs_for_tex(
@@ -107,6 +1589,10 @@ def scan_fs_for_tex(
     recursive: bool,
     allow_continuation: bool,
     chardet,
+    jobs: int = 1,
+    pool: ty.Literal['process', 'thread'] = 'process',
+    cache=None,
+    stats: ScanStats = None,
 ) -> ty.OrderedDict[Path, ty.List[TexAnnotation]]:
     """
     :param paths: paths to search for TeX files
@@ -114,35 +1600,15 @@ def scan_fs_for_tex(
     :param recursive: whether to search with recursion
     :param allow_continuation: whether to allow message continuation
     :param chardet: if of type ``str``, the encoding for the TeX files to open;
-           otherwise, the ``chardet`` package
+           otherwise, an ``EncodingDetector``, or the ``chardet`` package
            (https://github.com/chardet/chardet)
-    :return: a dict of TeX file path mapped to annotations
+    :param jobs: see ``iter_scan_tex_files``
+    :param pool: see ``iter_scan_tex_files``
+    :param cache: see ``iter_scan_tex_files``
+    :param stats: see ``iter_scan_tex_files``
+    :return: a dict of TeX file path mapped to annotations, in the same order
+             regardless of ``jobs`` and ``pool``
     """
-    per_file_annotations = collections.OrderedDict()
-
-    def _scan_and_add_to_annots(_path: Path):
-        if isinstance(chardet, str):
-            ec = chardet
-        else:
-            with open(_path, 'rb') as infile:
-                # sample the first 64 KiB for chardet
-                ec = chardet.detect(infile.read(1024 * 64))['encoding']
-        with open(_path, encoding=ec) as infile:
-            annots = scan_tex_doc(infile, allow_continuation, p)
-        if annots:
-            per_file_annotations[_path] = annots
-
-    for path in paths:
-        if path.is_file() and path.suffix == '.tex':
-            _scan_and_add_to_annots(path)
-        elif path.is_dir() and not recursive:
-            for child in path.iterdir():
-                if child.is_file() and child.suffix == '.tex':
-                    _scan_and_add_to_annots(child)
-        elif path.is_dir():
-            for root, _, files in os.walk(path):
-                for name in files:
-                    child = Path(root) / name
-                    if child.suffix == '.tex':
-                        _scan_and_add_to_annots(child)
-    return per_file_annotations
+    return collections.OrderedDict(
+        iter_scan_fs_for_tex(paths, p, recursive, allow_continuation, chardet,
+                             jobs, pool, cache, stats))
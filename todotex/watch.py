@@ -0,0 +1,409 @@
+import collections
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+import typing as ty
+from pathlib import Path
+
+from todotex.todotex import (
+    Patterns,
+    ScanStats,
+    TexAnnotation,
+    walk_tex_files,
+    _compile_globs,
+    _descend_into,
+    _is_tex_name,
+    _match_globs,
+    _match_walked,
+    _scan_tex_file,
+    _walk_subdirs,
+)
+
+# see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_IN_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+_IN_EVENT = struct.Struct('iIII')
+
+# The changed paths reported by a watcher, or ``None`` if unknown, in which
+# case everything should be considered changed. Paths other than TeX files
+# are the directories created, moved or deleted, under which any TeX file
+# may have changed.
+Changes = ty.Optional[ty.Set[Path]]
+
+
+class PollingWatcher:
+    """
+    Detect changes of TeX files by comparing their mtime and size every
+    ``interval`` seconds.
+    """
+    def __init__(
+        self,
+        paths: ty.List[Path],
+        recursive: bool,
+        interval: float,
+        **walk_kwargs,
+    ) -> None:
+        """
+        :param walk_kwargs: the keyword arguments to ``walk_tex_files``
+        """
+        self._paths = paths
+        self._recursive = recursive
+        self._interval = interval
+        self._walk_kwargs = walk_kwargs
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> ty.Dict[Path, ty.Tuple[int, int]]:
+        snapshot = {}
+        for path in walk_tex_files(self._paths, self._recursive,
+                                   **self._walk_kwargs):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = st.st_mtime_ns, st.st_size
+        return snapshot
+
+    def wait(self, timeout: ty.Optional[float]) -> Changes:
+        """
+        :param timeout: the seconds to wait at most, or ``None`` to wait
+               until some change is detected
+        :return: the changes, empty if none within ``timeout``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = self._interval
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.monotonic())
+            if remaining > 0:
+                time.sleep(remaining)
+            prev_snapshot = self._snapshot
+            self._snapshot = self._take_snapshot()
+            changed = {
+                path
+                for path in prev_snapshot.keys() | self._snapshot.keys()
+                if prev_snapshot.get(path) != self._snapshot.get(path)
+            }
+            if changed or (deadline is not None
+                           and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detect changes of TeX files with inotify(7), only available on Linux.
+    """
+    def __init__(
+        self,
+        paths: ty.List[Path],
+        recursive: bool,
+        include: ty.Sequence[str] = (),
+        exclude: ty.Sequence[str] = (),
+        follow_symlinks: bool = False,
+    ) -> None:
+        """
+        :param include: see ``walk_tex_files``
+        :param exclude: see ``walk_tex_files``
+        :param follow_symlinks: see ``walk_tex_files``
+        :raise OSError: if inotify is not available
+        """
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._recursive = recursive
+        self._include_globs = _compile_globs(include) if include else None
+        self._exclude_globs = _compile_globs(exclude) if exclude else None
+        self._follow_symlinks = follow_symlinks
+        # the directories descended into, as ``walk_tex_files`` does
+        self._visited: ty.Set[ty.Tuple[int, int]] = set()
+        # the watched directories by watch descriptor
+        self._dirs: ty.Dict[int, Path] = {}
+        # the paths of the watched directories relative to the directories
+        # being walked, followed by '/' unless empty, by watch descriptor
+        self._reldirs: ty.Dict[int, str] = {}
+        # the watched directories to report the changes of the TeX files
+        # walked and of the subdirectories under; only the files in
+        # ``self._files`` are reported under the other directories
+        self._whole_dirs: ty.Set[int] = set()
+        self._files: ty.Set[Path] = set()
+        try:
+            for path in paths:
+                if path.is_dir():
+                    self._add_dir(path)
+                else:
+                    self._files.add(path)
+                    self._add_watch(path.parent, False)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path: Path, whole: bool, reldir: str = '') -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path),
+                                          _IN_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self._dirs.setdefault(wd, path)
+        self._reldirs.setdefault(wd, reldir)
+        if whole:
+            self._whole_dirs.add(wd)
+
+    def _add_dir(self, path: Path, reldir: str = '') -> None:
+        """
+        Watch ``path``, and the directories under it that ``walk_tex_files``
+        descends into if recursive.
+
+        :param reldir: see ``todotex._walk_subdirs``
+        """
+        if not self._recursive:
+            self._add_watch(path, True)
+            return
+        if not reldir and self._follow_symlinks:
+            st = os.stat(path)
+            self._visited.add((st.st_dev, st.st_ino))
+        for subdir, subreldir in _walk_subdirs(path, reldir,
+                                               self._exclude_globs,
+                                               self._follow_symlinks,
+                                               self._visited):
+            self._add_watch(subdir, True, subreldir)
+
+    def wait(self, timeout: ty.Optional[float]) -> Changes:
+        """
+        :param timeout: the seconds to wait at most, or ``None`` to wait
+               until some change is detected
+        :return: the changes, empty if none within ``timeout``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: ty.Set[Path] = set()
+        while not changed:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                break
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, namelen = _IN_EVENT.unpack_from(buf, offset)
+                offset += _IN_EVENT.size
+                name = os.fsdecode(buf[offset:offset + namelen].rstrip(b'\0'))
+                offset += namelen
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    self._reldirs.pop(wd, None)
+                    self._whole_dirs.discard(wd)
+                    continue
+                try:
+                    parent = self._dirs[wd]
+                except KeyError:
+                    continue
+                path = parent / name if name else parent
+                if wd not in self._whole_dirs:
+                    if path in self._files:
+                        changed.add(path)
+                    continue
+                if not name:
+                    # the watched directory itself, e.g. deleted
+                    changed.add(path)
+                    continue
+                relpath = self._reldirs[wd] + name
+                if self._is_subdir(mask, path):
+                    try:
+                        if self._subdir_changed(mask, path, relpath):
+                            changed.add(path)
+                    except OSError:
+                        return None
+                elif _is_tex_name(name) and _match_walked(
+                        [name], self._reldirs[wd], self._include_globs,
+                        self._exclude_globs):
+                    # not e.g. the .aux, .log and .pdf files of a build
+                    changed.add(path)
+        return changed
+
+    def _is_subdir(self, mask: int, path: Path) -> bool:
+        if mask & IN_ISDIR:
+            return True
+        # a symbolic link to a directory, to be followed
+        return bool(mask & (IN_CREATE | IN_MOVED_TO) and self._follow_symlinks
+                    and path.is_dir())
+
+    def _subdir_changed(self, mask: int, path: Path, relpath: str) -> bool:
+        """
+        Watch a subdirectory just created or moved in if walked.
+
+        :return: whether the TeX files walked under the subdirectory may
+                 have changed
+        """
+        if not self._recursive:
+            return False
+        if not mask & (IN_CREATE | IN_MOVED_TO):
+            # deleted or moved out
+            return not (self._exclude_globs and _match_globs(
+                self._exclude_globs, path.name, relpath))
+        if not _descend_into(path, relpath, self._exclude_globs,
+                             self._follow_symlinks, self._visited):
+            return False
+        self._add_dir(path, relpath + '/')
+        return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(
+    paths: ty.List[Path],
+    recursive: bool,
+    poll_interval: float,
+    **walk_kwargs,
+) -> ty.Union[InotifyWatcher, PollingWatcher]:
+    """
+    :return: an inotify watcher if available, otherwise a polling watcher
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths, recursive, **walk_kwargs)
+        except (OSError, AttributeError):
+            # ``AttributeError`` if libc has no inotify functions
+            pass
+    return PollingWatcher(paths, recursive, poll_interval, **walk_kwargs)
+
+
+def _wait_debounced(watcher, debounce: float) -> Changes:
+    """Wait for a change, and then until no change for ``debounce`` seconds."""
+    changed = watcher.wait(None)
+    while True:
+        more = watcher.wait(debounce)
+        if not more and more is not None:
+            return changed
+        if changed is None or more is None:
+            changed = None
+        else:
+            changed |= more
+
+
+def iter_watch(
+    paths: ty.Iterable[Path],
+    p: Patterns,
+    recursive: bool,
+    allow_continuation: bool,
+    chardet,
+    debounce: float = 0.2,
+    poll_interval: float = 1.0,
+    include: ty.Sequence[str] = (),
+    exclude: ty.Sequence[str] = (),
+    follow_symlinks: bool = False,
+    stats: ScanStats = None,
+) -> ty.Iterator[ty.OrderedDict[Path, ty.List[TexAnnotation]]]:
+    """
+    Scan the TeX files like ``scan_fs_for_tex``, and again whenever they
+    change. Only the TeX files created or modified since the previous scan
+    are scanned again; the annotations of the others are kept in memory.
+    The TeX files are found again by walking the directories only if some
+    subdirectory changes, or if the changes are unknown.
+
+    :param paths: see ``scan_fs_for_tex``
+    :param p: see ``scan_fs_for_tex``
+    :param recursive: see ``scan_fs_for_tex``
+    :param allow_continuation: see ``scan_fs_for_tex``
+    :param chardet: see ``scan_fs_for_tex``
+    :param debounce: the seconds without further change to wait for after a
+           change before scanning, so that a burst of changes, e.g. as an
+           editor saves, is handled at once
+    :param poll_interval: the seconds between two polls if inotify is not
+           available
+    :param include: see ``walk_tex_files``
+    :param exclude: see ``walk_tex_files``
+    :param follow_symlinks: see ``walk_tex_files``
+    :param stats: if not ``None``, the statistics to add to
+    :return: an endless iterator of the result of ``scan_fs_for_tex``, first
+             of the initial scan, then after each change
+    """
+    if stats is None:
+        stats = ScanStats()
+    paths = list(paths)
+    # watch before the initial scan so as not to miss any change
+    walk_kwargs = {
+        'include': include,
+        'exclude': exclude,
+        'follow_symlinks': follow_symlinks,
+    }
+    watcher = make_watcher(paths, recursive, poll_interval, **walk_kwargs)
+
+    def scan(path: Path) -> ty.Optional[ty.List[TexAnnotation]]:
+        """
+        :return: the annotations, or ``None`` if the TeX file is deleted or
+                 cannot be read
+        """
+        try:
+            annots, prefiltered, _, _ = _scan_tex_file(
+                path, p, allow_continuation, chardet)
+        except FileNotFoundError:
+            # deleted, or since listed, to be seen in next change
+            return None
+        except (OSError, UnicodeDecodeError) as err:
+            stats.files += 1
+            # e.g. unreadable or saved halfway, to be scanned again in next
+            # change
+            print(f'todotex: {path}: {err}', file=sys.stderr)
+            return None
+        stats.files += 1
+        stats.prefiltered += prefiltered
+        return annots
+
+    try:
+        per_file_annotations: ty.Dict[Path, ty.List[TexAnnotation]] = {}
+        changed: Changes = None
+        while True:
+            if changed is not None and all(
+                    _is_tex_name(path.name) and not path.is_dir()
+                    for path in changed):
+                # only TeX files created, modified or deleted
+                for path in sorted(changed):
+                    annots = scan(path)
+                    if annots is None:
+                        per_file_annotations.pop(path, None)
+                    else:
+                        per_file_annotations[path] = annots
+            else:
+                prev_per_file_annotations = per_file_annotations
+                per_file_annotations = collections.OrderedDict()
+                for path in walk_tex_files(paths, recursive, **walk_kwargs):
+                    if (changed is None or path in changed
+                            or path not in prev_per_file_annotations):
+                        annots = scan(path)
+                        if annots is None:
+                            continue
+                    else:
+                        annots = prev_per_file_annotations[path]
+                    per_file_annotations[path] = annots
+            yield collections.OrderedDict(
+                (path, annots)
+                for path, annots in per_file_annotations.items() if annots)
+            changed = _wait_debounced(watcher, debounce)
+    finally:
+        watcher.close()